@@ -0,0 +1,76 @@
+# Compares the JSON and MessagePack renderers on serializer output shaped
+# like the Player/Team/League examples (see cereal_drf.py), in both the
+# normal and the ':compact' layouts.
+#
+# $ python benchmark_renderers.py [number_of_players]
+import sys
+import timeit
+from collections import OrderedDict
+
+from django.conf import settings
+
+settings.configure()
+
+from rest_framework.renderers import JSONRenderer
+
+from rest_cereal.mixins import CerealListSerializer
+from rest_cereal.renderers import MessagePackRenderer, msgpack
+
+
+def model_data(pk):
+    data = OrderedDict([('id', pk)])
+    for i in range(1, 10):
+        data['field{0}'.format(i)] = pk * 10 + i
+    return data
+
+
+def player_data(pk):
+    # fields=id,field1..field9,teams(id,field1,captain(id,field3)),
+    #        leagues(id,field2)
+    player = model_data(pk)
+    player['teams'] = [
+        OrderedDict([
+            ('id', team_pk),
+            ('field1', team_pk + 1),
+            ('captain', OrderedDict([('id', pk), ('field3', pk + 3)]))
+        ])
+        for team_pk in range(pk, pk + 3)
+    ]
+    player['leagues'] = [
+        OrderedDict([('id', league_pk), ('field2', league_pk + 2)])
+        for league_pk in range(pk, pk + 2)
+    ]
+    return player
+
+
+def compact_data(players):
+    # fields=id,field1..field9,:compact
+    columns = [(key,) for key in players[0] if key not in ('teams', 'leagues')]
+    return OrderedDict([
+        ('fields', ['.'.join(column) for column in columns]),
+        ('rows', [CerealListSerializer.compact_row(player, columns)
+                  for player in players])
+    ])
+
+
+def benchmark(name, renderer, data, number=20):
+    seconds = timeit.timeit(lambda: renderer.render(data), number=number)
+    size = len(renderer.render(data))
+    print('{0:<20} {1:>10.2f} ms {2:>12} bytes'.format(
+        name, seconds / number * 1000, size
+    ))
+
+
+if __name__ == '__main__':
+    number_of_players = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    players = [player_data(pk) for pk in range(number_of_players)]
+    compact = compact_data(players)
+
+    # msgpack.fallback is the (much slower) pure python implementation.
+    print('{0} players, msgpack packer: {1}'.format(
+        number_of_players, msgpack.Packer.__module__
+    ))
+    benchmark('json', JSONRenderer(), players)
+    benchmark('msgpack', MessagePackRenderer(), players)
+    benchmark('json compact', JSONRenderer(), compact)
+    benchmark('msgpack compact', MessagePackRenderer(), compact)
@@ -230,13 +230,9 @@ class LeagueCircularMethodSerializer(CerealMixin, MethodSerializerMixin,
             'parent_league'
         )
 
-# *** Any serializer that has a LazySerializer inside must be put here. ***
-# *** The serializers referenced in the LazySerializer must be accessible in
-# the namespace passed in to the convert_serializers method. ***
-#
-# This is required for LazySerializers to resolve properly. It's necessary
-# because of circular nesting - the serializers being referenced haven't been
-# initialized yet.
+# LazySerializers are resolved the first time their serializer is used, so
+# this is optional: it resolves them right away, looking the referenced
+# serializers up in the namespace passed in to the convert_serializers method.
 LazySerializer.convert_serializers(
     globals(),
     [
@@ -1 +1,3 @@
 __author__ = 'douglas'
+
+default_app_config = 'rest_cereal.apps.RestCerealConfig'
@@ -0,0 +1,43 @@
+from django.apps import AppConfig
+
+
+def get_cereal_serializer_classes():
+    '''Returns the (imported) serializer classes inheriting the CerealMixin,
+    leaving out the temporary classes CerealMixin creates for nesting.
+    '''
+    from rest_cereal.mixins import CerealMixin
+
+    serializer_classes = []
+    subclasses = list(CerealMixin.__subclasses__())
+    while subclasses:
+        subclass = subclasses.pop()
+        subclasses.extend(subclass.__subclasses__())
+        if not subclass.__name__.startswith('CerealTemp'):
+            serializer_classes.append(subclass)
+    return serializer_classes
+
+
+class RestCerealConfig(AppConfig):
+    name = 'rest_cereal'
+    verbose_name = 'Django Rest Cereal'
+
+    def ready(self):
+        from rest_cereal.graph import serializer_graph
+        from rest_cereal.mixins import CerealMixin
+        from rest_cereal.settings import cereal_settings
+        from rest_cereal.warmup import get_warmup_entries, warm_up
+
+        # First, as it imports the warmed up views, with their serializers.
+        warm_up(get_warmup_entries())
+
+        # Building the graph and the presets of every serializer resolves
+        # all their LazySerializers: by default, they're built on first use.
+        if not cereal_settings.BUILD_AT_STARTUP:
+            return
+        serializer_classes = get_cereal_serializer_classes()
+        serializer_graph.build(serializer_classes)
+
+        # Presets of serializers that aren't imported by now are compiled on
+        # first use.
+        for serializer_class in serializer_classes:
+            CerealMixin.compile_presets(serializer_class)
@@ -0,0 +1,106 @@
+'''Bounded thread pools running slow serializer work (ex: the get_<name>
+methods of MethodSerializerMixin fields calling a search index) concurrently.
+See CerealViewMixin.method_threads and prefetch_threads: the method fields
+and the prefetches have their own pools, so one can't starve the other.
+Tasks started from a thread of the pool they'd run on (ex: a method field
+serializing a nested serializer with method fields) run in that thread, as
+waiting for the other threads of a saturated pool would deadlock.
+
+Tasks run in other threads, so they use their own database connections,
+and only see committed data. Each thread keeps its connections across tasks
+(the pools' threads aren't requests, so CONN_MAX_AGE doesn't apply): they're
+only closed when they become unusable, and when the pools are closed (see
+close_thread_pools, registered to run at exit).
+'''
+import atexit
+import threading
+from multiprocessing.pool import ThreadPool
+
+from django.db import connections
+
+
+# {(name, number of threads): ThreadPool}
+_thread_pools = {}
+_lock = threading.Lock()
+# thread_pool: the pool running the thread's current task
+_local = threading.local()
+
+
+def get_thread_pool(name, threads):
+    '''Returns the process' thread pool with this name (ex: 'methods') and
+    number of threads.
+    '''
+    key = (name, threads)
+    thread_pool = _thread_pools.get(key)
+    if thread_pool is None:
+        with _lock:
+            thread_pool = _thread_pools.get(key)
+            if thread_pool is None:
+                thread_pool = _thread_pools[key] = ThreadPool(threads)
+    return thread_pool
+
+
+def close_thread_pools():
+    '''Stops the threads of the pools (with their database connections).
+    '''
+    with _lock:
+        thread_pools = list(_thread_pools.values())
+        _thread_pools.clear()
+    for thread_pool in thread_pools:
+        thread_pool.close()
+        thread_pool.join()
+
+
+atexit.register(close_thread_pools)
+
+
+def close_unusable_connections():
+    '''Closes the connections of this thread that can't be used again.
+    '''
+    for connection in connections.all():
+        if connection.connection is None:
+            continue
+        # left in a transaction, or broken
+        if connection.get_autocommit() != \
+                connection.settings_dict['AUTOCOMMIT'] or \
+                connection.errors_occurred and not connection.is_usable():
+            connection.close()
+        else:
+            connection.errors_occurred = False
+
+
+def _run_task(task):
+    function, args = task
+    try:
+        return True, function(*args)
+    except Exception as error:
+        return False, error
+
+
+def _run_pool_task(task):
+    thread_pool, function, args = task
+    _local.thread_pool = thread_pool
+    try:
+        return _run_task((function, args))
+    finally:
+        _local.thread_pool = None
+        close_unusable_connections()
+
+
+def run_concurrently(thread_pool, tasks):
+    '''Runs the (function, args) tasks on the thread pool and returns their
+    results in the order of the tasks. Once they're all done, the exception
+    of the first failed task (if any) is raised.
+    '''
+    if getattr(_local, 'thread_pool', None) is thread_pool:
+        outcomes = [_run_task(task) for task in tasks]
+    else:
+        outcomes = thread_pool.map(_run_pool_task,
+                                   [(thread_pool, function, args)
+                                    for function, args in tasks])
+    results = []
+    for succeeded, result in outcomes:
+        if not succeeded:
+            raise result
+        results.append(result)
+    return results
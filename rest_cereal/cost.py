@@ -0,0 +1,136 @@
+'''Static cost estimates of CerealFields trees, used to reject (or throttle)
+requests that would take a lot of processing before running any query.
+
+The cost of a tree is the estimated number of values and nested objects the
+serializers will produce:
+
+- each selected field costs COST_FIELD,
+- each nested serializer costs COST_NESTED, plus COST_DEPTH for every level
+  it is nested under the top-level serializer,
+- a MethodSerializerMixin field costs its method weight on top of that,
+- everything under a to-many (or method) field is multiplied by the
+  estimated number of related objects.
+
+Estimates are declared on the serializers' Meta, by field name:
+
+class Meta:
+    cereal_cardinality = {'players': 25, 'teams': 4}
+    cereal_method_weights = {'players_joined_in_month': 50}
+
+Fields without estimates use COST_DEFAULT_CARDINALITY and
+COST_DEFAULT_METHOD_WEIGHT (see rest_cereal.settings).
+'''
+from rest_framework.serializers import ListSerializer
+
+from rest_cereal.planning import get_model_relation, get_nested_serializer, \
+    is_to_many
+from rest_cereal.serializers import LazySerializer, MethodSerializerMixin
+from rest_cereal.settings import cereal_settings
+
+
+def get_cardinality(serializer_class, field_name):
+    meta = getattr(serializer_class, 'Meta', None)
+    return getattr(meta, 'cereal_cardinality', {}).get(
+        field_name, cereal_settings.COST_DEFAULT_CARDINALITY
+    )
+
+
+def get_method_weight(serializer_class, field_name):
+    meta = getattr(serializer_class, 'Meta', None)
+    return getattr(meta, 'cereal_method_weights', {}).get(
+        field_name, cereal_settings.COST_DEFAULT_METHOD_WEIGHT
+    )
+
+
+def estimate_cost(serializer_class, cereal_fields, rows=1):
+    '''Returns the estimated cost of serializing `rows` objects with the
+    serializer class and the CerealFields tree (None for the serializer's
+    default fields).
+    '''
+    return _estimate_cost_rec(serializer_class, cereal_fields, rows, 0)
+
+
+def _estimate_cost_rec(serializer_class, cereal_fields, multiplier, depth):
+    meta = getattr(serializer_class, 'Meta', None)
+    model = getattr(meta, 'model', None)
+    declared_fields = LazySerializer.get_declared_fields(serializer_class)
+
+    if cereal_fields is None or 'default' in cereal_fields.options:
+        if getattr(meta, 'circular', False) and cereal_fields is None:
+            # circular serializers without fields don't nest any further
+            return 0
+        field_names = getattr(meta, 'fields', None)
+        if not isinstance(field_names, (list, tuple)):
+            field_names = list(declared_fields)
+        nested_fields = dict((field_name, None) for field_name in field_names
+                             if field_name in declared_fields and
+                             not getattr(meta, 'circular', False))
+        normal_fields = [field_name for field_name in field_names
+                         if field_name not in declared_fields]
+        if cereal_fields is not None:
+            nested_fields.update(cereal_fields.nested_fields)
+            normal_fields += cereal_fields.normal_fields
+    else:
+        nested_fields = cereal_fields.nested_fields
+        normal_fields = cereal_fields.normal_fields
+
+    cost = 0
+    for field_name in set(normal_fields):
+        field_cost = cereal_settings.COST_FIELD
+        relation = get_model_relation(model, field_name) \
+            if model is not None and field_name not in declared_fields \
+            else None
+        if relation is not None and is_to_many(relation):
+            # a list of primary keys
+            field_cost *= get_cardinality(serializer_class, field_name)
+        cost += multiplier * field_cost
+
+    for field_name, nested in nested_fields.items():
+        field = declared_fields.get(field_name)
+        if field is None:
+            continue
+        nested_serializer = get_nested_serializer(field)
+        nested_cost = cereal_settings.COST_NESTED + \
+            cereal_settings.COST_DEPTH * (depth + 1)
+        nested_multiplier = multiplier
+        if isinstance(nested_serializer, MethodSerializerMixin):
+            # methods can return a single object or a list of them
+            nested_cost += get_method_weight(serializer_class, field_name)
+            nested_multiplier *= get_cardinality(serializer_class, field_name)
+        elif isinstance(field, ListSerializer):
+            nested_multiplier *= get_cardinality(serializer_class, field_name)
+        cost += multiplier * nested_cost
+        cost += _estimate_cost_rec(nested_serializer.__class__, nested,
+                                   nested_multiplier, depth + 1)
+    return cost
+
+
+def measure_cost(data):
+    '''Returns the cost of serialized data, with the same weights as the
+    estimates (method weights aside): each value costs COST_FIELD and each
+    nested object COST_NESTED plus COST_DEPTH for every level it is nested
+    under the top-level objects.
+    '''
+    if isinstance(data, dict) and isinstance(data.get('results'), list):
+        # paginated list
+        data = data['results']
+    if isinstance(data, list):
+        return sum(_measure_cost_rec(item, 0) for item in data)
+    return _measure_cost_rec(data, 0)
+
+
+def _measure_cost_rec(data, depth):
+    if isinstance(data, list):
+        return sum(_measure_cost_rec(item, depth) for item in data)
+    if not isinstance(data, dict):
+        return cereal_settings.COST_FIELD
+    cost = 0
+    for value in data.values():
+        for item in (value if isinstance(value, list) else [value]):
+            if isinstance(item, dict):
+                cost += cereal_settings.COST_NESTED + \
+                    cereal_settings.COST_DEPTH * (depth + 1)
+                cost += _measure_cost_rec(item, depth + 1)
+            else:
+                cost += _measure_cost_rec(item, depth)
+    return cost
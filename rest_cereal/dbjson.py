@@ -0,0 +1,386 @@
+'''Experimental: builds the JSON of a list request in the database (see
+CerealViewMixin.database_json).
+
+The serializer fields built for the fields parameter are compiled into one
+SQL statement, which returns the finished JSON text of each object: nested
+to-one relations are correlated subqueries building an object, and to-many
+relations are correlated subqueries aggregating an array. No model instances
+or dicts are built in Python.
+
+Only fields whose representation the database can build are compiled:
+
+- integer, float, boolean and char fields reading a model column,
+- primary key related fields (and lists of them),
+- nested serializers reading a model relation (except reverse one to ones),
+  whose to_representation isn't overridden.
+
+Anything else (ex: method fields, dates, dotted sources) raises
+DatabaseJSONUnsupported, and the view serializes in Python instead.
+
+Supported backends are SQLite (with the JSON1 functions, json_object and
+json_group_array) and PostgreSQL (json_build_object and json_agg). Whether
+the database has the functions is checked once per connection. Objects
+are limited to the number of function arguments of the backend (ex: 50
+fields on PostgreSQL).
+'''
+from django.core.exceptions import FieldDoesNotExist
+from django.db import DatabaseError, connections, models, transaction
+from django.db.models.fields.related import ForeignObjectRel, OneToOneRel
+from django.utils.encoding import force_bytes
+from rest_framework import fields as serializer_fields
+from rest_framework.relations import ManyRelatedField, \
+    PrimaryKeyRelatedField
+from rest_framework.response import Response
+from rest_framework.serializers import BaseSerializer, ListSerializer, \
+    Serializer
+
+from rest_cereal.mixins import CerealMixin
+from rest_cereal.planning import get_model_relation, is_to_many
+from rest_cereal.serializers import MethodSerializerMixin
+
+
+class DatabaseJSONUnsupported(Exception):
+    pass
+
+
+class SQLiteJSON(object):
+
+    # levels of nested serializers (SQLite's parser limits the nesting of
+    # the subqueries)
+    max_depth = 5
+
+    probe = "SELECT json_object('a', 1), json_group_array(1)"
+
+    def object(self, keys_sql):
+        return 'json_object(' + ', '.join(keys_sql) + ')'
+
+    def key(self):
+        return '%s'
+
+    def embed(self, subquery):
+        # subquery results are text, not JSON
+        return 'json(' + subquery + ')'
+
+    def array(self, item, select):
+        return '(SELECT json_group_array(' + item + ') FROM (' + select + '))'
+
+    def boolean(self, column):
+        return 'json(CASE WHEN ' + column + ' IS NULL THEN NULL WHEN ' + \
+            column + " THEN 'true' ELSE 'false' END)"
+
+
+class PostgreSQLJSON(object):
+
+    max_depth = 20
+
+    probe = "SELECT json_build_object('a', 1), json_agg(1)"
+
+    def object(self, keys_sql):
+        return 'json_build_object(' + ', '.join(keys_sql) + ')'
+
+    def key(self):
+        return '%s::text'
+
+    def embed(self, subquery):
+        return subquery
+
+    def array(self, item, select):
+        return "(SELECT COALESCE(json_agg(cereal_item), '[]') FROM (" + \
+            select + ') AS cereal_items)'
+
+    def boolean(self, column):
+        return column
+
+
+dialects = {
+    'sqlite': SQLiteJSON,
+    'postgresql': PostgreSQLJSON,
+}
+
+# serializer fields (with their to_representation) the columns are
+# returned for
+_column_fields = (serializer_fields.IntegerField,
+                  serializer_fields.FloatField)
+_boolean_fields = (serializer_fields.BooleanField,
+                   serializer_fields.NullBooleanField)
+
+
+def _is_plain(field, base_class, method='to_representation'):
+    '''Whether the field's method is the one of the base class.
+    '''
+    function = getattr(type(field), method)
+    return getattr(function, '__func__', function) is \
+        getattr(getattr(base_class, method), '__func__',
+                getattr(base_class, method))
+
+
+def has_json_functions(connection):
+    '''Whether the database of the connection has the JSON functions of its
+    dialect (checked once per connection).
+    '''
+    supported = getattr(connection, '_cereal_json_functions', None)
+    if supported is None:
+        dialect_class = dialects.get(connection.vendor)
+        supported = False
+        if dialect_class is not None:
+            try:
+                # a failed query mustn't break the ongoing transaction
+                with transaction.atomic(using=connection.alias):
+                    with connection.cursor() as cursor:
+                        cursor.execute(dialect_class.probe)
+                supported = True
+            except DatabaseError:
+                pass
+        connection._cereal_json_functions = supported
+    return supported
+
+
+def check_plain_serializer(serializer, field_name=None):
+    '''Raises DatabaseJSONUnsupported unless the serializer's representation
+    is built from its fields (a Serializer not overriding to_representation).
+    '''
+    if isinstance(serializer, MethodSerializerMixin) or \
+            not isinstance(serializer, Serializer) or \
+            not _is_plain(serializer, Serializer) and \
+            not _is_plain(serializer, CerealMixin):
+        raise DatabaseJSONUnsupported(
+            "Field {0} can't be built in the database.".format(field_name)
+            if field_name else
+            "{0} can't be built in the database.".format(
+                type(serializer).__name__
+            )
+        )
+
+
+class JSONQueryCompiler(object):
+    '''Compiles the fields of a serializer into the SQL expression of the
+    JSON of an object.
+    '''
+
+    def __init__(self, connection):
+        if connection.vendor not in dialects:
+            raise DatabaseJSONUnsupported(
+                "Backend {0} isn't supported.".format(connection.vendor)
+            )
+        if not has_json_functions(connection):
+            raise DatabaseJSONUnsupported(
+                "The database doesn't have the JSON functions."
+            )
+        self.connection = connection
+        self.dialect = dialects[connection.vendor]()
+        self.aliases = 0
+
+    def new_alias(self):
+        self.aliases += 1
+        return 'cereal_t{0}'.format(self.aliases)
+
+    def column(self, alias, column):
+        quote_name = self.connection.ops.quote_name
+        return quote_name(alias) + '.' + quote_name(column)
+
+    def compile_object(self, serializer, model, alias, depth=0):
+        '''Returns the (sql, params) of the JSON object of the row of the
+        model under the alias.
+        '''
+        if depth > self.dialect.max_depth:
+            raise DatabaseJSONUnsupported(
+                'Serializers are nested more than {0} levels deep.'.format(
+                    self.dialect.max_depth
+                )
+            )
+        keys_sql = []
+        params = []
+        for field in serializer.fields.values():
+            if field.write_only:
+                continue
+            value_sql, value_params = self.compile_field(field, model, alias,
+                                                         depth)
+            keys_sql.append(self.dialect.key() + ', ' + value_sql)
+            params.append(field.field_name)
+            params += value_params
+        return self.dialect.object(keys_sql), params
+
+    def compile_field(self, field, model, alias, depth):
+        if len(field.source_attrs) != 1:
+            raise DatabaseJSONUnsupported(
+                "Field {0} doesn't read a model field.".format(
+                    field.field_name
+                )
+            )
+        source = field.source_attrs[0]
+        if isinstance(field, BaseSerializer):
+            return self.compile_nested(field, model, alias, source, depth)
+        if isinstance(field, ManyRelatedField) and \
+                type(field.child_relation) is PrimaryKeyRelatedField:
+            return self.compile_primary_keys(model, alias, source,
+                                             field.field_name)
+
+        try:
+            model_field = model._meta.get_field(source)
+        except FieldDoesNotExist:
+            model_field = None
+        if model_field is None or not getattr(model_field, 'concrete',
+                                              False):
+            raise DatabaseJSONUnsupported(
+                "Field {0} doesn't read a model field.".format(
+                    field.field_name
+                )
+            )
+        column = self.column(alias, model_field.column)
+        if type(field) is PrimaryKeyRelatedField and \
+                model_field.many_to_one and \
+                model_field.target_field.primary_key:
+            return column, []
+        if not model_field.is_relation:
+            if any(_is_plain(field, field_class)
+                   for field_class in _boolean_fields):
+                return self.dialect.boolean(column), []
+            if any(_is_plain(field, field_class)
+                   for field_class in _column_fields):
+                return column, []
+            if _is_plain(field, serializer_fields.CharField) and \
+                    isinstance(model_field, (models.CharField,
+                                             models.TextField)):
+                return column, []
+        raise DatabaseJSONUnsupported(
+            "Field {0} can't be built in the database.".format(
+                field.field_name
+            )
+        )
+
+    def get_relation(self, model, source, field_name):
+        relation = get_model_relation(model, source)
+        if relation is None or isinstance(relation, OneToOneRel):
+            raise DatabaseJSONUnsupported(
+                "Field {0} doesn't read a supported relation.".format(
+                    field_name
+                )
+            )
+        return relation
+
+    def compile_related_rows(self, relation, model, parent_alias, alias):
+        '''Returns the FROM and WHERE sql of the rows related to the row of
+        the model under parent_alias.
+        '''
+        quote_name = self.connection.ops.quote_name
+        related_meta = relation.related_model._meta
+        sql = ' FROM ' + quote_name(related_meta.db_table) + ' ' + \
+            quote_name(alias)
+        if relation.many_to_many:
+            if isinstance(relation, ForeignObjectRel):
+                field = relation.field
+                parent_column = field.m2m_reverse_name()
+                related_column = field.m2m_column_name()
+            else:
+                field = relation
+                parent_column = field.m2m_column_name()
+                related_column = field.m2m_reverse_name()
+            through_alias = alias + '_through'
+            return sql + ' INNER JOIN ' + \
+                quote_name(field.remote_field.through._meta.db_table) + \
+                ' ' + quote_name(through_alias) + ' ON ' + \
+                self.column(through_alias, related_column) + ' = ' + \
+                self.column(alias, related_meta.pk.column) + ' WHERE ' + \
+                self.column(through_alias, parent_column) + ' = ' + \
+                self.column(parent_alias, model._meta.pk.column)
+        if isinstance(relation, ForeignObjectRel):
+            # reverse foreign key
+            field = relation.field
+            return sql + ' WHERE ' + self.column(alias, field.column) + \
+                ' = ' + self.column(parent_alias,
+                                    field.target_field.column)
+        return sql + ' WHERE ' + \
+            self.column(alias, relation.target_field.column) + ' = ' + \
+            self.column(parent_alias, relation.column)
+
+    def get_ordering(self, model, alias):
+        columns = []
+        for name in model._meta.ordering or ['pk']:
+            descending = name.startswith('-')
+            name = name.lstrip('-')
+            try:
+                model_field = model._meta.pk if name == 'pk' else \
+                    model._meta.get_field(name)
+            except FieldDoesNotExist:
+                model_field = None
+            if model_field is None or not getattr(model_field, 'column',
+                                                  None):
+                raise DatabaseJSONUnsupported(
+                    "Ordering {0} of {1} isn't supported.".format(
+                        name, model.__name__
+                    )
+                )
+            columns.append(self.column(alias, model_field.column) +
+                           (' DESC' if descending else ''))
+        return ' ORDER BY ' + ', '.join(columns)
+
+    def compile_nested(self, field, model, parent_alias, source, depth):
+        many = isinstance(field, ListSerializer)
+        serializer = field.child if many else field
+        check_plain_serializer(serializer, field.field_name)
+        relation = self.get_relation(model, source, field.field_name)
+        if many != is_to_many(relation):
+            raise DatabaseJSONUnsupported(
+                "Field {0} doesn't match its relation.".format(
+                    field.field_name
+                )
+            )
+        related_model = relation.related_model
+        alias = self.new_alias()
+        object_sql, params = self.compile_object(serializer, related_model,
+                                                 alias, depth + 1)
+        rows_sql = self.compile_related_rows(relation, model, parent_alias,
+                                             alias)
+        if not many:
+            return self.dialect.embed(
+                '(SELECT ' + object_sql + rows_sql + ')'
+            ), params
+        select = 'SELECT ' + object_sql + ' AS cereal_item' + rows_sql + \
+            self.get_ordering(related_model, alias)
+        item = self.dialect.embed('cereal_item')
+        return self.dialect.embed(self.dialect.array(item, select)), params
+
+    def compile_primary_keys(self, model, parent_alias, source, field_name):
+        relation = self.get_relation(model, source, field_name)
+        related_model = relation.related_model
+        alias = self.new_alias()
+        select = 'SELECT ' + \
+            self.column(alias, related_model._meta.pk.column) + \
+            ' AS cereal_item' + \
+            self.compile_related_rows(relation, model, parent_alias,
+                                      alias) + \
+            self.get_ordering(related_model, alias)
+        return self.dialect.embed(self.dialect.array('cereal_item', select)), \
+            []
+
+
+def get_json_rows(serializer, queryset):
+    '''Returns the JSON text of each object of the queryset, as serialized
+    by the (non-list) serializer.
+
+    :raises DatabaseJSONUnsupported: if the serializer's fields can't be
+        built in the database
+    '''
+    check_plain_serializer(serializer)
+    compiler = JSONQueryCompiler(connections[queryset.db])
+    queryset = queryset.prefetch_related(None)
+    alias = queryset.query.get_initial_alias()
+    sql, params = compiler.compile_object(serializer, queryset.model, alias)
+    return list(
+        queryset.extra(select={'cereal_json': sql}, select_params=params)
+        .values_list('cereal_json', flat=True)
+    )
+
+
+class DatabaseJSONResponse(Response):
+    '''Response rendering the JSON text of the rows as a JSON array.
+    '''
+
+    def __init__(self, rows, **kwargs):
+        super(DatabaseJSONResponse, self).__init__(**kwargs)
+        self.rows = rows
+
+    @property
+    def rendered_content(self):
+        self['Content-Type'] = 'application/json'
+        return b'[' + b','.join(force_bytes(row) for row in self.rows) + b']'
@@ -0,0 +1,32 @@
+'''Time budgets of the serialization of CerealMixin views' responses (see
+CerealViewMixin.serialization_budget).
+
+The deadline of a request is in the serializer context as
+'cereal_deadline'. CerealMixin serializers check it before serializing each
+object (the rows of a list and their nested objects), and raise
+SerializationTimeout once it's passed, which is returned as a 503.
+'''
+import time
+
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+
+class SerializationTimeout(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'The response took too long to serialize.'
+
+
+class Deadline(object):
+    '''
+    :param seconds: the time budget, starting now
+    :param timer: returns the current time in seconds
+    '''
+
+    def __init__(self, seconds, timer=time.time):
+        self.timer = timer
+        self.expires = timer() + seconds
+
+    def check(self):
+        if self.timer() > self.expires:
+            raise SerializationTimeout()
@@ -0,0 +1,137 @@
+'''An index of the fields each serializer class allows in a fields tree, and
+of the serializer classes its nested fields lead to.
+
+Validating a CerealFields tree against the index is a walk over dicts and
+sets: no serializer is instantiated and no queries run, so views can reject
+bad fields parameters before touching the database (see
+CerealViewMixin.check_fields). Serializer classes are indexed the first
+time they are reached, or at startup with BUILD_AT_STARTUP (see
+rest_cereal.apps).
+
+Building the index doesn't instantiate the serializers either:
+get_default_field_names is called on an uninitialized serializer, so it
+mustn't depend on the attributes __init__ sets.
+'''
+from rest_framework.serializers import BaseSerializer
+from rest_framework.utils import model_meta
+
+from rest_cereal.mixins import CerealMixin, CerealException
+from rest_cereal.planning import get_nested_serializer
+from rest_cereal.serializers import LazySerializer
+
+
+class SerializerNode(object):
+    '''The fields a serializer class allows.
+
+    :param field_names: set of the names allowed as normal fields
+    :param nested: {field name: nested serializer class}
+    :param circular: whether the serializer is declared circular (and must
+    be given fields)
+    :param require_default_option: whether the ':default' option makes the
+    serializer ignore the tree (see CerealMixin.REQUIRE_DEFAULT_OPTION)
+    '''
+
+    def __init__(self, field_names, nested, circular=False,
+                 require_default_option=True):
+        self.field_names = field_names
+        self.nested = nested
+        self.circular = circular
+        self.require_default_option = require_default_option
+
+
+def build_node(serializer_class):
+    meta = getattr(serializer_class, 'Meta', None)
+    model = getattr(meta, 'model', None)
+    declared_fields = LazySerializer.get_declared_fields(serializer_class)
+
+    nested = {}
+    for field_name, field in declared_fields.items():
+        nested_serializer = get_nested_serializer(field)
+        if isinstance(nested_serializer, BaseSerializer):
+            nested[field_name] = nested_serializer.__class__
+
+    field_names = set(declared_fields) | set(nested)
+    if model is not None:
+        # the same names CerealMixin.get_field_names allows
+        declared_names = getattr(meta, 'fields', None)
+        if isinstance(declared_names, (list, tuple)):
+            field_names.update(declared_names)
+        # without running __init__ (see the module docstring)
+        serializer = serializer_class.__new__(serializer_class)
+        field_names.update(serializer.get_default_field_names(
+            declared_fields, model_meta.get_field_info(model)
+        ))
+
+    return SerializerNode(
+        field_names, nested,
+        circular=getattr(meta, 'circular', False),
+        require_default_option=getattr(
+            serializer_class, 'REQUIRE_DEFAULT_OPTION',
+            CerealMixin.REQUIRE_DEFAULT_OPTION
+        )
+    )
+
+
+class SerializerGraph(object):
+    '''{serializer class: SerializerNode}, built as classes are reached.
+    '''
+
+    def __init__(self):
+        self.nodes = {}
+
+    def get_node(self, serializer_class):
+        node = self.nodes.get(serializer_class)
+        if node is None:
+            node = build_node(serializer_class)
+            self.nodes[serializer_class] = node
+        return node
+
+    def build(self, serializer_classes):
+        '''Indexes the serializer classes and every serializer class their
+        nested fields lead to.
+        '''
+        pending = list(serializer_classes)
+        while pending:
+            serializer_class = pending.pop()
+            if serializer_class in self.nodes:
+                continue
+            pending.extend(self.get_node(serializer_class).nested.values())
+
+    def validate(self, serializer_class, cereal_fields):
+        '''Raises a CerealException for the first field of the tree the
+        serializers don't allow (the same errors serializing would raise).
+
+        :param serializer_class: the top-level serializer class
+        :param cereal_fields: CerealFields object, with its presets resolved
+        '''
+        pending = [(serializer_class, cereal_fields)]
+        while pending:
+            serializer_class, cereal_fields = pending.pop()
+            node = self.get_node(serializer_class)
+            if node.require_default_option and \
+                    'default' in cereal_fields.options:
+                # the serializer's default fields are used
+                continue
+            if node.circular and not cereal_fields.normal_fields and \
+                    not cereal_fields.nested_fields:
+                raise CerealException(
+                    "Circular Serializer for model {0} had no fields defined "
+                    "in the request."
+                    .format(str(serializer_class.Meta.model))
+                )
+            for field_name in cereal_fields.normal_fields:
+                if field_name not in node.field_names:
+                    raise CerealException(
+                        "Field {0} isn't defined in serializer."
+                        .format(field_name)
+                    )
+            for field_name, nested in cereal_fields.nested_fields.items():
+                if field_name not in node.nested:
+                    raise CerealException(
+                        "Field {0} isn't defined in serializer."
+                        .format(field_name)
+                    )
+                pending.append((node.nested[field_name], nested))
+
+
+serializer_graph = SerializerGraph()
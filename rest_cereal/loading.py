@@ -0,0 +1,235 @@
+'''A per-request batch loader (see CerealViewMixin.batch_loading), so
+objects of a model needed at several paths of a fields tree are loaded once.
+
+In circular trees, the same model is often reached through several
+relations: ex: the nest1 and nest2 of the items of twonestedparent1 are
+both NestedTestModels, and Django prefetches them with one query each, even
+when their primary keys overlap. With a BatchLoader, the prefetches are run
+level by level (one level per '__' in the lookups), and the forward foreign
+keys to a model at the same level are loaded with one pk__in query. Objects
+are kept in an identity map for the whole request, so the objects already
+loaded at another path aren't queried again.
+
+MethodSerializerMixin methods can load objects through the loader of the
+request, in the context:
+
+def get_captain(self, obj):
+    return self.context['cereal_loader'].get(Player, obj.captain_id)
+
+The primary keys wanted (see BatchLoader.want) are loaded together the next
+time objects of the model are needed.
+'''
+from django.db.models.fields.related import ForeignObjectRel
+from django.db.models.query import Prefetch, get_prefetcher, \
+    prefetch_related_objects
+
+from rest_cereal.planning import get_model_relation, is_to_many
+
+
+class BatchLoader(object):
+    '''Identity map of the objects loaded by primary key during a request,
+    by (model, queryset shape). The shape is the SQL of the queryset the
+    objects are loaded from (None for the model's default manager), so
+    objects loaded through differently filtered querysets aren't mixed.
+    '''
+
+    def __init__(self, using=None):
+        # database the objects are loaded from (None: the default routing)
+        self.using = using
+        # {(model, shape): {pk: object}}
+        self.objects = {}
+        # {(model, shape): set of wanted pks}
+        self.pending = {}
+        # {(model, shape): queryset}
+        self.querysets = {}
+        self.queries = 0
+
+    def get_key(self, model, queryset=None):
+        if queryset is None:
+            return model, None
+        key = (model, str(queryset.query))
+        self.querysets.setdefault(key, queryset)
+        return key
+
+    def want(self, model, pks, queryset=None):
+        '''Queues primary keys, loaded with the next load or get of the
+        model (and queryset shape).
+        '''
+        key = self.get_key(model, queryset)
+        pending = self.pending.setdefault(key, set())
+        pending.update(pk for pk in pks if pk is not None)
+
+    def add(self, model, instances):
+        '''Adds objects loaded elsewhere (ex: by a prefetch) to the identity
+        map.
+        '''
+        objects = self.objects.setdefault((model, None), {})
+        for instance in instances:
+            objects.setdefault(instance.pk, instance)
+
+    def load(self, model, pks, queryset=None):
+        '''Returns {pk: object} for the primary keys, loading the ones that
+        aren't loaded yet (and the wanted ones) with one pk__in query.
+        Primary keys without objects are left out.
+        '''
+        key = self.get_key(model, queryset)
+        objects = self.objects.setdefault(key, {})
+        pks = set(pk for pk in pks if pk is not None)
+        missing = (pks | self.pending.pop(key, set())) - set(objects)
+        if missing:
+            if queryset is None:
+                queryset = model._default_manager.db_manager(
+                    self.using
+                ).all()
+            else:
+                queryset = self.querysets[key]
+            for instance in queryset.filter(pk__in=missing):
+                objects[instance.pk] = instance
+            self.queries += 1
+        return dict((pk, objects[pk]) for pk in pks if pk in objects)
+
+    def get(self, model, pk, queryset=None):
+        '''Returns the object with the primary key, or None.
+        '''
+        return self.load(model, [pk], queryset).get(pk)
+
+
+def get_related_objects(instances, name):
+    '''Returns the distinct objects related to the instances through the
+    relation name (already joined or prefetched).
+    '''
+    related_objects = []
+    seen = set()
+    for instance in instances:
+        value = getattr(instance, name)
+        if value is None:
+            continue
+        if hasattr(value, 'get_prefetch_queryset'):
+            related = value.all()
+        elif isinstance(value, list):
+            # Prefetch to_attr
+            related = value
+        else:
+            related = [value]
+        for related_object in related:
+            if id(related_object) not in seen:
+                seen.add(id(related_object))
+                related_objects.append(related_object)
+    return related_objects
+
+
+def get_lookup_path(lookup):
+    return lookup.prefetch_to if isinstance(lookup, Prefetch) else lookup
+
+
+def is_batchable(relation):
+    '''Forward foreign keys (and one to ones) to a primary key are loaded by
+    the BatchLoader.
+    '''
+    return relation is not None and \
+        not isinstance(relation, ForeignObjectRel) and \
+        not is_to_many(relation) and relation.target_field.primary_key
+
+
+def prefetch_with_loader(instances, lookups, loader):
+    '''Runs the prefetch lookups on the instances level by level. At each
+    level, the forward foreign keys are grouped by related model and loaded
+    by the BatchLoader, the other relations are prefetched by Django.
+    '''
+    # {path: objects at the path}
+    level_objects = {'': list(instances)}
+    if instances:
+        loader.add(instances[0].__class__, instances)
+
+    def get_objects(path):
+        if path not in level_objects:
+            prefix, _, name = path.rpartition('__')
+            level_objects[path] = get_related_objects(get_objects(prefix),
+                                                      name)
+        return level_objects[path]
+
+    levels = {}
+    for lookup in lookups:
+        depth = get_lookup_path(lookup).count('__')
+        levels.setdefault(depth, []).append(lookup)
+
+    for depth in sorted(levels):
+        # {related model: [(parent objects, foreign key, path)]}
+        batches = {}
+        for lookup in levels[depth]:
+            path = get_lookup_path(lookup)
+            prefix, _, name = path.rpartition('__')
+            parents = get_objects(prefix)
+            if not parents:
+                level_objects[path] = []
+                continue
+            relation = get_model_relation(parents[0].__class__, name)
+            if isinstance(lookup, Prefetch) or not is_batchable(relation):
+                # only prefetch the parents that aren't prefetched yet (the
+                # identity map can share them between paths)
+                unfetched = [parent for parent in parents
+                             if not get_prefetcher(parent, name)[3]]
+                if isinstance(lookup, Prefetch):
+                    lookup = Prefetch(
+                        lookup.prefetch_through.rpartition('__')[2],
+                        lookup.queryset, lookup.to_attr
+                    )
+                    if lookup.to_attr:
+                        unfetched = parents
+                if unfetched:
+                    prefetch_related_objects(unfetched, [lookup])
+                level_objects[path] = get_related_objects(parents, name)
+                if relation is not None and not isinstance(lookup, Prefetch):
+                    loader.add(relation.related_model, level_objects[path])
+                continue
+            batches.setdefault(relation.related_model, []).append(
+                (parents, relation, path)
+            )
+
+        for model, batch in batches.items():
+            pks = set(getattr(parent, relation.attname)
+                      for parents, relation, _ in batch
+                      for parent in parents)
+            loaded = loader.load(model, pks)
+            for parents, relation, path in batch:
+                cache_name = relation.get_cache_name()
+                for parent in parents:
+                    setattr(parent, cache_name,
+                            loaded.get(getattr(parent, relation.attname)))
+                level_objects[path] = get_related_objects(
+                    parents, relation.name
+                )
+
+
+class BatchPrefetchMixin(object):
+    '''QuerySet mixin running the prefetches with the BatchLoader in
+    cereal_loader (see prefetch_with_loader).
+    '''
+
+    cereal_loader = None
+
+    def _clone(self, **kwargs):
+        kwargs.setdefault('cereal_loader', self.cereal_loader)
+        return super(BatchPrefetchMixin, self)._clone(**kwargs)
+
+    def _prefetch_related_objects(self):
+        if self.cereal_loader is None or not self._result_cache:
+            return super(BatchPrefetchMixin, self)._prefetch_related_objects()
+        prefetch_with_loader(self._result_cache,
+                             self._prefetch_related_lookups,
+                             self.cereal_loader)
+        self._prefetch_done = True
+
+
+# {QuerySet class: batch QuerySet class}
+_batch_queryset_classes = {}
+
+
+def get_batch_queryset_class(queryset_class):
+    batch_class = _batch_queryset_classes.get(queryset_class)
+    if batch_class is None:
+        batch_class = type('BatchPrefetch' + queryset_class.__name__,
+                           (BatchPrefetchMixin, queryset_class), {})
+        batch_class = _batch_queryset_classes.setdefault(queryset_class,
+                                                         batch_class)
+    return batch_class
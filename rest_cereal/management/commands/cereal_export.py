@@ -0,0 +1,250 @@
+import csv
+import json
+import os
+import tempfile
+from multiprocessing import Pool
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Max, Min
+from django.utils import six
+from django.utils.module_loading import import_string
+from rest_framework.utils.encoders import JSONEncoder
+
+from rest_cereal.mixins import CerealException, CerealListSerializer, \
+    CerealMixin
+
+
+def parse_filters(filters):
+    '''['field1=3', 'field2__gte=4'] -> {'field1': '3', 'field2__gte': '4'}
+    '''
+    parsed = {}
+    for lookup in filters:
+        if '=' not in lookup:
+            raise CommandError(
+                "Filter {0} isn't of the form lookup=value.".format(lookup)
+            )
+        key, value = lookup.split('=', 1)
+        parsed[key] = value
+    return parsed
+
+
+def iter_chunks(queryset, chunk_size):
+    '''Yields lists of at most chunk_size objects from the queryset, ordered
+    by primary key. Each chunk is a separate (keyset paginated) query, so the
+    query plan's prefetches are done per chunk.
+    '''
+    queryset = queryset.order_by('pk')
+    last_pk = None
+    while True:
+        chunk_queryset = queryset
+        if last_pk is not None:
+            chunk_queryset = queryset.filter(pk__gt=last_pk)
+        chunk = list(chunk_queryset[:chunk_size])
+        if not chunk:
+            return
+        yield chunk
+        last_pk = chunk[-1].pk
+
+
+def split_pk_range(min_pk, max_pk, parts):
+    '''Splits [min_pk, max_pk] into at most `parts` contiguous ranges.
+
+    :raises CommandError: if the primary keys aren't integers (ex: UUIDs)
+    '''
+    if min_pk is None:
+        return []
+    if not isinstance(min_pk, six.integer_types) or \
+            not isinstance(max_pk, six.integer_types):
+        raise CommandError(
+            "--processes requires integer primary keys, not {0}."
+            .format(type(min_pk).__name__)
+        )
+    size = max((max_pk - min_pk + parts) // parts, 1)
+    return [(start, min(start + size - 1, max_pk))
+            for start in range(min_pk, max_pk + 1, size)]
+
+
+def format_csv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, (dict, list)):
+        value = json.dumps(value, cls=JSONEncoder)
+    if six.PY2 and isinstance(value, six.text_type):
+        value = value.encode('utf-8')
+    return value
+
+
+class Exporter(object):
+    '''Serializes the objects of a CerealMixin serializer's model, chunk by
+    chunk, as NDJSON or CSV lines.
+    '''
+
+    formats = ('ndjson', 'csv')
+
+    def __init__(self, serializer_path, fields, filters, format='ndjson',
+                 chunk_size=1000):
+        self.serializer_path = serializer_path
+        self.fields = fields
+        self.filters = filters
+        self.format = format
+        self.chunk_size = chunk_size
+
+        try:
+            self.serializer_class = import_string(serializer_path)
+        except ImportError as error:
+            raise CommandError(str(error))
+        if not issubclass(self.serializer_class, CerealMixin):
+            raise CommandError(
+                "{0} doesn't inherit the CerealMixin.".format(serializer_path)
+            )
+        if format not in self.formats:
+            raise CommandError("Unknown format {0}.".format(format))
+
+        # as the views do: presets resolved, validated and planned
+        try:
+            compiled = self.serializer_class.get_compiled_fields(fields) or \
+                CerealMixin.compile_fields(
+                    self.serializer_class,
+                    CerealMixin.parse_fields_to_nested_tree(fields)
+                )
+        except CerealException as error:
+            raise CommandError(error.detail)
+        self.cereal_fields = compiled.cereal_fields
+        self.plan = compiled.plan
+
+    def get_queryset(self, pk_range=None):
+        model = self.serializer_class.Meta.model
+        queryset = model._default_manager.filter(**self.filters)
+        if pk_range is not None:
+            queryset = queryset.filter(pk__gte=pk_range[0],
+                                       pk__lte=pk_range[1])
+        return self.plan.apply(queryset)
+
+    def get_serializer(self, instances=None):
+        return self.serializer_class(
+            instances, many=True, cereal_fields=self.cereal_fields,
+            context={}
+        )
+
+    def get_columns(self):
+        return self.get_serializer().child.get_compact_columns()
+
+    def header_lines(self):
+        if self.format == 'csv':
+            return self.csv_lines(
+                [['.'.join(column) for column in self.get_columns()]]
+            )
+        return []
+
+    def csv_lines(self, rows):
+        buffer = six.StringIO()
+        writer = csv.writer(buffer, lineterminator='\n')
+        for row in rows:
+            writer.writerow([format_csv_value(value) for value in row])
+        return [buffer.getvalue()]
+
+    def lines(self, pk_range=None):
+        '''Yields the serialized rows (without the CSV header).
+        '''
+        columns = self.get_columns()
+        for chunk in iter_chunks(self.get_queryset(pk_range), self.chunk_size):
+            rows = self.get_serializer(chunk).data
+            if self.format == 'csv':
+                for line in self.csv_lines(
+                        CerealListSerializer.compact_row(row, columns)
+                        for row in rows):
+                    yield line
+            else:
+                for row in rows:
+                    yield json.dumps(row, cls=JSONEncoder) + '\n'
+
+    def pk_ranges(self, parts):
+        bounds = self.get_queryset().aggregate(Min('pk'), Max('pk'))
+        return split_pk_range(bounds['pk__min'], bounds['pk__max'], parts)
+
+
+def export_pk_range(args):
+    '''Process pool task: writes the rows in a primary key range to a
+    temporary file and returns its path.
+    '''
+    exporter_kwargs, pk_range = args
+    exporter = Exporter(**exporter_kwargs)
+    file_descriptor, path = tempfile.mkstemp(suffix='.cereal_export')
+    with os.fdopen(file_descriptor, 'w') as part:
+        for line in exporter.lines(pk_range):
+            part.write(line)
+    connections.close_all()
+    return path
+
+
+class Command(BaseCommand):
+    help = ("Export the objects of a CerealMixin serializer's model as NDJSON "
+            "or CSV, selecting the serialized fields with a fields string.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('serializer',
+            help='Dotted path to the serializer class.')
+        parser.add_argument('--fields',
+            help='Fields string, as in the fields query parameter (required).')
+        parser.add_argument('--filter', dest='filters', action='append',
+            default=[],
+            help='Queryset filter of the form lookup=value (can be repeated).')
+        parser.add_argument('--format', default='ndjson',
+            choices=Exporter.formats, help='Output format.')
+        parser.add_argument('--chunk-size', dest='chunk_size', type=int,
+            default=1000, help='Number of objects fetched per query.')
+        parser.add_argument('--processes', type=int, default=1,
+            help='Split the primary key range across this many processes.')
+        parser.add_argument('-o', '--output', default=None,
+            help='File to write to (defaults to stdout).')
+
+    def handle(self, *args, **options):
+        if not options['fields']:
+            raise CommandError('--fields is required.')
+
+        exporter_kwargs = {
+            'serializer_path': options['serializer'],
+            'fields': options['fields'],
+            'filters': parse_filters(options['filters']),
+            'format': options['format'],
+            'chunk_size': options['chunk_size'],
+        }
+        exporter = Exporter(**exporter_kwargs)
+
+        output = options['output']
+        stream = open(output, 'w') if output else None
+        try:
+            write = stream.write if stream else \
+                (lambda line: self.stdout.write(line, ending=''))
+            for line in exporter.header_lines():
+                write(line)
+
+            processes = options['processes']
+            if processes > 1:
+                self.export_in_processes(exporter, exporter_kwargs,
+                                         processes, write)
+            else:
+                for line in exporter.lines():
+                    write(line)
+        finally:
+            if stream:
+                stream.close()
+
+    def export_in_processes(self, exporter, exporter_kwargs, processes,
+                            write):
+        tasks = [(exporter_kwargs, pk_range)
+                 for pk_range in exporter.pk_ranges(processes)]
+        # Connections mustn't be shared with the forked processes.
+        connections.close_all()
+        pool = Pool(processes)
+        try:
+            paths = pool.map(export_pk_range, tasks)
+        finally:
+            pool.close()
+            pool.join()
+        for path in paths:
+            with open(path) as part:
+                for line in part:
+                    write(line)
+            os.remove(path)
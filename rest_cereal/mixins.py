@@ -1,12 +1,285 @@
 import random
-from rest_framework.exceptions import APIException
-from rest_cereal.serializers import MethodSerializerMixin
+from collections import OrderedDict
+from copy import deepcopy
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models import Manager
+from rest_framework.exceptions import APIException, ValidationError
+from rest_framework.fields import SkipField
+from rest_framework.relations import PrimaryKeyRelatedField
+from rest_framework.serializers import BaseSerializer, ListSerializer, \
+    LIST_SERIALIZER_KWARGS
+from rest_framework.utils import model_meta
+from rest_framework.utils.serializer_helpers import ReturnDict, ReturnList
+from rest_cereal.concurrency import run_concurrently
+from rest_cereal.deadline import SerializationTimeout
+from rest_cereal.persisted import PersistedFieldsStore
+from rest_cereal.planning import QueryPlan, get_nested_serializer, \
+    plan_query
+from rest_cereal.planstore import get_plan_key, get_plan_source, \
+    get_plan_store
+from rest_cereal.settings import cereal_settings
+from rest_cereal.serializers import LazySerializer, MethodSerializerMixin
+from rest_cereal.writing import LoadedPrimaryKeyRelatedField, \
+    create_objects, update_objects, want_related_objects
 
 
 class CerealException(APIException):
     status_code = 400
 
 
+class CompiledFields(object):
+    '''A CerealFields tree for a serializer class with its presets resolved,
+    validated and planned (see CerealMixin.compile_fields). Named presets and
+    persisted fields are kept compiled.
+    '''
+
+    def __init__(self, cereal_fields, plan):
+        self.cereal_fields = cereal_fields
+        self.plan = plan
+
+    def to_data(self):
+        '''Returns the compiled fields as JSON serializable data.
+        '''
+        return {
+            'fields': self.cereal_fields.to_fields_string(canonical=False),
+            'select_related': self.plan.select_related,
+            'prefetch_related': self.plan.prefetch_related,
+        }
+
+    @staticmethod
+    def from_data(data):
+        '''Loads compiled fields from to_data() (they aren't validated
+        again).
+        '''
+        return CompiledFields(
+            CerealMixin.parse_fields_to_nested_tree(data['fields'],
+                                                    FieldsLimits()),
+            QueryPlan(data['select_related'], data['prefetch_related'])
+        )
+
+
+class FieldsLimits(object):
+    '''Limits of a fields string, checked while it's parsed so oversized
+    strings are rejected before the whole tree is built. None: no limit.
+
+    :param max_length: characters in the string
+    :param max_depth: levels of nesting
+    :param max_nodes: fields (normal and nested) in the whole tree
+    :param max_fields_per_node: fields, options and presets of a single
+    serializer
+    '''
+
+    def __init__(self, max_length=None, max_depth=None, max_nodes=None,
+                 max_fields_per_node=None):
+        self.max_length = max_length
+        self.max_depth = max_depth
+        self.max_nodes = max_nodes
+        self.max_fields_per_node = max_fields_per_node
+
+    @classmethod
+    def from_settings(cls):
+        return cls(
+            max_length=cereal_settings.FIELDS_MAX_LENGTH,
+            max_depth=cereal_settings.FIELDS_MAX_DEPTH,
+            max_nodes=cereal_settings.FIELDS_MAX_NODES,
+            max_fields_per_node=cereal_settings.FIELDS_MAX_FIELDS_PER_NODE,
+        )
+
+    def check_length(self, length):
+        if self.max_length is not None and length > self.max_length:
+            raise CerealException(
+                "Fields parameter is too long: it has more than {0} "
+                "characters.".format(self.max_length)
+            )
+
+    def check_depth(self, depth):
+        if self.max_depth is not None and depth > self.max_depth:
+            raise CerealException(
+                "Fields parameter is too deep: it nests more than {0} "
+                "levels.".format(self.max_depth)
+            )
+
+    def check_nodes(self, nodes):
+        if self.max_nodes is not None and nodes > self.max_nodes:
+            raise CerealException(
+                "Fields parameter has too many fields: more than {0}."
+                .format(self.max_nodes)
+            )
+
+    def check_node_fields(self, cereal_fields):
+        if self.max_fields_per_node is None:
+            return
+        node_fields = len(cereal_fields.normal_fields) + \
+            len(cereal_fields.nested_fields) + len(cereal_fields.options) + \
+            len(cereal_fields.presets)
+        if node_fields > self.max_fields_per_node:
+            raise CerealException(
+                "Fields parameter has too many fields in a single "
+                "serializer: more than {0}.".format(self.max_fields_per_node)
+            )
+
+
+# {(serializer class, preset name): CompiledFields}
+_compiled_presets = {}
+
+# {(serializer class, persisted fields hash): CompiledFields}, least recently
+# used first
+_compiled_persisted_fields = OrderedDict()
+
+# {(serializer class, fields parameter): CompiledFields} of the fields
+# parameters compiled ahead of requests (see rest_cereal.warmup)
+_compiled_fields_parameters = {}
+
+# {serializer class: CerealTemp class} of the temporary classes nested
+# serializers are instantiated with
+_temp_classes = {}
+
+
+class CerealListSerializer(ListSerializer):
+    '''The ListSerializer used when a CerealMixin serializer is initialized
+    with many=True.
+
+    Passing the ':compact' option at the top level of the fields parameter
+    returns a tabular representation instead of a list of objects:
+
+    fields=id,team(id,name),:compact ->
+    {"fields": ["id", "team.id", "team.name"], "rows": [[1, 2, "a"], ...]}
+
+    Nested to-one fields are flattened into dotted columns. Nested to-many
+    fields keep their (non-compact) representation inside their cell.
+
+    With a deadline in the context (see rest_cereal.deadline), the
+    ':partial' option at the top level returns the rows serialized before
+    the deadline instead of failing: timed_out is then set, and the rows
+    after them can be requested again (see CerealViewMixin).
+
+    Lists of write serializers are created and updated in bulk (see
+    rest_cereal.writing).
+    '''
+
+    timed_out = False
+
+    def is_compact(self):
+        cereal_fields = getattr(self.child, 'cereal_fields', None)
+        return getattr(self, 'parent', None) is None and \
+            cereal_fields is not None and \
+            'compact' in cereal_fields.options
+
+    def is_partial(self):
+        cereal_fields = getattr(self.child, 'cereal_fields', None)
+        return getattr(self, 'parent', None) is None and \
+            cereal_fields is not None and \
+            'partial' in cereal_fields.options
+
+    def to_representation(self, data):
+        thread_pool = self.context.get('cereal_thread_pool')
+        if thread_pool is not None and self.parent is None and \
+                isinstance(self.child, CerealMixin):
+            # the method fields of the whole page are called concurrently
+            data = list(data.all() if isinstance(data, Manager) else data)
+            self.child.prefetch_method_values(data, thread_pool)
+        try:
+            if self.context.get('cereal_deadline') is not None and \
+                    self.is_partial():
+                rows = self.to_partial_representation(data)
+            else:
+                rows = super(CerealListSerializer, self).to_representation(
+                    data
+                )
+        finally:
+            self.child._cereal_method_values = None
+        if not self.is_compact():
+            return rows
+
+        columns = self.child.get_compact_columns()
+        return OrderedDict([
+            ('fields', ['.'.join(column) for column in columns]),
+            ('rows', [self.compact_row(row, columns) for row in rows])
+        ])
+
+    def to_partial_representation(self, data):
+        '''Serializes the rows until the deadline passes.
+        '''
+        self.timed_out = False
+        rows = []
+        for item in data.all() if isinstance(data, Manager) else data:
+            try:
+                rows.append(self.child.to_representation(item))
+            except SerializationTimeout:
+                self.timed_out = True
+                break
+        return rows
+
+    def to_internal_value(self, data):
+        loader = self.context.get('cereal_loader')
+        if loader is not None and isinstance(data, list):
+            want_related_objects(self.child, data, loader)
+        if not isinstance(self.instance, list) or \
+                not isinstance(data, list):
+            return super(CerealListSerializer, self).to_internal_value(data)
+
+        # bulk update: each item is validated against its instance (ex: by
+        # UniqueValidators)
+        ret = []
+        errors = []
+        child_instance = self.child.instance
+        try:
+            for item, instance in zip(data, self.instance):
+                self.child.instance = instance
+                try:
+                    validated = self.child.run_validation(item)
+                except ValidationError as exc:
+                    errors.append(exc.detail)
+                else:
+                    ret.append(validated)
+                    errors.append({})
+        finally:
+            self.child.instance = child_instance
+        if any(errors):
+            raise ValidationError(errors)
+        return ret
+
+    def save(self, *args, **kwargs):
+        if isinstance(self.child, CerealMixin) and \
+                not self.child.cereal_write:
+            raise CerealException(
+                "CerealMixin serializers only save through "
+                "CerealViewMixin writes (with 'cereal_write' in the "
+                "context)."
+            )
+        return super(CerealListSerializer, self).save(*args, **kwargs)
+
+    def create(self, validated_data):
+        return create_objects(self.child, validated_data)
+
+    def update(self, instance, validated_data):
+        return update_objects(self.child, instance, validated_data)
+
+    @staticmethod
+    def compact_row(row, columns):
+        '''Picks the values of the (dotted) columns out of a serialized row.
+        A null nested object gives null values for all of its columns.
+        '''
+        values = []
+        for column in columns:
+            value = row
+            for key in column:
+                if value is None:
+                    break
+                value = value[key]
+            values.append(value)
+        return values
+
+    @property
+    def data(self):
+        # Skip ListSerializer.data, which would wrap the compact dict in a
+        # ReturnList.
+        ret = super(ListSerializer, self).data
+        if isinstance(ret, dict):
+            return ReturnDict(ret, serializer=self)
+        return ReturnList(ret, serializer=self)
+
+
 class CerealMixin(object):
     '''Inspired by:
     http://www.pivotaltracker.com/help/api#Response_Controlling_Parameters
@@ -18,6 +291,24 @@ class CerealMixin(object):
     # response-controlling parameters.
     REQUIRE_DEFAULT_OPTION = True
 
+    # Write serializers validate and save their own fields (see
+    # use_write_fields).
+    cereal_write = False
+
+    # Serializers can declare named presets of fields in their Meta, which are
+    # referenced in the fields parameter with '@':
+    #
+    # class Meta:
+    #     cereal_presets = {
+    #         'summary': 'id,field1',
+    #         'detail': '@summary,field2,teams(@summary)'
+    #     }
+    #
+    # fields=@detail or fields=field3,leagues(@summary)
+    #
+    # A preset reference is resolved against the serializer of the level it
+    # appears in, so teams(@summary) uses the teams serializer's preset.
+
     class CerealFields:
         def __init__(self):
             # List of strings (of field names).
@@ -33,14 +324,39 @@ class CerealMixin(object):
             # data (:schema is not implemented).
             self.options = set()
 
+            # List of (string) names of the serializer's presets to merge
+            # into these fields. Empty once the presets have been resolved.
+            self.presets = []
+
         def __str__(self):
             return 'CerealFields(normal_fields: ' + str(self.normal_fields) + \
                    ', ' + 'nested_fields: ' + str(self.nested_fields) + ', ' + \
-                   'options: ' + str(self.options) + ')'
+                   'options: ' + str(self.options) + ', ' + \
+                   'presets: ' + str(self.presets) + ')'
+
+        def to_fields_string(self, canonical=True):
+            '''Returns the canonical fields string of the tree: fields,
+            options and presets are sorted and deduplicated, so trees
+            selecting the same fields give the same string. Otherwise the
+            normal fields keep their order (which is the order they are
+            serialized in).
+            '''
+            if canonical:
+                parts = sorted(set(self.normal_fields))
+            else:
+                parts = list(self.normal_fields)
+            parts += sorted(
+                field_name + '(' + nested.to_fields_string(canonical) + ')'
+                for field_name, nested in self.nested_fields.items()
+            )
+            parts += sorted(':' + option for option in self.options)
+            parts += sorted('@' + preset for preset in set(self.presets))
+            return ','.join(parts)
 
     @staticmethod
     def parse_fields_to_nested_tree_rec(field_iter, field=None,
-                                        close_bracket=False):
+                                        close_bracket=False, limits=None,
+                                        depth=0, nodes=None):
         '''Produces the return CerealFields struct (see above) for the field_iter
         list of strings. Recursively calls itself on nested fields to the nested
         fields' CerealFields until the field_iter is exhausted.
@@ -50,10 +366,19 @@ class CerealMixin(object):
         of fields for the serializer currently being worked on)
         :param close_bracket: whether a bracket must be closed in this recursive
         step
+        :param limits: FieldsLimits checked as the fields are added
+        :param depth: the nesting level of this recursive step
+        :param nodes: one-item list counting the fields added to the whole
+        tree
         :return: CerealFields object
 
         '''
         cereal_fields = CerealMixin.CerealFields()
+        if limits is None:
+            limits = FieldsLimits()
+        if nodes is None:
+            nodes = [0]
+        limits.check_depth(depth)
 
         # base case (when the function is called initially)
         if field is None:
@@ -72,6 +397,15 @@ class CerealMixin(object):
                     return cereal_fields
                 else:
                     cereal_fields.options.add(field[1:])
+            elif field and field[0] == '@':
+                # it's a reference to a preset, resolved later against the
+                # serializer (see CerealMixin.resolve_presets)
+                if len(field) == 1 or '(' in field:
+                    raise CerealException(
+                        "Fields parameter bad format: preset {0} must be a "
+                        "name.".format(field)
+                    )
+                cereal_fields.presets.append(field[1:])
             elif '(' in field:
                 # Only split the first occurrence of '(' in case of multiple
                 # immediate nests and pass the rest to the nested field.
@@ -84,10 +418,12 @@ class CerealMixin(object):
                         "nested field name."
                     )
 
+                nodes[0] += 1
+                limits.check_nodes(nodes[0])
                 cereal_fields.nested_fields[nested[0]] = \
                     CerealMixin.\
                     parse_fields_to_nested_tree_rec(
-                        field_iter, nested[1], True
+                        field_iter, nested[1], True, limits, depth + 1, nodes
                     )
             elif field == ')':
                 if not close_bracket:
@@ -101,7 +437,10 @@ class CerealMixin(object):
                 return cereal_fields
             elif field:
                 # skip empty fields Ex: ',,'
+                nodes[0] += 1
+                limits.check_nodes(nodes[0])
                 cereal_fields.normal_fields.append(field)
+            limits.check_node_fields(cereal_fields)
 
             try:
                 next_field = field_iter.next()
@@ -116,7 +455,7 @@ class CerealMixin(object):
             field = next_field
 
     @staticmethod
-    def parse_fields_to_nested_tree(flat_field_string):
+    def parse_fields_to_nested_tree(flat_field_string, limits=None):
         '''Produces the tree of serializer fields and options for the
         flat_field_string.
 
@@ -124,10 +463,15 @@ class CerealMixin(object):
         Extracted from the url parameter, 'fields'.
         Example:
         'id,name,label(name),comments(text,attachments(url),id)'
+        :param limits: FieldsLimits of the string (defaults to the
+        FIELDS_MAX_* settings)
 
         :return: CerealFields object
 
         '''
+        if limits is None:
+            limits = FieldsLimits.from_settings()
+        limits.check_length(len(flat_field_string))
 
         # Closing brackets are treated as separate list items
         # to reduce complexity (by not having to consider what to do with
@@ -137,7 +481,392 @@ class CerealMixin(object):
         flat_fields = flat_field_string.replace(')', ',)')
         flat_fields = flat_fields.split(',')
         return CerealMixin\
-            .parse_fields_to_nested_tree_rec(iter(flat_fields))
+            .parse_fields_to_nested_tree_rec(iter(flat_fields), limits=limits)
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        '''Same as the DRF many_init, but CerealListSerializer is used as
+        the list serializer unless Meta.list_serializer_class is defined.
+        '''
+        allow_empty = kwargs.pop('allow_empty', None)
+        child_serializer = cls(*args, **kwargs)
+        list_kwargs = {
+            'child': child_serializer,
+        }
+        if allow_empty is not None:
+            list_kwargs['allow_empty'] = allow_empty
+        list_kwargs.update(dict([
+            (key, value) for key, value in kwargs.items()
+            if key in LIST_SERIALIZER_KWARGS
+        ]))
+        meta = getattr(cls, 'Meta', None)
+        list_serializer_class = getattr(
+            meta, 'list_serializer_class', CerealListSerializer
+        )
+        return list_serializer_class(*args, **list_kwargs)
+
+    def get_compact_columns(self, prefix=()):
+        '''Returns the columns of the ':compact' representation as tuples of
+        keys (a path into the serialized data), in the order the serializer
+        outputs them. Nested to-one fields named in the fields parameter are
+        flattened into their own columns.
+
+        :param prefix: the path of this serializer from the root serializer
+        :return: list of tuples of field names
+        '''
+        nested_cereal_fields = getattr(self.cereal_fields, 'nested_fields', {})
+        columns = []
+        for field_name, field in self.fields.items():
+            column = prefix + (field_name,)
+            if field_name in nested_cereal_fields and \
+                    not getattr(field, 'many', False) and \
+                    isinstance(field, CerealMixin) and \
+                    not isinstance(field, MethodSerializerMixin):
+                columns.extend(field.get_compact_columns(column))
+            else:
+                columns.append(column)
+        return columns
+
+    def prefetch_method_values(self, instances, thread_pool):
+        '''Calls the get_<name> methods of the MethodSerializerMixin fields
+        for all the instances concurrently on the thread pool. The fields
+        then use the values instead of calling the methods.
+        '''
+        method_fields = [field for field in self._readable_fields
+                         if isinstance(field, MethodSerializerMixin)]
+        tasks = [(getattr(self, field.method_name), (instance,))
+                 for instance in instances for field in method_fields]
+        values = run_concurrently(thread_pool, tasks)
+        keys = [(field.field_name, id(instance))
+                for instance in instances for field in method_fields]
+        self._cereal_method_values = dict(zip(keys, values))
+
+    def build_nested_fields(self):
+        '''Builds the fields of the nested serializers (in this thread:
+        building fields temporarily changes the serializer classes' Meta).
+        '''
+        for field in self.fields.values():
+            nested_serializer = get_nested_serializer(field)
+            if isinstance(nested_serializer, CerealMixin):
+                nested_serializer.build_nested_fields()
+            elif isinstance(nested_serializer, BaseSerializer):
+                nested_serializer.fields
+
+    def to_representation(self, instance):
+        '''With a thread pool in the context (ex: 'cereal_thread_pool' from
+        CerealViewMixin.method_threads), a top-level serializer calls its
+        method fields' methods and serializes its nested serializers
+        concurrently. The other fields are serialized in this thread, and
+        the fields keep their order.
+
+        With a deadline in the context ('cereal_deadline'), each object
+        checks it before it's serialized.
+        '''
+        deadline = self.context.get('cereal_deadline')
+        if deadline is not None:
+            deadline.check()
+        thread_pool = self.context.get('cereal_thread_pool')
+        if thread_pool is None or self.parent is not None:
+            return super(CerealMixin, self).to_representation(instance)
+
+        self.build_nested_fields()
+        self.prefetch_method_values([instance], thread_pool)
+        try:
+            ret = OrderedDict()
+            nested = []
+            for field in self._readable_fields:
+                try:
+                    attribute = field.get_attribute(instance)
+                except SkipField:
+                    continue
+                if attribute is None:
+                    ret[field.field_name] = None
+                elif isinstance(field, BaseSerializer):
+                    ret[field.field_name] = None
+                    nested.append((field, attribute))
+                else:
+                    ret[field.field_name] = field.to_representation(attribute)
+            values = run_concurrently(thread_pool, [
+                (field.to_representation, (attribute,))
+                for field, attribute in nested
+            ])
+            for (field, _), value in zip(nested, values):
+                ret[field.field_name] = value
+            return ret
+        finally:
+            self._cereal_method_values = None
+
+    @staticmethod
+    def merge_cereal_fields(cereal_fields, other_cereal_fields):
+        '''Adds the fields and options of other_cereal_fields to cereal_fields
+        (other_cereal_fields is left unchanged).
+        '''
+        for field_name in other_cereal_fields.normal_fields:
+            if field_name not in cereal_fields.normal_fields:
+                cereal_fields.normal_fields.append(field_name)
+        cereal_fields.options.update(other_cereal_fields.options)
+        for field_name, nested in other_cereal_fields.nested_fields.items():
+            if field_name in cereal_fields.nested_fields:
+                CerealMixin.merge_cereal_fields(
+                    cereal_fields.nested_fields[field_name], nested
+                )
+            else:
+                cereal_fields.nested_fields[field_name] = deepcopy(nested)
+
+    @staticmethod
+    def get_nested_serializer_class(serializer_class, field_name):
+        field = LazySerializer.get_declared_fields(serializer_class).get(
+            field_name
+        )
+        if field is None:
+            return None
+        return get_nested_serializer(field).__class__
+
+    @staticmethod
+    def resolve_presets(serializer_class, cereal_fields, _resolving=()):
+        '''Returns the CerealFields tree with the '@preset' references replaced
+        by the fields of the presets. Parts of the tree without references
+        are reused, not copied.
+
+        :param serializer_class: the serializer class of the tree's top level
+        :param cereal_fields: CerealFields object
+        :return: CerealFields object
+        '''
+        resolved_nested_fields = {}
+        for field_name, nested in cereal_fields.nested_fields.items():
+            nested_class = CerealMixin.get_nested_serializer_class(
+                serializer_class, field_name
+            )
+            if nested_class is None:
+                # Unknown fields are reported when the serializer is used,
+                # unless there is a preset to resolve under them.
+                if CerealMixin.has_presets(nested):
+                    raise CerealException(
+                        "Field {0} isn't defined in serializer."
+                        .format(field_name)
+                    )
+                resolved_nested_fields[field_name] = nested
+            else:
+                resolved_nested_fields[field_name] = \
+                    CerealMixin.resolve_presets(nested_class, nested,
+                                                _resolving)
+
+        unchanged = not cereal_fields.presets and all(
+            resolved_nested_fields[field_name] is nested
+            for field_name, nested in cereal_fields.nested_fields.items()
+        )
+        if unchanged:
+            return cereal_fields
+
+        resolved = CerealMixin.CerealFields()
+        resolved.normal_fields = list(cereal_fields.normal_fields)
+        resolved.options = set(cereal_fields.options)
+        # merging mutates the nested fields, which can be shared with the
+        # unresolved tree
+        resolved.nested_fields = deepcopy(resolved_nested_fields) \
+            if cereal_fields.presets else resolved_nested_fields
+        for preset_name in cereal_fields.presets:
+            preset = CerealMixin.get_preset(serializer_class, preset_name,
+                                            _resolving)
+            CerealMixin.merge_cereal_fields(resolved, preset.cereal_fields)
+        return resolved
+
+    @staticmethod
+    def has_presets(cereal_fields):
+        return bool(cereal_fields.presets) or any(
+            CerealMixin.has_presets(nested)
+            for nested in cereal_fields.nested_fields.values()
+        )
+
+    @staticmethod
+    def get_preset(serializer_class, preset_name, _resolving=()):
+        '''Returns the CompiledFields for one of the serializer class'
+        Meta.cereal_presets. Presets are compiled once and cached.
+
+        :raises CerealException: if the serializer has no such preset
+        :raises ImproperlyConfigured: if presets reference each other in a
+        loop
+        '''
+        key = (serializer_class, preset_name)
+        compiled = _compiled_presets.get(key)
+        if compiled is not None:
+            return compiled
+
+        presets = getattr(getattr(serializer_class, 'Meta', None),
+                          'cereal_presets', {})
+        if preset_name not in presets:
+            raise CerealException(
+                "Preset {0} isn't defined in serializer.".format(preset_name)
+            )
+        if key in _resolving:
+            raise ImproperlyConfigured(
+                "Preset {0} of {1} references itself."
+                .format(preset_name, serializer_class.__name__)
+            )
+
+        compiled = CerealMixin.compile_fields(
+            serializer_class,
+            CerealMixin.parse_fields_to_nested_tree(presets[preset_name]),
+            _resolving + (key,)
+        )
+        _compiled_presets[key] = compiled
+        return compiled
+
+    @staticmethod
+    def compile_fields(serializer_class, cereal_fields, _resolving=()):
+        '''Resolves the presets of the tree, validates it and plans its
+        queries.
+
+        :return: CompiledFields
+        '''
+        cereal_fields = CerealMixin.resolve_presets(
+            serializer_class, cereal_fields, _resolving
+        )
+        CerealMixin.validate_cereal_fields(serializer_class, cereal_fields)
+        return CompiledFields(
+            cereal_fields, plan_query(serializer_class, cereal_fields)
+        )
+
+    @staticmethod
+    def get_persisted_fields(serializer_class, fields_hash):
+        '''Returns the CompiledFields of fields persisted with the
+        PersistedFieldsStore. The most recently used ones are kept compiled.
+
+        :raises CerealException: if no fields were persisted with the hash
+        '''
+        key = (serializer_class, fields_hash)
+        compiled = _compiled_persisted_fields.pop(key, None)
+        if compiled is None:
+            fields_string = PersistedFieldsStore().get(fields_hash)
+            if fields_string is None:
+                raise CerealException(
+                    "No fields were persisted with hash {0}."
+                    .format(fields_hash)
+                )
+            compiled = CerealMixin.compile_fields(
+                serializer_class,
+                CerealMixin.parse_fields_to_nested_tree(fields_string)
+            )
+        _compiled_persisted_fields[key] = compiled
+        while len(_compiled_persisted_fields) > \
+                cereal_settings.PERSISTED_FIELDS_MEMORY_SIZE:
+            _compiled_persisted_fields.popitem(last=False)
+        return compiled
+
+    @staticmethod
+    def compile_presets(serializer_class):
+        '''Compiles all the presets of the serializer class (done at startup
+        for the serializers imported by then with BUILD_AT_STARTUP, see
+        rest_cereal.apps).
+
+        :return: {preset name: CompiledFields}
+        '''
+        presets = getattr(getattr(serializer_class, 'Meta', None),
+                          'cereal_presets', {})
+        return dict((preset_name,
+                     CerealMixin.get_preset(serializer_class, preset_name))
+                    for preset_name in presets)
+
+    @staticmethod
+    def validate_cereal_fields(serializer_class, cereal_fields):
+        '''Raises a CerealException if the tree selects fields that aren't
+        defined on the serializers, by building the serializers' fields.
+        '''
+        def validate(serializer, cereal_fields):
+            fields = serializer.fields
+            for field_name, nested in cereal_fields.nested_fields.items():
+                validate(get_nested_serializer(fields[field_name]), nested)
+
+        validate(serializer_class(cereal_fields=cereal_fields), cereal_fields)
+
+    @classmethod
+    def compile_fields_parameter(cls, fields_parameter):
+        '''Compiles a fields parameter, so requests passing it exactly
+        skip parsing and planning.
+
+        :return: CompiledFields
+        '''
+        compiled = cls.get_compiled_fields(fields_parameter)
+        if compiled is None:
+            compiled = cls.compile_fields(
+                cls, cls.parse_fields_to_nested_tree(fields_parameter)
+            )
+            _compiled_fields_parameters[(cls, fields_parameter)] = compiled
+            if cereal_settings.PLAN_STORE_FILE:
+                get_plan_store(cereal_settings.PLAN_STORE_FILE).add(
+                    get_plan_key(cls, fields_parameter), compiled.to_data(),
+                    get_plan_source(cls)
+                )
+        return compiled
+
+    @classmethod
+    def get_stored_fields(cls, fields_parameter):
+        '''Returns the CompiledFields of a fields parameter another process
+        compiled, from the PLAN_STORE_FILE (see rest_cereal.planstore), or
+        None.
+        '''
+        if not cereal_settings.PLAN_STORE_FILE:
+            return None
+        data = get_plan_store(cereal_settings.PLAN_STORE_FILE).get(
+            get_plan_key(cls, fields_parameter)
+        )
+        if data is None:
+            return None
+        compiled = CompiledFields.from_data(data)
+        _compiled_fields_parameters[(cls, fields_parameter)] = compiled
+        return compiled
+
+    @classmethod
+    def get_compiled_fields(cls, fields_parameter):
+        '''Returns the CompiledFields when the fields parameter was compiled
+        ahead (see compile_fields_parameter) by this process or another one
+        sharing the PLAN_STORE_FILE, or when the whole fields
+        parameter is a single preset reference (ex: 'fields=@summary') or the
+        hash of persisted fields (ex: 'fields=#2c26b46b...'), otherwise None.
+        '''
+        compiled = _compiled_fields_parameters.get((cls, fields_parameter))
+        if compiled is not None:
+            return compiled
+        if not fields_parameter:
+            return None
+        compiled = cls.get_stored_fields(fields_parameter)
+        if compiled is not None:
+            return compiled
+        if not fields_parameter or fields_parameter[0] not in '@#' or \
+                ',' in fields_parameter or '(' in fields_parameter or \
+                ')' in fields_parameter:
+            return None
+        if fields_parameter[0] == '@':
+            return cls.get_preset(cls, fields_parameter[1:])
+        return cls.get_persisted_fields(cls, fields_parameter[1:])
+
+    @classmethod
+    def get_request_cereal_fields(cls, request):
+        '''Returns the CerealFields tree of the request's 'fields' parameter,
+        with its presets resolved. The tree is parsed once per request and
+        kept on the request, so views and serializers handling the same
+        request can share it.
+
+        :param request: DRF Request
+        :return: CerealFields object, or None if 'fields' wasn't passed
+        '''
+        fields_parameter = request.query_params.get('fields', None)
+        if not fields_parameter:
+            return None
+
+        parsed = getattr(request, '_cereal_fields', None)
+        if parsed is None or parsed[:2] != (fields_parameter, cls):
+            compiled = cls.get_compiled_fields(fields_parameter)
+            if compiled is not None:
+                # precompiled: no parsing
+                cereal_fields = compiled.cereal_fields
+            else:
+                cereal_fields = cls.resolve_presets(
+                    cls, cls.parse_fields_to_nested_tree(fields_parameter)
+                )
+            parsed = (fields_parameter, cls, cereal_fields)
+            request._cereal_fields = parsed
+        return parsed[2]
 
     def get_default_field_names(self, declared_fields, model_info):
         return set(
@@ -154,7 +883,7 @@ class CerealMixin(object):
 
         cereal_fields = getattr(self, 'cereal_fields', None)
         is_circular = getattr(getattr(self, 'Meta', None), 'circular', False)
-        if is_circular and not cereal_fields:
+        if is_circular and not cereal_fields and not self.cereal_write:
             raise CerealException(
                 "'fields' query parameter must be defined in this "
                 "request due to circular serializers."
@@ -213,6 +942,31 @@ class CerealMixin(object):
         setattr(self.Meta, 'fields', original_fields)
         return field_names
 
+    @staticmethod
+    def get_temp_class(field_class):
+        '''Returns the temporary class nested serializers of field_class are
+        instantiated with (created once per class).
+        '''
+        new_field_class = _temp_classes.get(field_class)
+        if new_field_class is not None:
+            return new_field_class
+        if not issubclass(field_class, CerealMixin):
+            new_field_class = type(
+                'CerealTemp' + field_class.__name__,
+                (CerealMixin, field_class),
+                {}
+            )
+        else:
+            # This is required for circular nesting. We need different
+            # temporary classes to represent the same class when circular
+            # nesting occurs so the class.Meta can be different.
+            new_field_class = type(
+                'CerealTemp' + field_class.__name__,
+                (field_class,),
+                {}
+            )
+        return _temp_classes.setdefault(field_class, new_field_class)
+
     def get_fields(self, *args, **kwargs):
         '''The get_fields method selects from the fields defined in its
         _declared_fields attribute. Permanently add the mixin to the nested
@@ -222,6 +976,14 @@ class CerealMixin(object):
         # Meta doesn't exist on SerializerMethodField serializers
         meta = getattr(self, 'Meta', None)
 
+        # instantiate the LazySerializer fields on first use
+        LazySerializer.get_declared_fields(self.__class__)
+
+        if self.cereal_write:
+            return self.get_write_fields(
+                super(CerealMixin, self).get_fields(*args, **kwargs)
+            )
+
         is_circular = getattr(meta, 'circular', False)
         depth = getattr(meta, 'depth', None)
         if not self.cereal_fields and is_circular and depth != 0:
@@ -260,22 +1022,7 @@ class CerealMixin(object):
                 many = True
             else:
                 many = False
-            field_class = original_field.__class__
-            if not issubclass(field_class, CerealMixin):
-                new_field_class = type(
-                    'CerealTemp' + field_class.__name__,
-                    (CerealMixin, field_class),
-                    {}
-                )
-            else:
-                # This is required for circular nesting. We need different
-                # temporary classes to represent the same class when circular
-                # nesting occurs so the class.Meta can be different.
-                new_field_class = type(
-                    'CerealTemp' + field_class.__name__,
-                    (field_class,),
-                    {}
-                )
+            new_field_class = self.get_temp_class(original_field.__class__)
 
             # Create a new object with the new list of base classes (including
             # CerealMixin).
@@ -301,27 +1048,71 @@ class CerealMixin(object):
 
         return fields
 
+    def get_write_fields(self, fields):
+        '''Replaces the nested serializers of a write serializer by the
+        primary keys of their forward relation, or leaves them out.
+        '''
+        model = getattr(getattr(self, 'Meta', None), 'model', None)
+        if model is None:
+            return fields
+        relations = model_meta.get_field_info(model).forward_relations
+        for field_name, field in list(fields.items()):
+            if not isinstance(field, BaseSerializer):
+                continue
+            source = field.source or field_name
+            if source not in relations:
+                del fields[field_name]
+                continue
+            field_class, field_kwargs = self.build_relational_field(
+                source, relations[source]
+            )
+            if source != field_name:
+                field_kwargs['source'] = source
+            fields[field_name] = field_class(**field_kwargs)
+        return fields
+
+    def use_write_fields(self):
+        '''Makes this serializer a write serializer: its own fields are
+        validated and saved, relations being written as primary keys.
+        '''
+        meta = getattr(self, 'Meta', None)
+        if meta is not None:
+            # on this serializer only: Meta.depth is shared by the requests
+            class Meta(meta):
+                depth = 0
+            self.Meta = Meta
+        if self.serializer_related_field is PrimaryKeyRelatedField:
+            self.serializer_related_field = LoadedPrimaryKeyRelatedField
+
     def __init__(self, *args, **kwargs):
         '''Assigns a serializer's fields and options recursively (because
         serializer fields can be nested with other serializer objects).
 
         :param cereal_fields: CerealFields object
 
+        With 'cereal_write' in the context, the serializer validates and
+        saves its own fields, and the fields parameter is ignored (see
+        rest_cereal.writing).
         '''
 
         has_request = kwargs.get('context') and kwargs['context'].get('request')
+        self.cereal_write = bool(
+            kwargs.get('context') and kwargs['context'].get('cereal_write')
+        )
 
-        if has_request:
+        if self.cereal_write:
+            kwargs.pop('cereal_fields', None)
+            cereal_fields = None
+            self.use_write_fields()
+        elif has_request:
             # the base-level serializer
-            fields_parameter = kwargs['context']['request'].query_params.get(
-                'fields', None
-            )
+            request = kwargs['context']['request']
+            fields_parameter = request.query_params.get('fields', None)
 
             if fields_parameter:
                 # The cereal_fields parameter is passed down recursively, so it
                 # must be computed once by the top-level serializer.
-                cereal_fields = \
-                    self.parse_fields_to_nested_tree(fields_parameter)
+                cereal_fields = self.get_request_cereal_fields(request)
 
                 # We don't want weird behavior resulting from serializers being
                 # prevented from nesting further because of this Meta depth
@@ -362,20 +1153,20 @@ class CerealMixin(object):
         # Don't allow requests without fields to hit endpoints with
         # circular serializers
         is_circular = getattr(getattr(self, 'Meta', None), 'circular', False)
-        if is_circular and has_request and not fields_parameter:
+        if is_circular and has_request and not self.cereal_write and \
+                not fields_parameter:
             raise CerealException(
                 "'fields' query parameter must be defined in this "
                 "request due to circular serializers."
             )
 
-    def save_object(self, obj, **kwargs):
-        raise CerealException(
-            "Saving hasn't been tested with the CerealMixin. "
-            "Use at your own peril."
-        )
-
     def save(self, *args, **kwargs):
-        raise CerealException(
-            "Saving hasn't been tested with the CerealMixin. "
-            "Use at your own peril."
-        )
+        # Serializers shaped by the fields parameter would only save the
+        # fields it selected: only write serializers save.
+        if not self.cereal_write:
+            raise CerealException(
+                "CerealMixin serializers only save through "
+                "CerealViewMixin writes (with 'cereal_write' in the "
+                "context)."
+            )
+        return super(CerealMixin, self).save(*args, **kwargs)
@@ -0,0 +1,62 @@
+'''Persisted fields: clients register a fields string once (see
+rest_cereal.views.PersistedFieldsView) and get back its hash. Later requests
+pass 'fields=#<hash>' (url encoded: 'fields=%23<hash>') instead of the whole
+string.
+'''
+import hashlib
+
+from django.core.cache import caches
+
+from rest_cereal.settings import cereal_settings
+
+
+def get_fields_hash(cereal_fields):
+    '''Returns the content hash of a CerealFields tree. Trees selecting the
+    same fields have the same hash, whatever order the fields were passed in.
+    '''
+    return hashlib.sha256(
+        cereal_fields.to_fields_string().encode('utf-8')
+    ).hexdigest()
+
+
+class PersistedFieldsStore(object):
+    '''Stores fields by hash in a Django cache, so the store is as shared as
+    the cache backend (locmem: per process, database or memcached: between
+    servers). Each process keeps the trees it uses compiled (see
+    CerealMixin.get_persisted_fields).
+
+    The hash is the canonical tree's, but the fields string is stored as
+    registered, so responses (ex: ':compact' columns) keep its order. The
+    first string registered for a hash is kept.
+    '''
+
+    key_prefix = 'rest_cereal:fields:'
+
+    def __init__(self, cache_alias=None, timeout=None):
+        self.cache_alias = cache_alias or \
+            cereal_settings.PERSISTED_FIELDS_CACHE
+        self.timeout = cereal_settings.PERSISTED_FIELDS_TIMEOUT \
+            if timeout is None else timeout
+
+    @property
+    def cache(self):
+        return caches[self.cache_alias]
+
+    def get(self, fields_hash):
+        '''Returns the fields string stored for the hash, or None.
+        '''
+        return self.cache.get(self.key_prefix + fields_hash)
+
+    def add(self, cereal_fields, fields_string=None):
+        '''Stores the CerealFields tree and returns its hash.
+
+        :param fields_string: the fields string the tree was parsed from
+            (default: the canonical fields string)
+        '''
+        fields_hash = get_fields_hash(cereal_fields)
+        key = self.key_prefix + fields_hash
+        stored = self.cache.get(key) or fields_string or \
+            cereal_fields.to_fields_string()
+        # set again to renew the timeout
+        self.cache.set(key, stored, self.timeout)
+        return fields_hash
@@ -0,0 +1,290 @@
+from collections import OrderedDict
+
+from django.db.models.fields.related import ForeignObjectRel, OneToOneRel
+from django.db.models.query import Prefetch, prefetch_related_objects
+from rest_framework.serializers import ListSerializer
+
+from rest_cereal.concurrency import get_thread_pool, run_concurrently
+from rest_cereal.serializers import LazySerializer, MethodSerializerMixin
+from rest_cereal.settings import cereal_settings
+from rest_cereal.stats import get_relation_stats
+
+
+def group_prefetch_lookups(lookups):
+    '''Groups the prefetch lookups by their first relation: the groups
+    don't depend on each other.
+    '''
+    groups = []
+    group_indexes = {}
+    for lookup in lookups:
+        path = lookup.prefetch_through if isinstance(lookup, Prefetch) \
+            else lookup
+        relation = path.split('__', 1)[0]
+        if relation not in group_indexes:
+            group_indexes[relation] = len(groups)
+            groups.append([])
+        groups[group_indexes[relation]].append(lookup)
+    return groups
+
+
+class ConcurrentPrefetchMixin(object):
+    '''QuerySet mixin running the prefetches of independent relations (ex:
+    'teams' and 'leagues__players') concurrently on a thread pool, once the
+    objects are fetched. The prefetch queries use the threads' database
+    connections, so they don't see the changes of an ongoing transaction.
+    '''
+
+    prefetch_threads = 2
+
+    def _prefetch_related_objects(self):
+        groups = group_prefetch_lookups(self._prefetch_related_lookups)
+        if len(groups) < 2 or not self._result_cache:
+            return super(ConcurrentPrefetchMixin, self) \
+                ._prefetch_related_objects()
+        # Set up the caches the prefetches fill, before the threads do.
+        for instance in self._result_cache:
+            if not hasattr(instance, '_prefetched_objects_cache'):
+                instance._prefetched_objects_cache = {}
+        run_concurrently(
+            get_thread_pool('prefetch', self.prefetch_threads),
+            [(prefetch_related_objects, (self._result_cache, group))
+             for group in groups]
+        )
+        self._prefetch_done = True
+
+
+# {(QuerySet class, threads): concurrent QuerySet class}
+_concurrent_queryset_classes = {}
+
+
+def get_concurrent_queryset_class(queryset_class, threads):
+    key = (queryset_class, threads)
+    concurrent_class = _concurrent_queryset_classes.get(key)
+    if concurrent_class is None:
+        concurrent_class = type(
+            'ConcurrentPrefetch' + queryset_class.__name__,
+            (ConcurrentPrefetchMixin, queryset_class),
+            {'prefetch_threads': threads}
+        )
+        concurrent_class = _concurrent_queryset_classes.setdefault(
+            key, concurrent_class
+        )
+    return concurrent_class
+
+
+class QueryPlan(object):
+    '''The select_related and prefetch_related lookups needed to serialize a
+    CerealFields tree without issuing queries per object.
+
+    Plans only hold strings, so they can be cached and pickled.
+    '''
+
+    def __init__(self, select_related=(), prefetch_related=()):
+        self.select_related = list(select_related)
+        self.prefetch_related = list(prefetch_related)
+        # {path: (strategy, RelationStats or None)}, for ':explain' (not
+        # kept with compiled fields)
+        self.strategies = OrderedDict()
+
+    def explain(self):
+        '''Returns the plan and the strategy chosen for each relation, with
+        the statistics it was chosen from.
+        '''
+        return OrderedDict([
+            ('select_related', self.select_related),
+            ('prefetch_related', self.prefetch_related),
+            ('paths', [
+                OrderedDict([
+                    ('path', path),
+                    ('strategy', strategy),
+                    ('stats', stats.to_data() if stats is not None else None),
+                ])
+                for path, (strategy, stats) in self.strategies.items()
+            ]),
+        ])
+
+    def apply(self, queryset, prefetch_threads=None, loader=None):
+        '''Adds the plan to the queryset. With a loader, the prefetches
+        load the objects through that BatchLoader (see
+        rest_cereal.loading). Otherwise, with prefetch_threads, the
+        prefetches of independent relations run concurrently on that many
+        threads (see ConcurrentPrefetchMixin), or one after another.
+        '''
+        if self.select_related:
+            queryset = queryset.select_related(*self.select_related)
+        if self.prefetch_related:
+            queryset = queryset.prefetch_related(*self.prefetch_related)
+            if loader is not None:
+                # imported here: rest_cereal.loading imports this module
+                from rest_cereal.loading import get_batch_queryset_class
+                queryset.__class__ = get_batch_queryset_class(
+                    queryset.__class__
+                )
+                queryset.cereal_loader = loader
+            elif prefetch_threads and \
+                    len(group_prefetch_lookups(self.prefetch_related)) > 1:
+                queryset.__class__ = get_concurrent_queryset_class(
+                    queryset.__class__, prefetch_threads
+                )
+        return queryset
+
+    def prefetch(self, instances, loader=None):
+        '''Runs the plan on objects already loaded (ex: saved by a write).
+        The joined relations are prefetched too, and the relations already
+        cached on the objects aren't queried again.
+        '''
+        lookups = self.select_related + self.prefetch_related
+        if not instances or not lookups:
+            return
+        if loader is not None:
+            from rest_cereal.loading import prefetch_with_loader
+            prefetch_with_loader(instances, lookups, loader)
+        else:
+            prefetch_related_objects(instances, lookups)
+
+    def __eq__(self, other):
+        return isinstance(other, QueryPlan) and \
+            self.select_related == other.select_related and \
+            self.prefetch_related == other.prefetch_related
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return 'QueryPlan(select_related: ' + str(self.select_related) + \
+               ', prefetch_related: ' + str(self.prefetch_related) + ')'
+
+
+def get_model_relation(model, name):
+    '''Returns the relation (forward field or reverse ForeignObjectRel) on the
+    model that is accessed as model.<name>, or None.
+    '''
+    for field in model._meta.get_fields():
+        if not field.is_relation:
+            continue
+        if isinstance(field, ForeignObjectRel):
+            if field.get_accessor_name() == name:
+                return field
+        elif field.name == name:
+            return field
+    return None
+
+
+def is_to_many(relation):
+    if isinstance(relation, ForeignObjectRel):
+        return not isinstance(relation, OneToOneRel)
+    return relation.many_to_many
+
+
+def get_nested_serializer(field):
+    '''Unwraps ListSerializers to the serializer used for each item.
+    '''
+    if isinstance(field, ListSerializer):
+        return field.child
+    return field
+
+
+def plan_query(serializer_class, cereal_fields, adaptive=None):
+    '''Walks the CerealFields tree alongside the serializer classes' declared
+    fields and the models' relations, and returns the QueryPlan for it.
+
+    To-one relations are joined (select_related) as long as every relation
+    above them is joined too. To-many relations, and everything under them,
+    are prefetched. MethodSerializerMixin fields and fields with dotted or
+    custom sources decide their own queries, so they aren't planned.
+
+    Adaptive plans (defaulting to the ADAPTIVE_JOINS setting) prefetch the
+    to-one relations whose related objects are shared by many objects
+    instead of joining them (see rest_cereal.stats).
+
+    :param serializer_class: the top-level serializer class
+    :param cereal_fields: CerealFields object
+    :param adaptive: whether to choose joins from relation statistics
+    :return: QueryPlan
+    '''
+    if adaptive is None:
+        adaptive = cereal_settings.ADAPTIVE_JOINS
+    plan = QueryPlan()
+    _plan_query_rec(plan, serializer_class, cereal_fields, '', True, adaptive)
+    return plan
+
+
+def choose_join(model, relation, adaptive):
+    '''Returns whether to join a to-one relation (all the relations above
+    it being joined), and the statistics it was decided from.
+    '''
+    if not adaptive:
+        return True, None
+    stats = get_relation_stats(model, relation)
+    if stats is None:
+        # not sampled yet
+        return True, None
+    return stats.fan_in <= cereal_settings.JOIN_MAX_FAN_IN, stats
+
+
+def _plan_query_rec(plan, serializer_class, cereal_fields, prefix, joinable,
+                    adaptive):
+    meta = getattr(serializer_class, 'Meta', None)
+    model = getattr(meta, 'model', None)
+    if model is None:
+        return
+
+    declared_fields = LazySerializer.get_declared_fields(serializer_class)
+    if cereal_fields is None or 'default' in cereal_fields.options:
+        if getattr(meta, 'circular', False):
+            # circular serializers without fields don't nest any further
+            return
+        field_names = getattr(meta, 'fields', None)
+        if not isinstance(field_names, (list, tuple)):
+            field_names = list(declared_fields)
+        nested_fields = dict((field_name, None) for field_name in field_names
+                             if field_name in declared_fields)
+        normal_fields = [field_name for field_name in field_names
+                         if field_name not in declared_fields]
+        if cereal_fields is not None:
+            nested_fields.update(cereal_fields.nested_fields)
+            normal_fields += cereal_fields.normal_fields
+    else:
+        nested_fields = cereal_fields.nested_fields
+        normal_fields = cereal_fields.normal_fields
+
+    # Model fields that aren't declared on the serializer are
+    # serialized as primary keys. Only the to-many ones need queries.
+    for field_name in normal_fields:
+        if field_name in declared_fields:
+            continue
+        relation = get_model_relation(model, field_name)
+        if relation is not None and is_to_many(relation):
+            plan.prefetch_related.append(prefix + field_name)
+            plan.strategies[prefix + field_name] = ('prefetch', None)
+
+    for field_name in sorted(nested_fields):
+        field = declared_fields.get(field_name)
+        if field is None:
+            continue
+        nested_serializer = get_nested_serializer(field)
+        if isinstance(nested_serializer, MethodSerializerMixin):
+            continue
+        source = getattr(nested_serializer, 'source', None) or \
+            getattr(field, 'source', None) or field_name
+        if '.' in source or source == '*':
+            continue
+        relation = get_model_relation(model, source)
+        if relation is None:
+            continue
+
+        path = prefix + source
+        stats = None
+        nested_joinable = joinable and not is_to_many(relation)
+        if nested_joinable:
+            nested_joinable, stats = choose_join(model, relation, adaptive)
+        if nested_joinable:
+            plan.select_related.append(path)
+            plan.strategies[path] = ('join', stats)
+        else:
+            plan.prefetch_related.append(path)
+            plan.strategies[path] = ('prefetch', stats)
+        _plan_query_rec(
+            plan, nested_serializer.__class__, nested_fields[field_name],
+            path + '__', nested_joinable, adaptive
+        )
@@ -0,0 +1,262 @@
+'''A file of compiled fields parameters shared by the processes of a host
+(see CerealMixin.compile_fields_parameter):
+
+REST_CEREAL = {
+    'PLAN_STORE_FILE': '/var/run/app/cereal_plans',
+}
+
+Each line holds the key of a (serializer class, fields parameter) pair and
+its CompiledFields as JSON: the canonical fields string, already resolved
+and validated, and the query plan. Processes append the fields parameters
+they compile, and index the lines appended by other processes (reading the
+file from where they last stopped, at most every refresh_interval seconds),
+so each parameter is only validated and planned once per host.
+
+Keys include a fingerprint of the serializers the fields parameter can
+reach (their declared fields and Meta), so plans compiled before the
+serializers changed (ex: by the previous deploy) aren't loaded. Each line
+also names its serializer and fingerprint: once a process has appended
+compact_threshold lines of the fingerprints its serializers replaced, it
+rewrites the file without them.
+
+Servers preloading the application before forking workers (ex: gunicorn
+--preload) warm up once in the master process (see rest_cereal.warmup), and
+the workers inherit its compiled fields.
+'''
+import fcntl
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+from django.utils import six
+from django.utils.encoding import force_bytes
+
+
+HEADER = b'# rest_cereal compiled fields v3\n'
+
+
+def _describe(value):
+    '''Describes a Meta value the same way in every process.
+    '''
+    if isinstance(value, type):
+        return value.__module__ + '.' + value.__name__
+    if isinstance(value, (list, tuple, set, frozenset)):
+        items = [_describe(item) for item in value]
+        return sorted(items) if isinstance(value, (set, frozenset)) \
+            else items
+    if isinstance(value, dict):
+        return sorted((_describe(key), _describe(item))
+                      for key, item in value.items())
+    if value is None or isinstance(value, (bool, float) +
+                                   six.integer_types + six.string_types):
+        return value
+    return _describe(type(value))
+
+
+def _describe_serializer(serializer_class):
+    from rest_cereal.serializers import LazySerializer
+
+    meta = getattr(serializer_class, 'Meta', None)
+    declared_fields = LazySerializer.get_declared_fields(serializer_class)
+    return [
+        _describe(serializer_class),
+        sorted((name, _describe(type(field)), field.source)
+               for name, field in declared_fields.items()),
+        # with the attributes inherited from the bases' Meta
+        sorted((name, _describe(getattr(meta, name)))
+               for name in dir(meta)
+               if not name.startswith('_')) if meta is not None else None,
+    ]
+
+
+# {serializer class: fingerprint}
+_fingerprints = {}
+
+
+def get_serializer_fingerprint(serializer_class):
+    '''Returns a hash of the declared fields and Meta of the serializer class
+    and of the serializer classes its nested fields lead to.
+    '''
+    from rest_cereal.graph import serializer_graph
+
+    fingerprint = _fingerprints.get(serializer_class)
+    if fingerprint is not None:
+        return fingerprint
+    descriptions = []
+    seen = set()
+    pending = [serializer_class]
+    while pending:
+        nested_class = pending.pop()
+        if nested_class in seen:
+            continue
+        seen.add(nested_class)
+        descriptions.append(_describe_serializer(nested_class))
+        pending.extend(serializer_graph.get_node(nested_class).nested
+                       .values())
+    descriptions.sort(key=lambda description: description[0])
+    fingerprint = hashlib.sha1(force_bytes(
+        json.dumps(descriptions, separators=(',', ':'))
+    )).hexdigest()
+    return _fingerprints.setdefault(serializer_class, fingerprint)
+
+
+def get_plan_source(serializer_class):
+    '''Returns the (serializer path, fingerprint) the plans of the serializer
+    class are compiled from.
+    '''
+    return (serializer_class.__module__ + '.' + serializer_class.__name__,
+            get_serializer_fingerprint(serializer_class))
+
+
+def get_plan_key(serializer_class, fields_parameter):
+    serializer_path, fingerprint = get_plan_source(serializer_class)
+    return hashlib.sha1(
+        force_bytes(serializer_path) + b'\0' + force_bytes(fingerprint) +
+        b'\0' + force_bytes(fields_parameter)
+    ).hexdigest()
+
+
+class PlanStore(object):
+
+    # seconds between the reads of the lines other processes appended
+    refresh_interval = 1.0
+    # number of stale lines the file is rewritten without
+    compact_threshold = 1000
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        # {serializer path: fingerprint} of the lines this process added
+        self.current = {}
+        self.reset()
+
+    def reset(self):
+        # {key: JSON data}, of the lines read up to offset
+        self.index = {}
+        # {(serializer path, fingerprint): number of lines}
+        self.counts = {}
+        self.offset = 0
+        # the file's inode: compacting replaces the file
+        self.inode = None
+        self.refreshed = None
+
+    def refresh(self, force=False):
+        '''Indexes the lines other processes appended since the last
+        refresh.
+        '''
+        with self.lock:
+            now = time.time()
+            if not force and self.refreshed is not None and \
+                    now - self.refreshed < self.refresh_interval:
+                return
+            try:
+                with open(self.path, 'rb') as plan_file:
+                    inode = os.fstat(plan_file.fileno()).st_ino
+                    if inode != self.inode:
+                        self.reset()
+                        self.inode = inode
+                    plan_file.seek(self.offset)
+                    content = plan_file.read()
+            except (IOError, OSError):
+                # not written yet
+                return
+            self.refreshed = now
+            # the last line may still be being written
+            end = content.rfind(b'\n') + 1
+            for line in content[:end].splitlines():
+                parts = line.split(b'\t', 2)
+                if len(parts) != 3:
+                    continue
+                key, source, data = parts
+                self.index[key.decode('utf-8')] = data
+                source = tuple(source.decode('utf-8').split(' ', 1))
+                self.counts[source] = self.counts.get(source, 0) + 1
+            self.offset += end
+
+    def get(self, key):
+        '''Returns the JSON data stored under the key, or None.
+        '''
+        data = self.index.get(key)
+        if data is None:
+            self.refresh()
+            data = self.index.get(key)
+            if data is None:
+                return None
+        try:
+            return json.loads(data.decode('utf-8'))
+        except ValueError:
+            return None
+
+    def is_stale(self, source):
+        serializer_path = source[0]
+        return serializer_path in self.current and \
+            source != (serializer_path, self.current[serializer_path])
+
+    def count_stale(self):
+        return sum(count for source, count in self.counts.items()
+                   if self.is_stale(source))
+
+    def add(self, key, data, source=('', '')):
+        '''Appends the JSON data under the key.
+
+        :param source: the (serializer path, fingerprint) of the data (see
+            get_plan_source)
+        '''
+        serializer_path, fingerprint = source
+        if serializer_path:
+            self.current[serializer_path] = fingerprint
+        line = force_bytes(key) + b'\t' + \
+            force_bytes(serializer_path + ' ' + fingerprint) + b'\t' + \
+            force_bytes(json.dumps(data, separators=(',', ':'))) + b'\n'
+        with open(self.path, 'ab') as plan_file:
+            fcntl.flock(plan_file, fcntl.LOCK_EX)
+            try:
+                plan_file.seek(0, os.SEEK_END)
+                if plan_file.tell() == 0:
+                    plan_file.write(HEADER)
+                plan_file.write(line)
+                plan_file.flush()
+            finally:
+                fcntl.flock(plan_file, fcntl.LOCK_UN)
+        self.refresh()
+        if self.count_stale() >= self.compact_threshold:
+            self.compact()
+
+    def compact(self):
+        '''Replaces the file with a copy without the stale lines (the lines
+        of the fingerprints this process replaced).
+        '''
+        with open(self.path, 'rb') as plan_file:
+            fcntl.flock(plan_file, fcntl.LOCK_EX)
+            try:
+                content = plan_file.read()
+                lines = content[:content.rfind(b'\n') + 1].splitlines(True)
+                directory = os.path.dirname(os.path.abspath(self.path))
+                file_descriptor, temp_path = tempfile.mkstemp(dir=directory)
+                with os.fdopen(file_descriptor, 'wb') as new_file:
+                    new_file.write(HEADER)
+                    for line in lines:
+                        parts = line.split(b'\t', 2)
+                        if len(parts) == 3 and not self.is_stale(tuple(
+                                parts[1].decode('utf-8').split(' ', 1))):
+                            new_file.write(line)
+                # appends to the old file from now on are lost: they're
+                # compiled again
+                os.rename(temp_path, self.path)
+            finally:
+                fcntl.flock(plan_file, fcntl.LOCK_UN)
+        self.refresh(force=True)
+
+
+# {path: PlanStore}
+_plan_stores = {}
+
+
+def get_plan_store(path):
+    plan_store = _plan_stores.get(path)
+    if plan_store is None:
+        plan_store = _plan_stores.setdefault(path, PlanStore(path))
+    return plan_store
@@ -0,0 +1,116 @@
+'''A pool of serializers whose fields are built, so requests with the same
+fields parameter can reuse them instead of building the nested serializers
+and copying their declared fields again (see
+CerealViewMixin.pool_serializers).
+
+Serializers are pooled by (serializer class, many, fields parameter). The
+fields parameter (and not its canonical tree) is the key because the order
+of the fields in it is the order they're serialized in.
+
+The fields of a pooled serializer are built once, for the first request
+using it: they mustn't depend on the request (or the rest of the context).
+Serializers overriding get_fields, or nesting serializers that do, aren't
+pooled (see is_poolable).
+'''
+import threading
+from collections import OrderedDict
+
+from rest_framework.serializers import ModelSerializer, Serializer
+
+from rest_cereal.graph import serializer_graph
+from rest_cereal.mixins import CerealMixin
+from rest_cereal.settings import cereal_settings
+
+
+def reset_serializer(serializer, instance, context):
+    '''Prepares a pooled serializer to serialize another instance (or list
+    of instances) in another context. Nested serializers read the context
+    of the root serializer.
+    '''
+    serializer.instance = instance
+    serializer._context = context
+    for attr in ('_data', '_errors', '_validated_data', 'initial_data'):
+        serializer.__dict__.pop(attr, None)
+    return serializer
+
+
+class SerializerPool(object):
+    '''Idle serializers by key. At most max_idle serializers are kept per key,
+    for the max_keys most recently used keys.
+    '''
+
+    def __init__(self, max_keys=100, max_idle=8):
+        self.max_keys = max_keys
+        self.max_idle = max_idle
+        # {key: [serializer]}, least recently used first
+        self.idle = OrderedDict()
+        self.lock = threading.Lock()
+
+    def acquire(self, key):
+        '''Returns an idle serializer for the key, or None.
+        '''
+        with self.lock:
+            serializers = self.idle.get(key)
+            if not serializers:
+                return None
+            return serializers.pop()
+
+    def release(self, key, serializer):
+        with self.lock:
+            serializers = self.idle.pop(key, [])
+            if len(serializers) < self.max_idle:
+                serializers.append(serializer)
+            self.idle[key] = serializers
+            while len(self.idle) > self.max_keys:
+                self.idle.popitem(last=False)
+
+
+def _get_function(cls, name):
+    function = getattr(cls, name)
+    return getattr(function, '__func__', function)
+
+
+# the get_fields methods building the same fields for every request
+_DEFAULT_GET_FIELDS = set(_get_function(cls, 'get_fields')
+                          for cls in (CerealMixin, ModelSerializer,
+                                      Serializer))
+
+# {serializer class: whether it can be pooled}
+_poolable = {}
+
+
+def is_poolable(serializer_class):
+    '''Whether neither the serializer class nor the serializer classes its
+    nested fields lead to override get_fields.
+    '''
+    poolable = _poolable.get(serializer_class)
+    if poolable is not None:
+        return poolable
+    poolable = True
+    seen = set()
+    pending = [serializer_class]
+    while pending:
+        nested_class = pending.pop()
+        if nested_class in seen:
+            continue
+        seen.add(nested_class)
+        if _get_function(nested_class, 'get_fields') not in \
+                _DEFAULT_GET_FIELDS:
+            poolable = False
+            break
+        pending.extend(serializer_graph.get_node(nested_class).nested
+                       .values())
+    return _poolable.setdefault(serializer_class, poolable)
+
+
+_pool = None
+
+
+def get_serializer_pool():
+    global _pool
+    if _pool is None:
+        _pool = SerializerPool(
+            max_keys=cereal_settings.SERIALIZER_POOL_KEYS,
+            max_idle=cereal_settings.SERIALIZER_POOL_SIZE
+        )
+    return _pool
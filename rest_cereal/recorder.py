@@ -0,0 +1,167 @@
+'''Records the fields parameters CerealViewMixin views are requested with,
+and periodically writes the most frequent ones to a warm-up file (see
+rest_cereal.warmup), so the warm-up follows live traffic:
+
+REST_CEREAL = {
+    'RECORDER_FILE': '/var/lib/app/cereal_warmup.txt',
+    'WARMUP_FILE': '/var/lib/app/cereal_warmup.txt',
+}
+
+Frequencies are estimated in fixed memory with a count-min sketch, and only
+the top RECORDER_TOP entries are kept. Fields parameters are counted by
+their canonical tree (so 'b,a' and 'a,b' count together) and written as the
+last fields parameter seen for the tree. Each process records its own
+requests; the file is replaced by whichever process writes last.
+'''
+import os
+import random
+import tempfile
+import threading
+import time
+
+from rest_cereal.settings import cereal_settings
+
+
+class CountMinSketch(object):
+    '''Estimates how many times keys were added, never under-estimating,
+    in width * depth counters.
+    '''
+
+    def __init__(self, width=2048, depth=4):
+        self.width = width
+        self.depth = depth
+        self.rows = [[0] * width for _ in range(depth)]
+
+    def add(self, key):
+        '''Counts the key and returns its estimated count.
+        '''
+        estimate = None
+        for index, row in enumerate(self.rows):
+            column = hash((index, key)) % self.width
+            row[column] += 1
+            if estimate is None or row[column] < estimate:
+                estimate = row[column]
+        return estimate
+
+
+class FieldsRecorder(object):
+    '''Keeps the top most frequent (view path, fields tree) keys.
+
+    :param top: the number of keys kept
+    :param sample_rate: fraction of the requests recorded
+    '''
+
+    def __init__(self, top=100, sample_rate=1.0, width=2048, depth=4):
+        self.top = top
+        self.sample_rate = sample_rate
+        self.sketch = CountMinSketch(width, depth)
+        # {(view path, canonical fields string): [count, fields parameter]}
+        self.counts = {}
+        self.min_count = 0
+        self.lock = threading.Lock()
+
+    def record(self, view_path, cereal_fields, fields_parameter):
+        if self.sample_rate < 1 and random.random() >= self.sample_rate:
+            return
+        key = (view_path, cereal_fields.to_fields_string())
+        with self.lock:
+            count = self.sketch.add(key)
+            if key in self.counts:
+                self.counts[key] = [count, fields_parameter]
+            elif len(self.counts) < self.top:
+                self.counts[key] = [count, fields_parameter]
+                self.min_count = min(entry[0]
+                                     for entry in self.counts.values())
+            elif count > self.min_count:
+                # replace the least frequent key
+                least = min(self.counts, key=lambda k: self.counts[k][0])
+                del self.counts[least]
+                self.counts[key] = [count, fields_parameter]
+                self.min_count = min(entry[0]
+                                     for entry in self.counts.values())
+
+    def get_top_entries(self):
+        '''Returns [(view path, fields parameter, count)], most frequent
+        first.
+        '''
+        with self.lock:
+            entries = [(view_path, fields_parameter, count)
+                       for (view_path, _), (count, fields_parameter)
+                       in self.counts.items()]
+        return sorted(entries, key=lambda entry: (-entry[2], entry[:2]))
+
+    def write(self, path):
+        '''Writes the top entries as a warm-up file (atomically replacing
+        it).
+        '''
+        directory = os.path.dirname(os.path.abspath(path))
+        file_descriptor, temp_path = tempfile.mkstemp(dir=directory)
+        with os.fdopen(file_descriptor, 'w') as warmup_file:
+            for view_path, fields_parameter, count in self.get_top_entries():
+                warmup_file.write('# {0} requests\n{1} {2}\n'.format(
+                    count, view_path, fields_parameter
+                ))
+        os.rename(temp_path, path)
+
+
+_recorder = None
+_last_write = [time.time()]
+# the thread writing the file, if any
+_writing = [None]
+_write_lock = threading.Lock()
+
+
+def get_recorder():
+    global _recorder
+    if _recorder is None:
+        _recorder = FieldsRecorder(
+            top=cereal_settings.RECORDER_TOP,
+            sample_rate=cereal_settings.RECORDER_SAMPLE_RATE
+        )
+    return _recorder
+
+
+def wait_for_writing():
+    '''Waits for the file being written, if any (ex: in tests).
+    '''
+    thread = _writing[0]
+    if thread is not None:
+        thread.join()
+
+
+def is_recordable(fields_parameter):
+    '''Whether the fields parameter fits on a line of the warm-up file,
+    after the view path: without whitespace or control characters.
+    '''
+    return all(not char.isspace() and ord(char) >= 32 and ord(char) != 127
+               for char in fields_parameter)
+
+
+def record_request(view, cereal_fields, fields_parameter):
+    '''Records the fields of a request to a view if RECORDER_FILE is set,
+    and writes the file every RECORDER_INTERVAL seconds, on another thread.
+    Only pass the fields of requests that were served: the warm-up
+    compiles them again at startup.
+    '''
+    path = cereal_settings.RECORDER_FILE
+    if not path or not is_recordable(fields_parameter):
+        return
+    view_class = view.__class__
+    recorder = get_recorder()
+    recorder.record(view_class.__module__ + '.' + view_class.__name__,
+                    cereal_fields, fields_parameter)
+
+    now = time.time()
+    if now - _last_write[0] < cereal_settings.RECORDER_INTERVAL:
+        return
+    with _write_lock:
+        thread = _writing[0]
+        if now - _last_write[0] < cereal_settings.RECORDER_INTERVAL or \
+                thread is not None and thread.is_alive():
+            return
+        _last_write[0] = now
+        thread = threading.Thread(target=recorder.write, args=(path,),
+                                  name='cereal-recorder')
+        thread.daemon = True
+        _writing[0] = thread
+        thread.start()
@@ -0,0 +1,115 @@
+import struct
+import sys
+import zipfile
+from io import BytesIO
+
+from django.utils import six
+from rest_framework.utils import encoders
+from rest_framework.renderers import BaseRenderer
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+class MessagePackRenderer(BaseRenderer):
+    '''Renders serializer data as MessagePack. Select it with the header:
+
+    Accept: application/msgpack
+
+    The serializer data (including the ':compact' representation of
+    CerealListSerializer) is packed directly, without an intermediate JSON
+    pass. Values msgpack can't pack natively (Decimal, datetime, UUID, lazy
+    translation strings...) are converted the same way the JSON renderer
+    converts them.
+
+    Requires the msgpack package to be installed.
+    '''
+
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    # On python 2, field names are bytestrings. Packing them as the (old
+    # spec) raw type keeps them readable as strings by other clients.
+    use_bin_type = six.PY3
+
+    json_encoder_class = encoders.JSONEncoder
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        assert msgpack is not None, \
+            'MessagePackRenderer requires msgpack to be installed'
+        if data is None:
+            return bytes()
+
+        return msgpack.packb(
+            data,
+            default=self.json_encoder_class().default,
+            use_bin_type=self.use_bin_type
+        )
+
+
+class NpzRenderer(BaseRenderer):
+    '''Renders a dict of {column name: array.array} (see
+    CerealViewMixin.get_columns) as a numpy .npz archive, with one .npy
+    file per column. Select it with the header:
+
+    Accept: application/x-npz
+
+    numpy isn't needed to build the archive: the arrays' buffers are written
+    as they are, behind a .npy header. On the client side:
+
+    columns = numpy.load(BytesIO(response.content))
+    columns['field1'] -> array([...], dtype=int64)
+    '''
+
+    media_type = 'application/x-npz'
+    format = 'npz'
+    charset = None
+    render_style = 'binary'
+
+    byte_order = '<' if sys.byteorder == 'little' else '>'
+
+    # array.array typecode -> numpy dtype kind
+    dtype_kinds = {
+        'B': 'b',  # booleans
+        'h': 'i', 'i': 'i', 'l': 'i', 'q': 'i',
+        'f': 'f', 'd': 'f',
+    }
+
+    def get_dtype(self, column):
+        kind = self.dtype_kinds[column.typecode]
+        if kind == 'b':
+            return '|b1'
+        return '{0}{1}{2}'.format(self.byte_order, kind, column.itemsize)
+
+    def write_npy(self, output, column):
+        '''Writes the array.array column in the .npy (version 1.0) format.
+        '''
+        header = "{{'descr': '{0}', 'fortran_order': False, " \
+                 "'shape': ({1},), }}".format(self.get_dtype(column),
+                                            len(column))
+        # magic string + version + header length + header must be a multiple
+        # of 64 bytes, with the header terminated by a newline.
+        preamble_length = 6 + 2 + 2
+        padding = 64 - (preamble_length + len(header) + 1) % 64
+        header = header + ' ' * padding + '\n'
+        output.write(b'\x93NUMPY\x01\x00')
+        output.write(struct.pack('<H', len(header)))
+        output.write(header.encode('latin1'))
+        output.write(column.tostring() if six.PY2 else column.tobytes())
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return bytes()
+
+        output = BytesIO()
+        archive = zipfile.ZipFile(output, 'w', zipfile.ZIP_STORED)
+        for name, column in data.items():
+            npy = BytesIO()
+            self.write_npy(npy, column)
+            archive.writestr(name + '.npy', npy.getvalue())
+        archive.close()
+        return output.getvalue()
@@ -0,0 +1,158 @@
+'''Sends the reads of CerealViewMixin views to read replicas (CerealMixin
+serializers don't save, so their requests only read):
+
+DATABASE_ROUTERS = ['rest_cereal.routing.CerealReplicaRouter']
+MIDDLEWARE_CLASSES = [
+    ...
+    'rest_cereal.routing.ReadPrimaryMiddleware',
+]
+REST_CEREAL = {
+    'READ_DATABASES': {'default': 1, 'replica1': 2, 'replica2': 2},
+}
+
+READ_DATABASES weighs the databases the views read from. Each request goes
+to the database with the lowest estimated cost (see rest_cereal.cost) of
+the requests it's serving, relative to its weight, and its queryset (with
+the planned prefetches, which follow the objects' database) reads from it.
+
+Read-your-writes: once a request with an unsafe method (ex: POST) writes
+to a database, the ReadPrimaryMiddleware sets a cookie and a header telling
+the client's requests to read from the primary database ('default') for
+READ_PRIMARY_SECONDS, so they see the write even if the replicas lag.
+Clients that don't keep cookies send the header back. The value is signed
+with a timestamp (see django.core.signing), so clients can't extend it.
+Writes of safe requests (ex: sessions, caches, last_login) don't count.
+'''
+import threading
+
+from django.core import signing
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework.permissions import SAFE_METHODS
+
+from rest_cereal.settings import cereal_settings
+
+
+class ReplicaBalancer(object):
+    '''Chooses the database with the least estimated cost in flight,
+    relative to its weight.
+
+    :param weights: {database alias: weight}
+    '''
+
+    def __init__(self, weights):
+        self.weights = dict(weights)
+        self.in_flight = dict((alias, 0) for alias in self.weights)
+        self.lock = threading.Lock()
+
+    def acquire(self, cost):
+        '''Returns the alias of the database to serve a request of the cost
+        with, counting the cost in flight until it's released.
+        '''
+        with self.lock:
+            alias = min(
+                sorted(self.weights),
+                key=lambda alias: (self.in_flight[alias] + cost) /
+                float(self.weights[alias])
+            )
+            self.in_flight[alias] += cost
+        return alias
+
+    def release(self, alias, cost):
+        with self.lock:
+            self.in_flight[alias] -= cost
+
+
+# {weights as sorted tuple: ReplicaBalancer}
+_balancers = {}
+
+
+def get_replica_balancer():
+    '''Returns the ReplicaBalancer of the READ_DATABASES setting, or None if
+    it's empty.
+    '''
+    weights = cereal_settings.READ_DATABASES
+    if not weights:
+        return None
+    key = tuple(sorted(weights.items()))
+    balancer = _balancers.get(key)
+    if balancer is None:
+        balancer = _balancers.setdefault(key, ReplicaBalancer(weights))
+    return balancer
+
+
+_state = threading.local()
+
+
+def get_read_primary_header_name():
+    '''The name of the header in request.META.
+    '''
+    return 'HTTP_' + cereal_settings.READ_PRIMARY_HEADER.upper() \
+        .replace('-', '_')
+
+
+def get_read_primary_signer():
+    return signing.TimestampSigner(salt='rest_cereal.routing.read_primary')
+
+
+def get_read_primary_value():
+    '''The value of the cookie and header sent to clients who wrote.
+    '''
+    return get_read_primary_signer().sign('1')
+
+
+def reads_from_primary(request):
+    '''Whether the client wrote in the last READ_PRIMARY_SECONDS, so its
+    reads should go to the primary database.
+    '''
+    value = request.COOKIES.get(cereal_settings.READ_PRIMARY_COOKIE) or \
+        request.META.get(get_read_primary_header_name())
+    if not value:
+        return False
+    try:
+        get_read_primary_signer().unsign(
+            value, max_age=cereal_settings.READ_PRIMARY_SECONDS
+        )
+    except signing.BadSignature:
+        # tampered with, or expired
+        return False
+    return True
+
+
+class CerealReplicaRouter(object):
+    '''Notes the writes of the current thread (for ReadPrimaryMiddleware),
+    and allows relations between objects of the READ_DATABASES, which hold
+    the same data. Reads are routed by CerealViewMixin.
+    '''
+
+    def db_for_read(self, model, **hints):
+        return None
+
+    def db_for_write(self, model, **hints):
+        _state.wrote = True
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        aliases = set(cereal_settings.READ_DATABASES) | \
+            set([DEFAULT_DB_ALIAS])
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+
+class ReadPrimaryMiddleware(object):
+    '''Tells clients whose unsafe request wrote to read from the primary
+    database for READ_PRIMARY_SECONDS.
+    '''
+
+    def process_request(self, request):
+        _state.wrote = False
+
+    def process_response(self, request, response):
+        wrote = getattr(_state, 'wrote', False)
+        _state.wrote = False
+        if wrote and request.method not in SAFE_METHODS:
+            value = get_read_primary_value()
+            response.set_cookie(cereal_settings.READ_PRIMARY_COOKIE, value,
+                                max_age=cereal_settings.READ_PRIMARY_SECONDS)
+            response[cereal_settings.READ_PRIMARY_HEADER] = value
+        return response
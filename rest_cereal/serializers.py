@@ -1,4 +1,18 @@
 import collections
+import sys
+import threading
+
+from django.utils import six
+from django.utils.module_loading import import_string
+
+
+# {name or dotted path: serializer class} used to resolve LazySerializers.
+# Serializers can be registered under their name (see
+# LazySerializer.register), the other references are added as they are
+# resolved.
+serializer_registry = {}
+
+_resolve_lock = threading.RLock()
 
 
 class LazySerializer(object):
@@ -35,9 +49,15 @@ class LazySerializer(object):
     infinitely nested fields in a request (you can specify a lot of nesting,
     but we can put limits on the requests).
 
-    IMPORTANT
-    * You have to call the convert_serializers method at the bottom of your
-    serializers file which pieces together all the lazy circular referencing.
+    The referenced serializer can be a registered name (see register), a
+    dotted path ('app.serializers.A') or the name of a serializer in the
+    module declaring the LazySerializer. LazySerializer fields are resolved
+    and instantiated the first time the fields of their serializer class are
+    built (see get_declared_fields), so circular serializers cost nothing
+    until a request traverses them.
+
+    Calling the convert_serializers method at the bottom of your serializers
+    file is no longer required (it resolves the fields right away).
     '''
 
     class DoesNotExistException(BaseException):
@@ -49,72 +69,115 @@ class LazySerializer(object):
         self.kwargs = kwargs
         return None
 
+    @staticmethod
+    def register(serializer_class):
+        '''Class decorator registering the serializer class under its name,
+        so LazySerializers in any module can reference it by name.
+        '''
+        serializer_registry[serializer_class.__name__] = serializer_class
+        return serializer_class
+
+    def get_serializer_class(self, owner, global_namespace=None):
+        '''Resolves the referenced serializer class (cached in the
+        serializer_registry).
+
+        :param owner: the serializer class declaring the LazySerializer
+        :param global_namespace: namespace to look names up in, instead of
+        the owner's module
+        '''
+        reference = self.serializer_class
+        if not isinstance(reference, six.string_types):
+            return reference
+
+        if '.' in reference:
+            path = reference
+        else:
+            serializer_class = serializer_registry.get(reference)
+            if serializer_class is not None:
+                return serializer_class
+            path = owner.__module__ + '.' + reference
+
+        serializer_class = serializer_registry.get(path)
+        if serializer_class is not None:
+            return serializer_class
+
+        if '.' in reference:
+            try:
+                serializer_class = import_string(reference)
+            except ImportError:
+                serializer_class = None
+        elif global_namespace is not None:
+            serializer_class = global_namespace.get(reference, None)
+        else:
+            serializer_class = getattr(sys.modules.get(owner.__module__),
+                                       reference, None)
+        if serializer_class is None:
+            raise LazySerializer.DoesNotExistException(
+                '{0} could not be found, so the field could not be '
+                'instantiated. Use a registered name, a dotted path or the '
+                'name of a serializer in the module of {1}.'
+                .format(reference, owner.__name__)
+            )
+        serializer_registry[path] = serializer_class
+        return serializer_class
+
+    @staticmethod
+    def get_declared_fields(serializer_class, global_namespace=None):
+        '''Returns the _declared_fields of the serializer class, with its
+        LazySerializer fields instantiated. Each LazySerializer is
+        instantiated once, the first time this is called for its class.
+        '''
+        if '_lazy_fields_resolved' not in vars(serializer_class):
+            with _resolve_lock:
+                if '_lazy_fields_resolved' not in vars(serializer_class):
+                    LazySerializer._resolve_fields(serializer_class,
+                                                   global_namespace)
+        return getattr(serializer_class, '_declared_fields', {})
+
+    @staticmethod
+    def _resolve_fields(serializer_class, global_namespace):
+        declared_fields = getattr(serializer_class, '_declared_fields', None)
+        if declared_fields is not None:
+            for field_name in dir(serializer_class):
+                field = getattr(serializer_class, field_name, None)
+                if not isinstance(field, LazySerializer) or \
+                        field_name in declared_fields:
+                    continue
+                owner = next(klass for klass in serializer_class.__mro__
+                             if field_name in vars(klass))
+                if owner is not serializer_class:
+                    # share the field of the class declaring it
+                    owner_fields = LazySerializer.get_declared_fields(
+                        owner, global_namespace
+                    )
+                    if field_name in owner_fields:
+                        declared_fields[field_name] = owner_fields[field_name]
+                        continue
+                field_class = field.get_serializer_class(owner,
+                                                         global_namespace)
+                declared_fields[field_name] = field_class(*field.args,
+                                                          **field.kwargs)
+        serializer_class._lazy_fields_resolved = True
+
     @staticmethod
     def convert_serializers(global_namespace, serializer_class_list):
         '''
-        Call this method at the end of your serializer file with the global
-        namespace and the classes that have LazySerializers in them. Ex:
+        Resolves the LazySerializer fields of the serializer classes right
+        away, looking the serializers' names up in the global namespace. Ex:
 
         LazySerializer.convert_serializers(
             globals(), [LJobDaySerializer, LJobSerializer]
         )
 
-        This converts the lazyserializer's class to the field of each
-        LazySerializer found within the inherited classes of
-        inherited_serializer_class_list.
+        This isn't required anymore: LazySerializer fields are resolved the
+        first time they are used.
         :param global_namespace:
         :param serializer_class_list:
         :return:
         '''
-
-        circular_fields = \
-            {serializer_class: {} for serializer_class in serializer_class_list}
-
-        # First, remove the field from each class' 'field' attribute
-        # so that when circular fields are instantiated in other serializers,
-        # they don't cause errors, 'Can't instantiate LazySerializer field'.
         for serializer_class in serializer_class_list:
-            for field_name in serializer_class.Meta.fields:
-                field = getattr(serializer_class, field_name, None)
-                if isinstance(field, LazySerializer):
-                    field = getattr(serializer_class, field_name)
-                    circular_fields[serializer_class][field_name] = field
-            # remove the LazySerializer fields
-            serializer_class.Meta.fields = \
-                tuple(fld for fld in serializer_class.Meta.fields
-                      if fld not in circular_fields[serializer_class].keys())
-
-        # Next, turn the LazyFields into real fields and add the field back to
-        # the class' 'field' attribute (because the class no longer has
-        # error-causing LazySerializer fields).
-        for serializer_class, fields in circular_fields.iteritems():
-            _declared_fields = getattr(serializer_class, '_declared_fields', {})
-            for field_name, field in fields.iteritems():
-                field_class = global_namespace.get(
-                    field.serializer_class, None
-                )
-                if field_class is None:
-                    # You could implement handling namespaced paths here, but
-                    # it's painful with little reward.
-                    raise LazySerializer.DoesNotExistException(
-                        '{0} does not exist in global_namespace, so the '
-                        'field could not be instantiated. Use the actual class '
-                        'name and not a namespaced path to it (ex: Foo, not '
-                        'bar.Foo)'
-                        .format(field.serializer_class)
-                    )
-                _declared_fields[field_name] = field_class(*field.args,
-                                                           **field.kwargs)
-                field_args = field.args
-                field_kwargs = field.kwargs
-                field = field_class(*field_args, **field_kwargs)
-                field.args = field_args
-                field.kwargs = field_kwargs
-                setattr(serializer_class, field_name, field)
-
-            # put the LazerSerializer fields back
-            serializer_class.Meta.fields = \
-                tuple(list(serializer_class.Meta.fields) + fields.keys())
+            LazySerializer.get_declared_fields(serializer_class,
+                                               global_namespace)
 
 
 class MethodSerializerMixin(object):
@@ -163,8 +226,14 @@ class MethodSerializerMixin(object):
         super(MethodSerializerMixin, self).__init__(*args, **kwargs)
 
     def get_attribute(self, instance, *args, **kwargs):
-        function_ = getattr(self.parent, self.method_name)
-        value = function_(instance)
+        # values called ahead (see CerealMixin.prefetch_method_values)
+        values = getattr(self.parent, '_cereal_method_values', None)
+        key = (self.field_name, id(instance))
+        if values is not None and key in values:
+            value = values[key]
+        else:
+            function_ = getattr(self.parent, self.method_name)
+            value = function_(instance)
         # We don't want the setattr call below to write to db.
         # This can happen if there is a RelatedField at getattr(obj, field_name)
         # so make sure there are no collisions of fields to write to
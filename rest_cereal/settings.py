@@ -0,0 +1,104 @@
+'''Settings for Django Rest Cereal are all namespaced in the REST_CEREAL
+setting. For example your project's settings.py file might look like this:
+
+REST_CEREAL = {
+    'PERSISTED_FIELDS_CACHE': 'cereal',
+}
+
+Settings are read on access, so they can be overridden in tests.
+'''
+from django.conf import settings
+
+
+DEFAULTS = {
+    # Alias (in CACHES) of the cache storing persisted fields trees. Use a
+    # database cache to share them between servers.
+    'PERSISTED_FIELDS_CACHE': 'default',
+    # Seconds persisted fields are kept (None: forever).
+    'PERSISTED_FIELDS_TIMEOUT': None,
+    # Number of persisted fields trees each process keeps compiled.
+    'PERSISTED_FIELDS_MEMORY_SIZE': 1000,
+    # Rate users can register fields strings at (None: not throttled, see
+    # rest_cereal.throttling.PersistedFieldsThrottle).
+    'PERSISTED_FIELDS_RATE': '100/hour',
+
+    # Whether the serializer graph and the presets of the CerealMixin
+    # serializers imported when the app is ready are built then, resolving
+    # their LazySerializers (otherwise: on first use, see rest_cereal.apps).
+    'BUILD_AT_STARTUP': False,
+
+    # (view path, fields parameter) pairs compiled when the app is ready,
+    # and a file listing more of them (see rest_cereal.warmup).
+    'WARMUP_FIELDS': (),
+    'WARMUP_FILE': None,
+    # Warm-up file the most frequent fields parameters are written to (None:
+    # not recorded), every RECORDER_INTERVAL seconds (see
+    # rest_cereal.recorder).
+    'RECORDER_FILE': None,
+    'RECORDER_INTERVAL': 300,
+    'RECORDER_TOP': 100,
+    'RECORDER_SAMPLE_RATE': 1.0,
+
+    # File sharing the compiled fields parameters between the processes of
+    # a host (None: not shared, see rest_cereal.planstore).
+    'PLAN_STORE_FILE': None,
+
+    # Whether the query planner chooses between joining and prefetching
+    # to-one relations from their statistics, sampled every STATS_INTERVAL
+    # seconds: relations whose related objects are shared by more than
+    # JOIN_MAX_FAN_IN objects on average are prefetched (see
+    # rest_cereal.stats).
+    'ADAPTIVE_JOINS': False,
+    'STATS_INTERVAL': 3600,
+    'JOIN_MAX_FAN_IN': 10,
+
+    # {database alias: weight} CerealViewMixin views read from, and how the
+    # clients who wrote are told to read from the primary database for
+    # READ_PRIMARY_SECONDS (see rest_cereal.routing). Empty: the default
+    # routing.
+    'READ_DATABASES': {},
+    'READ_PRIMARY_COOKIE': 'cereal_read_primary',
+    'READ_PRIMARY_HEADER': 'X-Cereal-Read-Primary',
+    'READ_PRIMARY_SECONDS': 10,
+
+    # Number of threads CerealViewMixin views run the prefetches of
+    # independent relations on (None: one after another).
+    'PREFETCH_THREADS': None,
+
+    # Seconds CerealViewMixin responses can take to serialize (None: no
+    # limit, see rest_cereal.deadline).
+    'SERIALIZATION_BUDGET': None,
+
+    # Number of fields parameters serializers are pooled for, and of idle
+    # serializers kept per fields parameter (see rest_cereal.pool).
+    'SERIALIZER_POOL_KEYS': 100,
+    'SERIALIZER_POOL_SIZE': 8,
+
+    # Limits of the fields parameter, checked while it's parsed (None: no
+    # limit).
+    'FIELDS_MAX_LENGTH': 4000,
+    'FIELDS_MAX_DEPTH': 10,
+    'FIELDS_MAX_NODES': 500,
+    'FIELDS_MAX_FIELDS_PER_NODE': 100,
+
+    # Weights of the fields tree cost estimates (see rest_cereal.cost).
+    'COST_FIELD': 1,
+    'COST_NESTED': 1,
+    'COST_DEPTH': 1,
+    'COST_DEFAULT_CARDINALITY': 10,
+    'COST_DEFAULT_METHOD_WEIGHT': 10,
+    # Requests with an estimated cost above this are rejected by
+    # CerealViewMixin views (None: no limit).
+    'MAX_COST': None,
+}
+
+
+class CerealSettings(object):
+
+    def __getattr__(self, attr):
+        if attr not in DEFAULTS:
+            raise AttributeError("Invalid REST_CEREAL setting: '%s'" % attr)
+        return getattr(settings, 'REST_CEREAL', {}).get(attr, DEFAULTS[attr])
+
+
+cereal_settings = CerealSettings()
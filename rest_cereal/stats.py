@@ -0,0 +1,163 @@
+'''Statistics of the models' relations, used by the query planner to
+choose how to load nested to-one relations when ADAPTIVE_JOINS is set
+(see rest_cereal.planning.plan_query):
+
+REST_CEREAL = {
+    'ADAPTIVE_JOINS': True,
+}
+
+A join repeats the columns of a related object in the row of every object
+pointing to it, while a prefetch reads each related object once, in one more
+query. Relations whose related objects are shared by more than JOIN_MAX_FAN_IN
+objects on average are prefetched, the others are joined.
+
+The statistics of a relation are sampled with two count queries, on a
+background thread, the first time it's planned and every STATS_INTERVAL
+seconds after that: one thread per relation at a time, on a read database
+(see rest_cereal.routing). Meanwhile, requests are planned with the stats
+sampled before, or, until there are some, statically (joining the relation).
+Nothing is sampled while the apps are loading (ex: presets compiled at
+startup, or migrate on an empty database). The statistics can also be set
+(ex: from a nightly job) with set_relation_stats.
+'''
+import threading
+import time
+
+from django.apps import apps
+from django.db import connections
+from django.db.models import Count
+
+from rest_cereal.routing import get_replica_balancer
+from rest_cereal.settings import cereal_settings
+
+
+class RelationStats(object):
+    '''Row counts of a relation: the objects of the model, the related
+    objects, the (object, related object) links and the distinct related
+    objects linked.
+    '''
+
+    def __init__(self, rows, related_rows, links, distinct):
+        self.rows = rows
+        self.related_rows = related_rows
+        self.links = links
+        self.distinct = distinct
+
+    @property
+    def fan_out(self):
+        '''Average number of related objects per object.
+        '''
+        return float(self.links) / self.rows if self.rows else 0.0
+
+    @property
+    def fan_in(self):
+        '''Average number of objects per linked related object.
+        '''
+        return float(self.links) / self.distinct if self.distinct else 0.0
+
+    def to_data(self):
+        return {
+            'rows': self.rows,
+            'related_rows': self.related_rows,
+            'fan_out': round(self.fan_out, 2),
+            'fan_in': round(self.fan_in, 2),
+        }
+
+    def __repr__(self):
+        return 'RelationStats(' + ', '.join(
+            '{0}: {1}'.format(key, value)
+            for key, value in sorted(self.to_data().items())
+        ) + ')'
+
+
+def sample_relation_stats(model, relation, using=None):
+    '''Counts the rows of the relation (model.<relation.name> in queries).
+    '''
+    counts = model._default_manager.db_manager(using).aggregate(
+        rows=Count('pk'),
+        links=Count(relation.name),
+        distinct=Count(relation.name, distinct=True)
+    )
+    return RelationStats(
+        rows=counts['rows'],
+        related_rows=relation.related_model._default_manager
+        .db_manager(using).count(),
+        links=counts['links'],
+        distinct=counts['distinct']
+    )
+
+
+# {(model, relation name): (time sampled, RelationStats)}
+_relation_stats = {}
+# {(model, relation name): thread sampling it}
+_sampling = {}
+_lock = threading.Lock()
+
+
+def refresh_relation_stats(model, relation):
+    '''Samples the relation's statistics (on a read database).
+    '''
+    key = (model, relation.name)
+    try:
+        balancer = get_replica_balancer()
+        # no cost: the least loaded database
+        using = balancer.acquire(0) if balancer is not None else None
+        stats = sample_relation_stats(model, relation, using)
+        with _lock:
+            entry = _relation_stats.get(key)
+            if entry is None or entry[0] is not None:
+                _relation_stats[key] = (time.time(), stats)
+    finally:
+        with _lock:
+            if _sampling.get(key) is threading.current_thread():
+                del _sampling[key]
+
+
+def _refresh_in_background(model, relation):
+    try:
+        refresh_relation_stats(model, relation)
+    finally:
+        connections.close_all()
+
+
+def get_relation_stats(model, relation):
+    '''Returns the RelationStats of the relation, or None if it hasn't been
+    sampled yet. Stats missing or older than STATS_INTERVAL seconds are
+    sampled on a background thread (see refresh_relation_stats).
+    '''
+    key = (model, relation.name)
+    with _lock:
+        entry = _relation_stats.get(key)
+        stale = entry is None or (
+            entry[0] is not None and
+            time.time() - entry[0] >= cereal_settings.STATS_INTERVAL
+        )
+        if not stale or key in _sampling or not apps.ready:
+            return entry[1] if entry is not None else None
+        thread = threading.Thread(target=_refresh_in_background,
+                                  args=(model, relation))
+        thread.daemon = True
+        _sampling[key] = thread
+    thread.start()
+    return entry[1] if entry is not None else None
+
+
+def wait_for_sampling():
+    '''Waits for the background samplings in progress (ex: in tests).
+    '''
+    with _lock:
+        threads = list(_sampling.values())
+    for thread in threads:
+        thread.join()
+
+
+def set_relation_stats(model, relation_name, stats):
+    '''Sets the statistics of a relation. They aren't sampled again.
+    '''
+    with _lock:
+        _relation_stats[(model, relation_name)] = (None, stats)
+
+
+def clear_relation_stats():
+    with _lock:
+        _relation_stats.clear()
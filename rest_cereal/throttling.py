@@ -0,0 +1,119 @@
+import math
+
+from rest_framework.throttling import SimpleRateThrottle, UserRateThrottle
+
+from rest_cereal.cost import measure_cost
+from rest_cereal.settings import cereal_settings
+
+
+class CerealCostThrottle(SimpleRateThrottle):
+    '''Token bucket throttle charging each request its estimated cost (see
+    CerealViewMixin.get_cost) instead of counting requests.
+
+    The rate is the size of the buckets, refilled continuously over the
+    period: with 'cereal_cost': '6000/min', a client can spend 6000 at once
+    and then 100 per second. Buckets are kept in the Django cache, per user
+    (or per IP for anonymous requests).
+
+    REST_FRAMEWORK = {
+        'DEFAULT_THROTTLE_RATES': {'cereal_cost': '6000/min'},
+    }
+
+    Views without a get_cost method are charged 1 per request.
+
+    With charge_measured_cost, the difference between the cost of the
+    rendered data (see rest_cereal.cost.measure_cost) and the estimate is
+    charged (or refunded) once the response is finalized. This requires the
+    view to inherit the CerealViewMixin.
+    '''
+
+    scope = 'cereal_cost'
+    cache_format = 'throttle_%(scope)s_%(ident)s'
+    charge_measured_cost = False
+
+    def get_cache_key(self, request, view):
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated():
+            ident = user.pk
+        else:
+            ident = self.get_ident(request)
+        return self.cache_format % {'scope': self.scope, 'ident': ident}
+
+    def get_request_cost(self, request, view):
+        get_cost = getattr(view, 'get_cost', None)
+        if get_cost is None:
+            return 1
+        return get_cost()
+
+    def get_tokens(self):
+        '''Returns the tokens left in the bucket, refilled up to now.
+        '''
+        tokens, updated = self.cache.get(self.key,
+                                         (self.num_requests, self.now))
+        refill = (self.now - updated) * self.num_requests / \
+            float(self.duration)
+        return min(self.num_requests, tokens + refill)
+
+    def set_tokens(self, tokens):
+        # Kept until the bucket is full again (a missing bucket is full),
+        # however far below 0 measured costs took it.
+        timeout = self.duration * (self.num_requests - tokens) / \
+            float(self.num_requests)
+        self.cache.set(self.key, (tokens, self.now),
+                       max(int(math.ceil(timeout)), 1))
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        self.now = self.timer()
+        self.tokens = self.get_tokens()
+        self.cost = self.get_request_cost(request, view)
+        if self.cost > self.tokens:
+            return self.throttle_failure()
+        if self.charge_measured_cost:
+            # charged by CerealViewMixin.finalize_response
+            if not hasattr(request, '_cereal_measured_throttles'):
+                request._cereal_measured_throttles = []
+            request._cereal_measured_throttles.append(self)
+        return self.throttle_success()
+
+    def throttle_success(self):
+        self.set_tokens(self.tokens - self.cost)
+        return True
+
+    def charge_measured(self, response):
+        '''Charges the difference between the measured cost of the response
+        data and the estimated cost that was charged.
+        '''
+        if response.exception or response.data is None:
+            return
+        self.now = self.timer()
+        difference = measure_cost(response.data) - self.cost
+        # The bucket can go below 0: the next requests wait for it to refill.
+        self.set_tokens(min(self.num_requests,
+                            self.get_tokens() - difference))
+
+    def wait(self):
+        '''Returns the seconds until the bucket holds the request's cost.
+        '''
+        if self.cost > self.num_requests:
+            # never allowed
+            return None
+        return (self.cost - self.tokens) * self.duration / \
+            float(self.num_requests)
+
+
+class PersistedFieldsThrottle(UserRateThrottle):
+    '''Limits the fields strings a user (or an IP, for anonymous requests)
+    registers with the PersistedFieldsView, at the PERSISTED_FIELDS_RATE.
+    '''
+
+    scope = 'cereal_persisted_fields'
+
+    def get_rate(self):
+        return cereal_settings.PERSISTED_FIELDS_RATE
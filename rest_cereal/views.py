@@ -0,0 +1,832 @@
+import array
+import copy
+from collections import OrderedDict
+from itertools import islice
+
+from django.core.exceptions import FieldDoesNotExist, \
+    ValidationError as DjangoValidationError
+from django.http import QueryDict
+from django.utils import six
+from rest_framework import status
+from rest_framework.permissions import IsAuthenticated, SAFE_METHODS
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from rest_cereal.concurrency import get_thread_pool
+from rest_cereal.cost import estimate_cost
+from rest_cereal.deadline import Deadline
+from rest_cereal.dbjson import DatabaseJSONResponse, \
+    DatabaseJSONUnsupported, get_json_rows
+from rest_cereal.graph import serializer_graph
+from rest_cereal.loading import BatchLoader
+from rest_cereal.mixins import CerealException, CerealListSerializer, \
+    CerealMixin
+from rest_cereal.persisted import PersistedFieldsStore
+from rest_cereal.planning import plan_query
+from rest_cereal.pool import get_serializer_pool, is_poolable, \
+    reset_serializer
+from rest_cereal.recorder import record_request
+from rest_cereal.routing import get_replica_balancer, reads_from_primary
+from rest_cereal.settings import cereal_settings
+from rest_cereal.throttling import PersistedFieldsThrottle
+
+
+class CerealViewMixin(object):
+    '''Mixin for GenericAPIViews (or ViewSets) whose serializer_class
+    inherits the CerealMixin.
+
+    The queryset is planned from the fields parameter: the relations the
+    serializer will traverse are added to the queryset with select_related
+    and prefetch_related (see rest_cereal.planning).
+
+    Columnar export: when a list request is rendered with a 'npz' renderer
+    (see rest_cereal.renderers.NpzRenderer), the scalar fields selected in
+    the fields parameter are read with values_list() and returned as one
+    typed array per field, instead of being serialized row by row:
+
+    GET /player/?fields=id,field1,field2
+    Accept: application/x-npz
+
+    The columnar export isn't paginated.
+
+    The fields parameter is validated against the serializer graph (see
+    rest_cereal.graph) before the throttles run, so bad fields are rejected
+    without running queries.
+
+    Admission control: the cost of the fields parameter is estimated (see
+    rest_cereal.cost) before the throttles run, and requests costing more
+    than max_cost are rejected with a 400. The ':cost' option returns the
+    estimate instead of the data:
+
+    GET /player/?fields=id,teams(players(id)),:cost -> {"cost": <estimate>}
+
+    The estimate is also what rest_cereal.throttling.CerealCostThrottle
+    charges.
+
+    The ':explain' option returns the query plan of the fields parameter
+    instead of the data, with the strategy chosen for each relation (see
+    rest_cereal.planning.plan_query):
+
+    GET /player/?fields=id,team(id),:explain ->
+    {"explain": {"select_related": ["team"], "prefetch_related": [],
+                 "paths": [{"path": "team", "strategy": "join", ...}]}}
+
+    With pool_serializers, the serializers built for a fields parameter are
+    kept once the response is rendered, and reused by the next requests
+    with the same fields parameter, whatever their user (see
+    rest_cereal.pool). Only enable it for serializers whose fields don't
+    depend on the request: serializer classes overriding get_fields (or
+    nesting serializers that do) are never pooled.
+
+    Time budget: with a serialization_budget (defaulting to the
+    SERIALIZATION_BUDGET setting), responses taking longer than that many
+    seconds to serialize are stopped with a 503 (see rest_cereal.deadline).
+    List requests passing the ':partial' option get the rows serialized in
+    time instead, and where to continue from:
+
+    GET /player/?fields=id,teams(id),:partial ->
+    {"results": [...], "partial": true, "continue_from": 120}
+    GET /player/?fields=id,teams(id),:partial&continue_from=120 ->
+    {"results": [...], "partial": false, "continue_from": null}
+
+    Paginated responses get the 'partial' and 'continue_from' keys next to
+    their results, and continue from a row of the same page.
+
+    With the READ_DATABASES setting, the safe (ex: GET) requests of views
+    with read_replicas read from the database chosen by the replica
+    balancer, weighted by their estimated cost, unless the client wrote
+    recently (see rest_cereal.routing).
+
+    Experimental: with database_json, unpaginated JSON list requests are
+    serialized by the database, in one query, when all the requested fields
+    can be (see rest_cereal.dbjson). Other requests are serialized as usual.
+
+    With batch_loading, the prefetches of a request load their objects
+    through one BatchLoader (see rest_cereal.loading), which is also in the
+    serializer context as 'cereal_loader' for MethodSerializerMixin methods.
+
+    Writes: create and update validate and save the serializer's own
+    fields, and return the saved objects shaped by the fields parameter,
+    with the planned relations prefetched on them. Lists of objects are
+    created (POST on the list) and updated (PUT or PATCH on the list, each
+    object with its primary key) in bulk (see rest_cereal.writing):
+
+    PATCH /player/?fields=id,team(name) [{"id": 1, "team": 3}, ...] ->
+    [{"id": 1, "team": {"name": "c"}}, ...]
+
+    The fields parameters of successful requests are recorded for the
+    warm-up if RECORDER_FILE is set (see rest_cereal.recorder).
+    '''
+
+    # Defaults to the MAX_COST setting. None: no limit.
+    max_cost = None
+
+    pool_serializers = False
+
+    # Number of threads the prefetches of independent relations run on
+    # concurrently (see rest_cereal.planning.ConcurrentPrefetchMixin).
+    # Defaults to the PREFETCH_THREADS setting. None: one after another.
+    prefetch_threads = None
+
+    batch_loading = False
+
+    read_replicas = True
+
+    database_json = False
+
+    # Seconds the responses can take to serialize. Defaults to the
+    # SERIALIZATION_BUDGET setting. None: no limit.
+    serialization_budget = None
+
+    continue_query_param = 'continue_from'
+
+    # Number of threads the method fields' methods (and the nested
+    # serializers of a single object) are run on concurrently. None: not
+    # concurrent.
+    method_threads = None
+
+    columnar_formats = ('npz',)
+
+    # Number of rows read from the values_list() cursor at a time when
+    # building columns.
+    columnar_chunk_size = 2000
+
+    # Django internal field type -> array.array typecode
+    columnar_typecodes = {
+        'AutoField': 'l',
+        'BigIntegerField': 'l',
+        'IntegerField': 'l',
+        'PositiveIntegerField': 'l',
+        'PositiveSmallIntegerField': 'l',
+        'SmallIntegerField': 'l',
+        'BooleanField': 'B',
+        'FloatField': 'd',
+    }
+
+    def get_cereal_fields(self):
+        '''Returns the CerealFields tree for this request (parsed once per
+        request, and shared with the serializer).
+        '''
+        return self.get_serializer_class().get_request_cereal_fields(
+            self.request
+        )
+
+    def get_serializer(self, *args, **kwargs):
+        fields_parameter = self.request.query_params.get('fields', None)
+        if not self.pool_serializers or not fields_parameter or \
+                'data' in kwargs or set(kwargs) - set(['many']) or \
+                not is_poolable(self.get_serializer_class()):
+            return super(CerealViewMixin, self).get_serializer(*args, **kwargs)
+
+        key = (self.get_serializer_class(), kwargs.get('many', False),
+               fields_parameter)
+        instance = args[0] if args else None
+        serializer = get_serializer_pool().acquire(key)
+        if serializer is None:
+            serializer = super(CerealViewMixin, self).get_serializer(
+                *args, **kwargs
+            )
+        else:
+            reset_serializer(serializer, instance,
+                             self.get_serializer_context())
+        if not hasattr(self.request, '_cereal_pooled_serializers'):
+            self.request._cereal_pooled_serializers = []
+        self.request._cereal_pooled_serializers.append((key, serializer))
+        return serializer
+
+    def release_serializers(self, request):
+        pool = get_serializer_pool()
+        for key, serializer in request._cereal_pooled_serializers:
+            pool.release(key, reset_serializer(serializer, None, {}))
+        request._cereal_pooled_serializers = []
+
+    def get_serializer_context(self):
+        context = super(CerealViewMixin, self).get_serializer_context()
+        if self.method_threads:
+            context['cereal_thread_pool'] = get_thread_pool(
+                'methods', self.method_threads
+            )
+        loader = self.get_batch_loader()
+        if loader is not None:
+            context['cereal_loader'] = loader
+        deadline = self.get_deadline()
+        if deadline is not None:
+            context['cereal_deadline'] = deadline
+        return context
+
+    def get_serialization_budget(self):
+        if self.serialization_budget is not None:
+            return self.serialization_budget
+        return cereal_settings.SERIALIZATION_BUDGET
+
+    def get_deadline(self):
+        '''Returns the Deadline of the request's serialization (None without
+        a budget), starting the first time it's needed.
+        '''
+        budget = self.get_serialization_budget()
+        if budget is None:
+            return None
+        deadline = getattr(self.request, '_cereal_deadline', None)
+        if deadline is None:
+            deadline = self.request._cereal_deadline = Deadline(budget)
+        return deadline
+
+    def get_write_serializer(self, *args, **kwargs):
+        '''Returns the serializer validating and saving the objects of a
+        write (see CerealMixin.use_write_fields).
+        '''
+        context = self.get_serializer_context()
+        context['cereal_write'] = True
+        if 'cereal_loader' not in context:
+            # the related objects of a list are loaded together
+            context['cereal_loader'] = BatchLoader()
+        kwargs['context'] = context
+        return self.get_serializer_class()(*args, **kwargs)
+
+    def get_write_response(self, instances, many, status_code=None):
+        '''Serializes the saved objects for the fields parameter, running
+        the query plan on them.
+        '''
+        self.get_query_plan().prefetch(instances if many else [instances],
+                                       loader=self.get_batch_loader())
+        serializer = self.get_serializer(instances, many=many)
+        return Response(serializer.data, status=status_code)
+
+    def get_bulk_objects(self, data):
+        '''Returns the objects updated by the items of a bulk update, in
+        their order.
+        '''
+        queryset = self.filter_queryset(self.get_queryset())
+        pk_field = queryset.model._meta.pk
+        if not isinstance(data, list):
+            raise CerealException("Bulk updates must be a list of objects.")
+        pks = []
+        for item in data:
+            try:
+                pks.append(pk_field.to_python(item[pk_field.name]))
+            except (DjangoValidationError, KeyError, TypeError):
+                raise CerealException(
+                    "Each object of a bulk update must have a valid "
+                    "{0}.".format(pk_field.name)
+                )
+        if len(set(pks)) != len(pks):
+            raise CerealException(
+                "Objects can't be updated twice in a bulk update."
+            )
+        objects = queryset.in_bulk(pks)
+        missing = [pk for pk in pks if pk not in objects]
+        if missing:
+            raise CerealException(
+                "Objects {0} don't exist.".format(
+                    ', '.join(str(pk) for pk in missing)
+                )
+            )
+        for obj in objects.values():
+            self.check_object_permissions(self.request, obj)
+        return [objects[pk] for pk in pks]
+
+    def get_batch_loader(self):
+        '''Returns the BatchLoader of the request (None without
+        batch_loading).
+        '''
+        if not self.batch_loading:
+            return None
+        loader = getattr(self.request, '_cereal_loader', None)
+        if loader is None:
+            loader = self.request._cereal_loader = BatchLoader(
+                using=self.get_read_database()
+            )
+        return loader
+
+    def get_read_database(self):
+        '''Returns the alias of the database the request reads from, chosen
+        once per request (None: the default routing).
+        '''
+        if hasattr(self.request, '_cereal_read_database'):
+            return self.request._cereal_read_database[0]
+        balancer = get_replica_balancer()
+        if balancer is None or not self.read_replicas or \
+                self.request.method not in SAFE_METHODS or \
+                reads_from_primary(self.request):
+            self.request._cereal_read_database = (None, 0)
+            return None
+        cost = self.get_cost()
+        alias = balancer.acquire(cost)
+        self.request._cereal_read_database = (alias, cost)
+        return alias
+
+    def release_read_database(self, request):
+        alias, cost = getattr(request, '_cereal_read_database', (None, 0))
+        if alias is not None:
+            get_replica_balancer().release(alias, cost)
+            request._cereal_read_database = (None, 0)
+
+    def get_query_plan(self):
+        serializer_class = self.get_serializer_class()
+        compiled = serializer_class.get_compiled_fields(
+            self.request.query_params.get('fields', None)
+        )
+        if compiled is None:
+            plan = plan_query(serializer_class, self.get_cereal_fields())
+        else:
+            # precompiled: no planning
+            plan = compiled.plan
+        # the fields parameter can be recorded for the warm-up
+        self.request._cereal_planned = True
+        return plan
+
+    def get_prefetch_threads(self):
+        if self.prefetch_threads is not None:
+            return self.prefetch_threads
+        return cereal_settings.PREFETCH_THREADS
+
+    def get_queryset(self):
+        queryset = super(CerealViewMixin, self).get_queryset()
+        if self.request.method not in SAFE_METHODS:
+            # writes plan the response on the saved objects
+            return queryset
+        alias = self.get_read_database()
+        if alias is not None:
+            # the prefetches read from the objects' database
+            queryset = queryset.using(alias)
+        return self.get_query_plan().apply(
+            queryset, prefetch_threads=self.get_prefetch_threads(),
+            loader=self.get_batch_loader()
+        )
+
+    def is_list_request(self):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        return lookup_url_kwarg not in self.kwargs
+
+    def get_cost_rows(self):
+        '''The number of objects a request is estimated to serialize.
+        '''
+        if not self.is_list_request():
+            return 1
+        page_size = getattr(self.paginator, 'page_size', None)
+        return page_size or cereal_settings.COST_DEFAULT_CARDINALITY
+
+    def get_cost(self):
+        '''Returns the estimated cost of the request (computed once per
+        request).
+        '''
+        cost = getattr(self.request, '_cereal_cost', None)
+        if cost is None:
+            cost = estimate_cost(self.get_serializer_class(),
+                                 self.get_cereal_fields(),
+                                 self.get_cost_rows())
+            self.request._cereal_cost = cost
+        return cost
+
+    def get_max_cost(self):
+        if self.max_cost is not None:
+            return self.max_cost
+        return cereal_settings.MAX_COST
+
+    def check_fields(self, request):
+        cereal_fields = self.get_cereal_fields()
+        if cereal_fields is not None:
+            serializer_graph.validate(self.get_serializer_class(),
+                                      cereal_fields)
+
+    def check_cost(self, request):
+        max_cost = self.get_max_cost()
+        if max_cost is not None and self.get_cost() > max_cost:
+            raise CerealException(
+                "Fields parameter is too expensive: its estimated cost {0} "
+                "is above {1}.".format(self.get_cost(), max_cost)
+            )
+
+    def check_throttles(self, request):
+        # Rejected requests shouldn't use up throttles.
+        self.check_fields(request)
+        self.check_cost(request)
+        super(CerealViewMixin, self).check_throttles(request)
+
+    def is_cost_request(self):
+        cereal_fields = self.get_cereal_fields()
+        return cereal_fields is not None and 'cost' in cereal_fields.options
+
+    def is_explain_request(self):
+        cereal_fields = self.get_cereal_fields()
+        return cereal_fields is not None and 'explain' in cereal_fields.options
+
+    def get_explain_response(self):
+        # planned again: compiled fields don't keep the strategies
+        plan = plan_query(self.get_serializer_class(),
+                          self.get_cereal_fields())
+        return Response({'explain': plan.explain()})
+
+    def is_partial_request(self):
+        cereal_fields = self.get_cereal_fields()
+        return cereal_fields is not None and 'partial' in cereal_fields.options
+
+    def get_continue_from(self):
+        value = self.request.query_params.get(self.continue_query_param, 0)
+        try:
+            continue_from = int(value)
+        except ValueError:
+            continue_from = -1
+        if continue_from < 0:
+            raise CerealException(
+                "{0} must be an integer of 0 or more.".format(
+                    self.continue_query_param
+                )
+            )
+        return continue_from
+
+    def get_partial_response(self):
+        '''Lists the objects from the continue_from parameter on, until the
+        deadline.
+        '''
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        continue_from = self.get_continue_from()
+        serializer = self.get_serializer(
+            (queryset if page is None else page)[continue_from:], many=True
+        )
+        results = serializer.data
+        timed_out = getattr(serializer, 'timed_out', False)
+        marker = [
+            ('partial', timed_out),
+            ('continue_from',
+             continue_from + len(results) if timed_out else None),
+        ]
+        if page is not None:
+            response = self.get_paginated_response(results)
+            response.data.update(marker)
+            return response
+        return Response(OrderedDict([('results', results)] + marker))
+
+    def is_columnar_request(self):
+        renderer = getattr(self.request, 'accepted_renderer', None)
+        return getattr(renderer, 'format', None) in self.columnar_formats
+
+    def get_column_sources(self):
+        '''Returns an OrderedDict of {field name: (column, typecode)} for a
+        columnar request, where column is the model field's column name for
+        values_list() and typecode is the array.array typecode. Only top level
+        fields whose source is a numeric or boolean model field (or a foreign
+        key to one) are allowed.
+        '''
+        cereal_fields = self.get_cereal_fields()
+        if cereal_fields is None or not cereal_fields.normal_fields or \
+                cereal_fields.nested_fields:
+            raise CerealException(
+                "Columnar responses require a fields parameter with only "
+                "scalar (non-nested) fields."
+            )
+
+        # Building the serializer's fields validates the field names.
+        serializer_fields = self.get_serializer().fields
+        model = self.get_queryset().model
+        sources = OrderedDict()
+        for field_name in cereal_fields.normal_fields:
+            try:
+                model_field = model._meta.get_field(
+                    serializer_fields[field_name].source
+                )
+            except FieldDoesNotExist:
+                model_field = None
+            internal_type = None
+            if model_field is not None:
+                internal_type = model_field.get_internal_type()
+                if internal_type == 'ForeignKey':
+                    # exported as the related primary keys
+                    internal_type = \
+                        model_field.target_field.get_internal_type()
+            if internal_type not in self.columnar_typecodes:
+                raise CerealException(
+                    "Field {0} can't be exported as a column."
+                    .format(field_name)
+                )
+            sources[field_name] = (model_field.attname,
+                                   self.columnar_typecodes[internal_type])
+        return sources
+
+    def get_columns(self, queryset):
+        '''Reads the requested columns from the queryset with values_list(),
+        chunk by chunk, into typed arrays.
+
+        :return: OrderedDict of {field name: array.array}
+        '''
+        sources = self.get_column_sources()
+        columns = OrderedDict(
+            (field_name, array.array(typecode))
+            for field_name, (_, typecode) in sources.items()
+        )
+        rows = queryset.values_list(
+            *[column for column, _ in sources.values()]
+        ).iterator()
+        while True:
+            chunk = list(islice(rows, self.columnar_chunk_size))
+            if not chunk:
+                break
+            for (field_name, column), values in zip(columns.items(),
+                                                    zip(*chunk)):
+                if None in values:
+                    raise CerealException(
+                        "Field {0} has null values and can't be exported as "
+                        "a column.".format(field_name)
+                    )
+                column.extend(values)
+        return columns
+
+    def get_database_json_response(self, queryset):
+        '''Returns a DatabaseJSONResponse for the objects of the queryset,
+        or None if they can't be serialized by the database.
+        '''
+        renderer = getattr(self.request, 'accepted_renderer', None)
+        if getattr(renderer, 'format', None) != 'json':
+            return None
+        serializer = self.get_serializer(many=True)
+        # custom list serializers (Meta.list_serializer_class) represent the
+        # list themselves
+        if not isinstance(serializer, CerealListSerializer) or \
+                serializer.is_compact():
+            return None
+        try:
+            rows = get_json_rows(serializer.child, queryset)
+        except DatabaseJSONUnsupported:
+            return None
+        return DatabaseJSONResponse(rows)
+
+    def retrieve(self, request, *args, **kwargs):
+        if self.is_cost_request():
+            return Response({'cost': self.get_cost()})
+        if self.is_explain_request():
+            return self.get_explain_response()
+        return super(CerealViewMixin, self).retrieve(request, *args, **kwargs)
+
+    def list(self, request, *args, **kwargs):
+        if self.is_cost_request():
+            return Response({'cost': self.get_cost()})
+        if self.is_explain_request():
+            return self.get_explain_response()
+        if self.is_partial_request() and not self.is_columnar_request():
+            return self.get_partial_response()
+        if self.database_json and not self.is_columnar_request():
+            queryset = self.filter_queryset(self.get_queryset())
+            page = self.paginate_queryset(queryset)
+            if page is not None:
+                serializer = self.get_serializer(page, many=True)
+                return self.get_paginated_response(serializer.data)
+            response = self.get_database_json_response(queryset)
+            if response is not None:
+                return response
+        if not self.is_columnar_request():
+            return super(CerealViewMixin, self).list(request, *args, **kwargs)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        return Response(self.get_columns(queryset))
+
+    def create(self, request, *args, **kwargs):
+        many = isinstance(request.data, list)
+        serializer = self.get_write_serializer(data=request.data, many=many)
+        serializer.is_valid(raise_exception=True)
+        self.perform_create(serializer)
+        response = self.get_write_response(serializer.instance, many,
+                                           status.HTTP_201_CREATED)
+        if not many:
+            for header, value in self.get_success_headers(
+                    response.data).items():
+                response[header] = value
+        return response
+
+    def update(self, request, *args, **kwargs):
+        partial = kwargs.pop('partial', False)
+        many = self.is_list_request()
+        if many:
+            instance = self.get_bulk_objects(request.data)
+        else:
+            instance = self.get_object()
+        serializer = self.get_write_serializer(instance, data=request.data,
+                                               many=many, partial=partial)
+        serializer.is_valid(raise_exception=True)
+        self.perform_update(serializer)
+        return self.get_write_response(serializer.instance, many)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super(CerealViewMixin, self).finalize_response(
+            request, response, *args, **kwargs
+        )
+        self.release_read_database(request)
+        for throttle in getattr(request, '_cereal_measured_throttles', ()):
+            throttle.charge_measured(response)
+        if getattr(request, '_cereal_pooled_serializers', None):
+            # the serializers are used until the response is rendered
+            response.add_post_render_callback(
+                lambda rendered: self.release_serializers(request)
+            )
+        fields_parameter = request.query_params.get('fields', None)
+        if fields_parameter and response.status_code < 400 and \
+                getattr(request, '_cereal_planned', False):
+            record_request(self, self.get_cereal_fields(), fields_parameter)
+        return response
+
+    def handle_exception(self, exc):
+        # Errors can't be rendered as columns.
+        if self.is_columnar_request():
+            self.request.accepted_renderer = JSONRenderer()
+            self.request.accepted_media_type = JSONRenderer.media_type
+        return super(CerealViewMixin, self).handle_exception(exc)
+
+
+class PersistedFieldsView(APIView):
+    '''Registers a fields string and returns its hash, to be used as
+    'fields=#<hash>' on CerealMixin endpoints:
+
+    POST {"fields": "id,field1,teams(id,captain(id,field3))"}
+    -> 201 {"hash": "9f2c..."}
+
+    The fields are kept in the PersistedFieldsStore. Each process parses,
+    validates and plans them against a serializer once, the first time they
+    are used with it.
+
+    Registering takes an authenticated user, throttled at the
+    PERSISTED_FIELDS_RATE.
+    '''
+
+    permission_classes = (IsAuthenticated,)
+    throttle_classes = (PersistedFieldsThrottle,)
+
+    def post(self, request, *args, **kwargs):
+        fields_parameter = request.data.get('fields', None)
+        if not fields_parameter or \
+                not isinstance(fields_parameter, six.string_types):
+            raise CerealException("'fields' must be defined.")
+        cereal_fields = CerealMixin.parse_fields_to_nested_tree(
+            fields_parameter
+        )
+        fields_hash = PersistedFieldsStore().add(cereal_fields,
+                                                 fields_parameter)
+        return Response({'hash': fields_hash}, status=status.HTTP_201_CREATED)
+
+
+class CerealBatchView(APIView):
+    '''Runs many read subrequests against CerealViewMixin views in one
+    request, for pages needing several objects of several resources:
+
+    POST [{"resource": "player", "ids": [1, 2], "fields": "id,team(name)"},
+          {"resource": "team", "ids": [3], "fields": "id,players(id)"}]
+    -> [[{"id": 1, "team": {...}}, {"id": 2, ...}], [{"id": 3, ...}]]
+
+    resources maps the resource names to the view classes. Each subrequest
+    goes through its view's authentication, permissions and throttles, and
+    the objects are looked up in its view's filtered queryset.
+
+    The subrequests of the same resource with the same fields (in any
+    order) are grouped: their objects are fetched with one pk__in query on
+    the group's query plan, and serialized once. The groups share one
+    BatchLoader (see rest_cereal.loading): the objects of every group are
+    in its identity map, so the prefetches of the next groups don't load
+    them again.
+
+    The results are in the order of the subrequests, and the objects in the
+    order of their ids (null for the ids without objects). Subrequests read
+    from the default database, and don't take options. Each subrequest's
+    view finalizes its part of the results, as it would its own response
+    (measured throttle costs, recorded fields).
+    '''
+
+    # {resource name: CerealViewMixin view class}
+    resources = {}
+
+    max_subrequests = 50
+    # maximum number of ids of a subrequest, and of all the subrequests
+    max_subrequest_ids = 100
+    max_ids = 1000
+
+    def get_subrequests(self, request):
+        '''Validates the subrequests in the request's data.
+
+        :return: list of (resource name, list of ids, fields parameter)
+        '''
+        data = request.data
+        if not isinstance(data, list):
+            raise CerealException("Batch requests must be a list of "
+                                  "subrequests.")
+        if len(data) > self.max_subrequests:
+            raise CerealException(
+                "Batch requests can't have more than {0} subrequests."
+                .format(self.max_subrequests)
+            )
+        subrequests = []
+        for item in data:
+            if not isinstance(item, dict) or \
+                    item.get('resource') not in self.resources:
+                raise CerealException(
+                    "Subrequests must have a resource among: {0}.".format(
+                        ', '.join(sorted(self.resources))
+                    )
+                )
+            ids = item.get('ids')
+            if not isinstance(ids, list):
+                raise CerealException("Subrequests must have a list of ids.")
+            if len(ids) > self.max_subrequest_ids:
+                raise CerealException(
+                    "Subrequests can't have more than {0} ids."
+                    .format(self.max_subrequest_ids)
+                )
+            fields_parameter = item.get('fields') or ''
+            if not isinstance(fields_parameter, six.string_types):
+                raise CerealException("Subrequest fields must be a string.")
+            subrequests.append((item['resource'], ids, fields_parameter))
+        if sum(len(ids) for _, ids, _ in subrequests) > self.max_ids:
+            raise CerealException(
+                "Batch requests can't have more than {0} ids."
+                .format(self.max_ids)
+            )
+        return subrequests
+
+    def get_subrequest_view(self, request, resource, fields_parameter,
+                            loader):
+        '''Returns the view of the resource, initialized for a list request
+        with the fields parameter, made by the request's user.
+        '''
+        http_request = copy.copy(request._request)
+        http_request.method = 'GET'
+        http_request.GET = QueryDict('', mutable=True)
+        if fields_parameter:
+            http_request.GET['fields'] = fields_parameter
+        view = self.resources[resource]()
+        view.args = ()
+        view.kwargs = {}
+        view.headers = view.default_response_headers
+        # viewsets: a list request
+        view.action_map = {'get': 'list'}
+        view.action = 'list'
+        view.batch_loading = True
+        subrequest = view.initialize_request(http_request)
+        subrequest.user = request.user
+        subrequest.auth = request.auth
+        subrequest._cereal_loader = loader
+        subrequest._cereal_read_database = (None, 0)
+        view.request = subrequest
+        view.initial(subrequest)
+        cereal_fields = view.get_cereal_fields()
+        if cereal_fields is not None and \
+                set(cereal_fields.options) - set(['default']):
+            raise CerealException(
+                "Batch subrequests can't take options (except ':default')."
+            )
+        return view
+
+    def get_group_rows(self, view, ids, loader):
+        '''Serializes the objects of the ids with the view.
+
+        :return: {pk: serialized object}
+        '''
+        queryset = view.filter_queryset(view.get_queryset())
+        pk_field = queryset.model._meta.pk
+        try:
+            pks = set(pk_field.to_python(pk) for pk in ids)
+        except DjangoValidationError:
+            raise CerealException("Subrequest ids must be valid {0}s."
+                                  .format(pk_field.name))
+        objects = list(queryset.filter(pk__in=pks))
+        for obj in objects:
+            view.check_object_permissions(view.request, obj)
+        loader.add(queryset.model, objects)
+        rows = view.get_serializer(objects, many=True).data
+        if getattr(view.request, '_cereal_pooled_serializers', None):
+            view.release_serializers(view.request)
+        return dict((obj.pk, row) for obj, row in zip(objects, rows))
+
+    def finalize_subrequest(self, view, result):
+        '''Finalizes the result of a subrequest with its view (ex: charging
+        its measured cost).
+        '''
+        view.finalize_response(view.request, Response(result))
+
+    def post(self, request, *args, **kwargs):
+        subrequests = self.get_subrequests(request)
+        loader = BatchLoader()
+        # {(resource, canonical fields): (view, ids of the group)}
+        groups = OrderedDict()
+        keys = []
+        views = []
+        for resource, ids, fields_parameter in subrequests:
+            view = self.get_subrequest_view(request, resource,
+                                            fields_parameter, loader)
+            views.append(view)
+            cereal_fields = view.get_cereal_fields()
+            key = (resource, cereal_fields.to_fields_string()
+                   if cereal_fields is not None else None)
+            groups.setdefault(key, (view, []))[1].extend(ids)
+            keys.append(key)
+
+        # {(resource, canonical fields): (pk field, {pk: row})}
+        group_rows = OrderedDict()
+        for key, (view, ids) in groups.items():
+            group_rows[key] = (view.get_queryset().model._meta.pk,
+                               self.get_group_rows(view, ids, loader))
+
+        results = []
+        for key, (_, ids, _) in zip(keys, subrequests):
+            pk_field, rows = group_rows[key]
+            results.append([rows.get(pk_field.to_python(pk)) for pk in ids])
+        for view, result in zip(views, results):
+            self.finalize_subrequest(view, result)
+        return Response(results)
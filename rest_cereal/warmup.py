@@ -0,0 +1,98 @@
+'''Compiles known fields parameters when the app is ready, so the first
+requests passing them skip parsing, validation and planning, and find the
+serializer graph and the CerealTemp classes built.
+
+The fields parameters are configured per view, in the WARMUP_FIELDS setting
+and/or in the file at WARMUP_FILE:
+
+REST_CEREAL = {
+    'WARMUP_FIELDS': [
+        ('app.views.PlayerViewSet', 'id,field1,teams(id)'),
+    ],
+    'WARMUP_FILE': '/var/lib/app/cereal_warmup.txt',
+}
+
+Each line of the file is a view's dotted path and a fields parameter,
+separated by whitespace. Blank lines and lines starting with '#' are
+skipped.
+'''
+import logging
+import time
+
+from django.utils.module_loading import import_string
+
+from rest_cereal.graph import serializer_graph
+from rest_cereal.settings import cereal_settings
+
+
+logger = logging.getLogger('rest_cereal')
+logger.addHandler(logging.NullHandler())
+
+
+def read_warmup_file(path):
+    '''Returns the [(view path, fields parameter)] of a warm-up file.
+    Malformed lines are logged and skipped.
+    '''
+    entries = []
+    with open(path, 'rb') as warmup_file:
+        for number, line in enumerate(warmup_file, 1):
+            try:
+                line = line.decode('utf-8').strip()
+            except UnicodeDecodeError:
+                line = None
+            if line is not None and (not line or line.startswith('#')):
+                continue
+            parts = line.split(None, 1) if line is not None else []
+            if len(parts) != 2:
+                logger.warning('Cereal warm-up file %s: line %d skipped.',
+                               path, number)
+                continue
+            entries.append((parts[0], parts[1]))
+    return entries
+
+
+def get_warmup_entries():
+    '''Returns the entries of the WARMUP_FIELDS and of the WARMUP_FILE.
+    Never raises, so the warm-up can't break startup.
+    '''
+    entries = list(cereal_settings.WARMUP_FIELDS)
+    path = cereal_settings.WARMUP_FILE
+    if path:
+        try:
+            entries += read_warmup_file(path)
+        except Exception as error:
+            logger.warning('Cereal warm-up file %s not read: %s', path, error)
+    return entries
+
+
+def warm_up_entry(view_path, fields_parameter):
+    '''Compiles the fields parameter for the serializer class of the view.
+    '''
+    view_class = import_string(view_path)
+    serializer_class = view_class.serializer_class
+    compiled = serializer_class.compile_fields_parameter(fields_parameter)
+    serializer_graph.validate(serializer_class, compiled.cereal_fields)
+    return compiled
+
+
+def warm_up(entries):
+    '''Warms up each (view path, fields parameter) entry, logging the time
+    it took. Entries that fail (ex: fields removed from a serializer since
+    they were listed) are logged and skipped.
+
+    :return: the number of entries warmed up
+    '''
+    warmed_up = 0
+    for view_path, fields_parameter in entries:
+        start = time.time()
+        try:
+            warm_up_entry(view_path, fields_parameter)
+        except Exception as error:
+            logger.warning('Cereal warm-up of %s fields=%s failed: %s',
+                           view_path, fields_parameter, error)
+            continue
+        warmed_up += 1
+        logger.info('Cereal warm-up of %s fields=%s took %.2f ms',
+                    view_path, fields_parameter,
+                    (time.time() - start) * 1000)
+    return warmed_up
@@ -0,0 +1,174 @@
+'''Creates and updates objects through CerealMixin serializers (see
+CerealViewMixin.create and update).
+
+Writes validate and save the serializer's own fields, whatever the fields
+parameter: nested serializers reading a forward relation are written as
+its primary keys, the other nested serializers are read only. The fields
+parameter only shapes the response, which is serialized from the saved
+objects.
+
+Lists of objects are written in bulk:
+
+- created with one bulk_create when the database returns the primary keys
+  of the rows it inserts (can_return_ids_from_bulk_insert). Otherwise, or
+  when many to many fields are written, the objects are created one by one,
+  in a transaction.
+- updated with one UPDATE, setting each column with a CASE on the primary
+  key. Objects writing many to many fields are saved one by one, in a
+  transaction.
+
+Bulk writes don't call Model.save, nor send the pre_save and post_save
+signals. Serializers overriding create or update are always saved one by
+one.
+
+The related objects of the primary key fields are loaded through the
+BatchLoader in the context (see rest_cereal.loading), with one query per
+related model for the whole list.
+'''
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import connections, router, transaction
+from django.db.models import Case, F, Value, When
+from rest_framework.relations import ManyRelatedField, \
+    PrimaryKeyRelatedField
+from rest_framework.serializers import ModelSerializer
+from rest_framework.utils import model_meta
+
+
+class LoadedPrimaryKeyRelatedField(PrimaryKeyRelatedField):
+    '''PrimaryKeyRelatedField loading its object through the BatchLoader in
+    the context, if any (see want_related_objects).
+    '''
+
+    def to_internal_value(self, data):
+        loader = self.context.get('cereal_loader')
+        if loader is None:
+            return super(LoadedPrimaryKeyRelatedField, self) \
+                .to_internal_value(data)
+        queryset = self.get_queryset()
+        try:
+            pk = queryset.model._meta.pk.to_python(data)
+        except DjangoValidationError:
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        instance = loader.get(queryset.model, pk, queryset)
+        if instance is None:
+            self.fail('does_not_exist', pk_value=data)
+        return instance
+
+
+def want_related_objects(serializer, data, loader):
+    '''Queues the primary keys of the LoadedPrimaryKeyRelatedFields of the
+    items of data in the loader, so they're loaded together.
+
+    :param serializer: the (non-list) serializer validating the items
+    :param data: list of the items' input data
+    '''
+    for field in serializer.fields.values():
+        if field.read_only:
+            continue
+        many = isinstance(field, ManyRelatedField)
+        relation_field = field.child_relation if many else field
+        if not isinstance(relation_field, LoadedPrimaryKeyRelatedField):
+            continue
+        queryset = relation_field.get_queryset()
+        pks = []
+        for item in data:
+            if not isinstance(item, dict) or field.field_name not in item:
+                continue
+            values = item[field.field_name]
+            if not many or not isinstance(values, list):
+                values = [values]
+            for value in values:
+                try:
+                    pks.append(queryset.model._meta.pk.to_python(value))
+                except DjangoValidationError:
+                    # reported by the validation
+                    pass
+        loader.want(queryset.model, pks, queryset)
+
+
+def _is_default_method(serializer, method):
+    function = getattr(type(serializer), method)
+    default_function = getattr(ModelSerializer, method)
+    return getattr(function, '__func__', function) is \
+        getattr(default_function, '__func__', default_function)
+
+
+def _writes_to_many(model, validated_data):
+    info = model_meta.get_field_info(model)
+    return any(relation_info.to_many and field_name in attrs
+               for field_name, relation_info in info.relations.items()
+               for attrs in validated_data)
+
+
+def is_bulk_writable(serializer, method, validated_data):
+    '''Whether the objects of the validated data can be written with one
+    query, instead of the serializer's method (create or update).
+    '''
+    model = serializer.Meta.model
+    return _is_default_method(serializer, method) and \
+        not model._meta.parents and \
+        not _writes_to_many(model, validated_data)
+
+
+def create_objects(serializer, validated_data):
+    '''Creates the objects of the validated data of a list.
+
+    :param serializer: the (non-list) serializer of the objects
+    :return: list of the created objects
+    '''
+    model = serializer.Meta.model
+    using = router.db_for_write(model)
+    features = connections[using].features
+    if getattr(features, 'can_return_ids_from_bulk_insert', False) and \
+            is_bulk_writable(serializer, 'create', validated_data):
+        instances = [model(**attrs) for attrs in validated_data]
+        model._default_manager.db_manager(using).bulk_create(instances)
+        return instances
+    with transaction.atomic(using=using):
+        return [serializer.create(attrs) for attrs in validated_data]
+
+
+def update_objects(serializer, instances, validated_data):
+    '''Updates the instances with the validated data of a list (in the same
+    order).
+
+    :param serializer: the (non-list) serializer of the objects
+    :return: list of the updated instances
+    '''
+    model = serializer.Meta.model
+    using = router.db_for_write(model)
+    if not is_bulk_writable(serializer, 'update', validated_data):
+        with transaction.atomic(using=using):
+            return [serializer.update(instance, attrs)
+                    for instance, attrs in zip(instances, validated_data)]
+
+    for instance, attrs in zip(instances, validated_data):
+        for attr, value in attrs.items():
+            setattr(instance, attr, value)
+    # {model field: instances setting it}
+    updated = {}
+    for model_field in model._meta.concrete_fields:
+        if getattr(model_field, 'auto_now', False):
+            updated[model_field] = instances
+        else:
+            updated[model_field] = [
+                instance
+                for instance, attrs in zip(instances, validated_data)
+                if model_field.name in attrs
+            ]
+    connection = connections[using]
+    updates = {}
+    for model_field, field_instances in updated.items():
+        if not field_instances:
+            continue
+        updates[model_field.name] = Case(
+            *[When(pk=instance.pk, then=Value(model_field.get_db_prep_save(
+                model_field.pre_save(instance, False), connection
+            ))) for instance in field_instances],
+            default=F(model_field.name), output_field=model_field
+        )
+    if updates:
+        model._default_manager.db_manager(using).filter(
+            pk__in=[instance.pk for instance in instances]
+        ).update(**updates)
+    return instances
@@ -4,7 +4,11 @@ setup(
     name='djangorestcereal',
     version='1.0',
     description='Response-controlling parameters for Django Rest Framework.',
-    packages=['rest_cereal'],
+    packages=[
+        'rest_cereal',
+        'rest_cereal.management',
+        'rest_cereal.management.commands'
+    ],
     install_requires=[
       'django',
       'djangorestframework==3.2.4'
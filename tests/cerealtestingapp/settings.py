@@ -38,6 +38,7 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'rest_framework',
+    'rest_cereal',
     'cerealtestingapp'
 ]
 
@@ -50,6 +51,7 @@ MIDDLEWARE_CLASSES = [
     'django.contrib.auth.middleware.SessionAuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'rest_cereal.routing.ReadPrimaryMiddleware',
 ]
 
 ROOT_URLCONF = 'cerealtestingapp.urls'
@@ -80,9 +82,24 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
-    }
+        # A file, so the threads running serializer tasks share the test
+        # database (in-memory databases aren't shared on Python 2).
+        'TEST': {
+            'NAME': os.path.join(BASE_DIR, 'test_db.sqlite3'),
+        },
+    },
+    # Not a replica of default, so the tests can tell where the reads went.
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, 'replica_db.sqlite3'),
+        'TEST': {
+            'NAME': os.path.join(BASE_DIR, 'test_replica_db.sqlite3'),
+        },
+    },
 }
 
+DATABASE_ROUTERS = ['rest_cereal.routing.CerealReplicaRouter']
+
 
 # Password validation
 # https://docs.djangoproject.com/en/1.9/ref/settings/#auth-password-validators
@@ -0,0 +1,156 @@
+import json
+import unittest
+
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.permissions import BasePermission
+from rest_framework.serializers import ModelSerializer
+from rest_framework.test import APIRequestFactory
+from rest_framework.viewsets import ModelViewSet
+
+from rest_cereal.mixins import CerealMixin
+from rest_cereal.serializers import LazySerializer
+from rest_cereal.views import CerealBatchView, CerealViewMixin
+
+from cerealtestingapp.models import NestedTestModel, TwoNestedTestModel
+from test_throttling import Clock, TestMeasuredCostThrottle
+
+
+class BatchNestTestSerializer(CerealMixin, ModelSerializer):
+    twonestedparent1 = LazySerializer('BatchTwoTestSerializer', many=True)
+
+    class Meta:
+        model = NestedTestModel
+        fields = ('id', 'val')
+
+
+class BatchTwoTestSerializer(CerealMixin, ModelSerializer):
+    nest2 = BatchNestTestSerializer()
+
+    class Meta:
+        model = TwoNestedTestModel
+        fields = ('id', 'val')
+
+
+class BatchNestTestView(CerealViewMixin, ModelViewSet):
+    model = NestedTestModel
+    serializer_class = BatchNestTestSerializer
+    queryset = NestedTestModel.objects.filter(val__gte=1400, val__lt=1500)
+
+
+class HideOddPermission(BasePermission):
+
+    def has_object_permission(self, request, view, obj):
+        return obj.val % 2 == 0
+
+
+class BatchTwoTestView(CerealViewMixin, ModelViewSet):
+    model = TwoNestedTestModel
+    serializer_class = BatchTwoTestSerializer
+    queryset = TwoNestedTestModel.objects.filter(val__gte=1400)
+    permission_classes = (HideOddPermission,)
+
+
+class MeasuredBatchNestTestView(BatchNestTestView):
+    throttle_classes = (TestMeasuredCostThrottle,)
+
+
+class BatchTestView(CerealBatchView):
+    resources = {'nest': BatchNestTestView, 'two': BatchTwoTestView,
+                 'measured': MeasuredBatchNestTestView}
+    max_subrequests = 5
+    max_subrequest_ids = 3
+    max_ids = 5
+
+
+class CerealBatchViewTest(unittest.TestCase):
+    '''Test running subrequests through a CerealBatchView.
+    '''
+
+    request_factory = APIRequestFactory()
+
+    def setUp(self):
+        TwoNestedTestModel.objects.filter(val__gte=1400).delete()
+        NestedTestModel.objects.filter(val__gte=1400, val__lt=1600).delete()
+        self.nests = [NestedTestModel.objects.create(val=val)
+                      for val in (1400, 1401, 1402)]
+        # out of the nest view's queryset
+        self.hidden = NestedTestModel.objects.create(val=1500)
+        self.twos = [
+            TwoNestedTestModel.objects.create(val=1400, nest1=self.nests[2],
+                                              nest2=self.nests[0]),
+            TwoNestedTestModel.objects.create(val=1401, nest1=self.nests[2],
+                                              nest2=self.nests[1]),
+        ]
+
+    def _post(self, subrequests):
+        request = self.request_factory.post('/batch/', subrequests,
+                                            format='json')
+        with CaptureQueriesContext(connection) as queries:
+            response = BatchTestView.as_view()(request)
+            response.render()
+        return response, json.loads(response.content.decode('utf-8')), \
+            len(queries)
+
+    def test_grouped_subrequests(self):
+        nests = [nest.pk for nest in self.nests]
+        response, data, queries = self._post([
+            {'resource': 'nest', 'ids': [nests[1], nests[0], self.hidden.pk],
+             'fields': 'id,val'},
+            {'resource': 'nest', 'ids': [nests[2]],
+             'fields': 'twonestedparent1(val,nest2(val))'},
+            {'resource': 'nest', 'ids': [nests[0]], 'fields': 'val,id'},
+        ])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data, [
+            [{'id': nests[1], 'val': 1401}, {'id': nests[0], 'val': 1400},
+             None],
+            [{'twonestedparent1': [
+                {'val': 1400, 'nest2': {'val': 1400}},
+                {'val': 1401, 'nest2': {'val': 1401}},
+            ]}],
+            [{'id': nests[0], 'val': 1400}],
+        ])
+        # the first and last subrequests are one group. The second group
+        # finds the nest2 objects in the identity map: its objects and
+        # twonestedparent1
+        self.assertEqual(queries, 1 + 2)
+
+    def test_object_permissions(self):
+        response, data, _ = self._post([
+            {'resource': 'two', 'ids': [self.twos[0].pk], 'fields': 'val'},
+        ])
+        self.assertEqual(data, [[{'val': 1400}]])
+        response, _, _ = self._post([
+            {'resource': 'two', 'ids': [self.twos[1].pk], 'fields': 'val'},
+        ])
+        self.assertEqual(response.status_code, 403)
+
+    def test_invalid_subrequests(self):
+        for subrequests in (
+                {'resource': 'nest', 'ids': []},
+                [{'resource': 'other', 'ids': []}],
+                [{'resource': 'nest', 'ids': 1}],
+                [{'resource': 'nest', 'ids': ['a'], 'fields': 'val'}],
+                [{'resource': 'nest', 'ids': [], 'fields': 'missing'}],
+                [{'resource': 'nest', 'ids': [], 'fields': 'val,:compact'}],
+                [{'resource': 'nest', 'ids': []}] * 6,
+                [{'resource': 'nest', 'ids': [1, 2, 3, 4]}],
+                [{'resource': 'nest', 'ids': [1, 2, 3]}] * 2):
+            response, _, _ = self._post(subrequests)
+            self.assertEqual(response.status_code, 400)
+
+    def test_subrequests_finalized(self):
+        cache.delete('throttle_cereal_cost_127.0.0.1')
+        Clock.now = 1000.0
+        response, data, _ = self._post([
+            {'resource': 'measured', 'ids': [self.nests[0].pk],
+             'fields': 'val'},
+            {'resource': 'measured', 'ids': [self.nests[1].pk],
+             'fields': 'val'},
+        ])
+        self.assertEqual(data, [[{'val': 1400}], [{'val': 1401}]])
+        # each subrequest is charged 10, measured 1
+        self.assertEqual(cache.get('throttle_cereal_cost_127.0.0.1'),
+                         (23, 1000.0))
@@ -0,0 +1,79 @@
+import json
+import unittest
+import uuid
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.utils.six import StringIO
+
+from rest_cereal.management.commands.cereal_export import split_pk_range
+
+from cerealtestingapp.models import NestedTestModel
+
+
+class CerealExportCommandTest(unittest.TestCase):
+    '''Test the cereal_export management command.
+    '''
+
+    serializer = 'test_cerealmixin.BaseTestSerializer'
+
+    def setUp(self):
+        NestedTestModel.objects.filter(val__gte=400).delete()
+        self.model1 = NestedTestModel.objects.create(val=400)
+        self.model2 = NestedTestModel.objects.create(nest=self.model1, val=401)
+        self.model3 = NestedTestModel.objects.create(nest=self.model2, val=402)
+
+    def _export(self, fields, serializer=None, **options):
+        stdout = StringIO()
+        call_command(
+            'cereal_export', serializer or self.serializer, fields=fields,
+            filters=['val__gte=400'], stdout=stdout, **options
+        )
+        return stdout.getvalue()
+
+    def test_ndjson(self):
+        output = self._export('val,nest(val)', chunk_size=2)
+        self.assertEqual(
+            [json.loads(line) for line in output.splitlines()],
+            [{'val': 400, 'nest': None},
+             {'val': 401, 'nest': {'val': 400}},
+             {'val': 402, 'nest': {'val': 401}}]
+        )
+
+    def test_csv(self):
+        output = self._export('val,nest(val)', format='csv')
+        self.assertEqual(
+            output.splitlines(),
+            ['val,nest.val', '400,', '401,400', '402,401']
+        )
+
+    def test_presets(self):
+        output = self._export('@detail', serializer=(
+            'test_cerealmixin.PresetTestSerializer'
+        ))
+        self.assertEqual(json.loads(output.splitlines()[1]),
+                         {'val': 401, 'nest': {'val': 400,
+                                               'id': self.model1.pk}})
+
+    def test_bad_fields(self):
+        for fields in ('val(', 'unknown', '@missing'):
+            self.assertRaises(CommandError, self._export, fields)
+
+    def test_processes(self):
+        output = self._export('val,nest(val)', processes=2, chunk_size=1)
+        self.assertEqual(
+            [json.loads(line) for line in output.splitlines()],
+            [{'val': 400, 'nest': None},
+             {'val': 401, 'nest': {'val': 400}},
+             {'val': 402, 'nest': {'val': 401}}]
+        )
+        output = self._export('val', processes=3, format='csv')
+        self.assertEqual(output.splitlines(), ['val', '400', '401', '402'])
+
+    def test_split_pk_range(self):
+        self.assertEqual(split_pk_range(1, 10, 3),
+                         [(1, 4), (5, 8), (9, 10)])
+        self.assertEqual(split_pk_range(5, 5, 4), [(5, 5)])
+        self.assertEqual(split_pk_range(None, None, 4), [])
+        self.assertRaises(CommandError, split_pk_range, uuid.uuid4(),
+                          uuid.uuid4(), 2)
@@ -1,12 +1,13 @@
 import unittest
 import json
 
+from django.core.exceptions import ImproperlyConfigured
 from rest_framework.test import APIClient, APIRequestFactory, APITestCase, \
     force_authenticate
 from rest_framework.viewsets import ModelViewSet
 from rest_framework.serializers import ModelSerializer
 
-from rest_cereal.mixins import CerealMixin, CerealException
+from rest_cereal.mixins import CerealMixin, CerealException, FieldsLimits
 from rest_cereal.serializers import LazySerializer, MethodSerializerMixin
 
 from cerealtestingapp.models import NestedTestModel, TwoNestedTestModel, \
@@ -143,6 +144,28 @@ class RecursiveParseFieldsTest(unittest.TestCase):
         except CerealException:
             pass
 
+    def test_parse_fields_to_nested_tree_presets(self):
+        result = CerealMixin.parse_fields_to_nested_tree('val,@a,nest(@b)')
+        assert result.normal_fields == ['val'] and \
+               result.presets == ['a'] and \
+               result.nested_fields['nest'].presets == ['b'], \
+               'Preset field string input returned {0}'.format(result)
+
+    def test_to_fields_string_is_canonical(self):
+        first = CerealMixin.parse_fields_to_nested_tree(
+            'b,a,:x,n(d,c),@p,a'
+        )
+        second = CerealMixin.parse_fields_to_nested_tree('@p,n(c,d),:x,a,b')
+        self.assertEqual(first.to_fields_string(), 'a,b,n(c,d),:x,@p')
+        self.assertEqual(first.to_fields_string(), second.to_fields_string())
+
+    def test_parse_fields_to_nested_tree_empty_preset(self):
+        try:
+            CerealMixin.parse_fields_to_nested_tree('val,@')
+            assert False, 'Expected error - preset without a name. No error.'
+        except CerealException:
+            pass
+
     def test_parse_fields_to_nested_tree_too_few_close_brackets(self):
         fields_string = 'job(value'
         try:
@@ -154,6 +177,54 @@ class RecursiveParseFieldsTest(unittest.TestCase):
             pass
 
 
+class FieldsLimitsTest(unittest.TestCase):
+    '''
+    Test the limits enforced while parsing fields strings
+    '''
+
+    def _parse(self, fields_string, **limits):
+        return CerealMixin.parse_fields_to_nested_tree(
+            fields_string, FieldsLimits(**limits)
+        )
+
+    def test_no_limits(self):
+        result = self._parse('a(b(c)),d,e')
+        self.assertEqual(result.normal_fields, ['d', 'e'])
+
+    def test_max_length(self):
+        self._parse('a,b', max_length=3)
+        self.assertRaises(CerealException, self._parse, 'a,bc', max_length=3)
+
+    def test_max_depth(self):
+        self._parse('a(b(c))', max_depth=2)
+        self.assertRaises(CerealException, self._parse, 'a(b(c(d)))',
+                          max_depth=2)
+
+    def test_max_depth_fails_before_recursing(self):
+        # would exceed the recursion limit without the depth limit
+        self.assertRaises(CerealException, self._parse, 'a(' * 2000,
+                          max_depth=10)
+
+    def test_max_nodes(self):
+        self._parse('a(b,c),d', max_nodes=4)
+        self.assertRaises(CerealException, self._parse, 'a(b,c),d,e',
+                          max_nodes=4)
+        self.assertRaises(CerealException, self._parse, 'a(b,c(d)),e',
+                          max_nodes=4)
+
+    def test_max_fields_per_node(self):
+        self._parse('a,b,c(d,e,f)', max_fields_per_node=3)
+        self.assertRaises(CerealException, self._parse, 'a,b,c(d,e,f,g)',
+                          max_fields_per_node=3)
+        self.assertRaises(CerealException, self._parse, 'a,b,:default,c(d)',
+                          max_fields_per_node=3)
+
+    def test_default_limits_from_settings(self):
+        self.assertRaises(CerealException,
+                          CerealMixin.parse_fields_to_nested_tree,
+                          'a(' * 11 + ')' * 11)
+
+
 class NestLevel2TestSerializer(ModelSerializer):
     class Meta:
         model = NestedTestModel
@@ -630,3 +701,131 @@ class MultipleNestingSerializersTest(unittest.TestCase):
             json.dumps(json.loads(response.content)),
             json.dumps(expected_response)
         )
+
+
+class CompactTestView(ModelViewSet):
+    model = NestedTestModel
+    serializer_class = BaseTestSerializer
+    queryset = NestedTestModel.objects.filter(val__gte=100).order_by('val')
+
+
+class CompactOptionTest(unittest.TestCase):
+    '''Test the ':compact' option on list requests.
+    '''
+
+    request_factory = APIRequestFactory()
+    url = '/nest/'
+
+    def setUp(self):
+        NestedTestModel.objects.filter(val__gte=100).delete()
+        self.model1 = NestedTestModel.objects.create(val=100)
+        self.model2 = NestedTestModel.objects.create(nest=self.model1, val=101)
+
+    def _get_response(self, fields_string):
+        request = self.request_factory.get(self.url, {'fields': fields_string})
+        api_view = CompactTestView.as_view({'get': 'list'})
+        response = api_view(request)
+        response.render()
+        return response
+
+    def test_compact_flat_fields(self):
+        response = self._get_response('val,:compact')
+        self.assertEqual(
+            json.loads(response.content),
+            {'fields': ['val'], 'rows': [[100], [101]]}
+        )
+
+    def test_compact_nested_to_one_flattened(self):
+        response = self._get_response('val,nest(val),:compact')
+        self.assertEqual(
+            json.loads(response.content),
+            {'fields': ['val', 'nest.val'], 'rows': [[100, None], [101, 100]]}
+        )
+
+    def test_not_compact_without_option(self):
+        response = self._get_response('val')
+        self.assertEqual(
+            json.loads(response.content),
+            [{'val': 100}, {'val': 101}]
+        )
+
+
+class PresetTestSerializer(CerealMixin, ModelSerializer):
+    nest = LazySerializer('PresetTestSerializer')
+
+    class Meta:
+        model = NestedTestModel
+        fields = ('id', 'val', 'nest')
+        circular = True
+        cereal_presets = {
+            'summary': 'val',
+            'detail': '@summary,nest(@summary,id)',
+            'loop1': '@loop2',
+            'loop2': 'val,@loop1',
+        }
+
+
+LazySerializer.convert_serializers(globals(), [PresetTestSerializer])
+
+
+class PresetTestView(ModelViewSet):
+    model = NestedTestModel
+    serializer_class = PresetTestSerializer
+    queryset = NestedTestModel.objects.all()
+
+
+class PresetTest(unittest.TestCase):
+    '''Test named presets of fields (Meta.cereal_presets).
+    '''
+
+    request_factory = APIRequestFactory()
+
+    def setUp(self):
+        self.model1 = NestedTestModel.objects.create(val=1)
+        self.model2 = NestedTestModel.objects.create(nest=self.model1, val=2)
+
+    def _get_response(self, fields_string):
+        request = self.request_factory.get('/nest/', {'fields': fields_string})
+        api_view = PresetTestView.as_view({'get': 'retrieve'})
+        response = api_view(request, pk=self.model2.id)
+        response.render()
+        return response
+
+    def test_preset(self):
+        response = self._get_response('@summary')
+        self.assertEqual(json.loads(response.content), {'val': 2})
+
+    def test_composed_preset(self):
+        response = self._get_response('@detail')
+        self.assertEqual(
+            json.loads(response.content),
+            {'val': 2, 'nest': {'id': self.model1.id, 'val': 1}}
+        )
+
+    def test_preset_in_nested_field(self):
+        response = self._get_response('id,nest(@summary)')
+        self.assertEqual(
+            json.loads(response.content),
+            {'id': self.model2.id, 'nest': {'val': 1}}
+        )
+
+    def test_unknown_preset(self):
+        response = self._get_response('nest(@unknown)')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            json.loads(response.content),
+            {'detail': "Preset unknown isn't defined in serializer."}
+        )
+
+    def test_preset_loop(self):
+        self.assertRaises(
+            ImproperlyConfigured,
+            CerealMixin.get_preset, PresetTestSerializer, 'loop1'
+        )
+
+    def test_compiled_preset_is_planned(self):
+        preset = CerealMixin.get_preset(PresetTestSerializer, 'detail')
+        self.assertEqual(preset.plan.select_related, ['nest'])
+        self.assertIs(
+            preset, CerealMixin.get_preset(PresetTestSerializer, 'detail')
+        )
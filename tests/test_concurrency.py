@@ -0,0 +1,143 @@
+import json
+import threading
+import unittest
+
+from django.db import connection
+from rest_framework.serializers import ModelSerializer
+from rest_framework.test import APIRequestFactory
+from rest_framework.viewsets import ModelViewSet
+
+from rest_cereal.concurrency import close_thread_pools, get_thread_pool, \
+    run_concurrently
+from rest_cereal.mixins import CerealMixin, CerealException
+from rest_cereal.views import CerealViewMixin
+
+from cerealtestingapp.models import NestedTestModel, TwoNestedTestModel
+from test_cerealmixin import MethodTestSerializer
+
+
+class ThreadTestSerializer(CerealMixin, ModelSerializer):
+    nest3 = MethodTestSerializer(method_name='get_nest3')
+    nest4 = MethodTestSerializer(method_name='get_nest4')
+
+    threads = set()
+
+    class Meta:
+        model = TwoNestedTestModel
+        fields = ('val', 'nest1', 'nest3', 'nest4')
+
+    def get_nest3(self, obj):
+        self.threads.add(threading.current_thread().name)
+        return [obj.nest1, obj.nest2]
+
+    def get_nest4(self, obj):
+        if obj.val == 799:
+            raise CerealException('Bad nest4.')
+        return obj.nest2
+
+
+class SequentialTestView(CerealViewMixin, ModelViewSet):
+    model = TwoNestedTestModel
+    serializer_class = ThreadTestSerializer
+    queryset = TwoNestedTestModel.objects.filter(val__gte=700) \
+        .order_by('val')
+
+
+class ThreadedTestView(SequentialTestView):
+    method_threads = 3
+
+
+def fail(message):
+    raise CerealException(message)
+
+
+def run_nested(thread_pool, value):
+    return run_concurrently(thread_pool, [(abs, (value,)),
+                                          (abs, (-value,))])
+
+
+def get_connection():
+    NestedTestModel.objects.exists()
+    return connection.connection
+
+
+class ConcurrentMethodFieldsTest(unittest.TestCase):
+    '''Test running the method fields on a thread pool.
+    '''
+
+    request_factory = APIRequestFactory()
+    fields = 'val,nest1,nest3(val),nest4(val,nest)'
+
+    def setUp(self):
+        TwoNestedTestModel.objects.filter(val__gte=700).delete()
+        NestedTestModel.objects.filter(val__gte=700, val__lt=800).delete()
+        nests = [NestedTestModel.objects.create(val=val)
+                 for val in range(700, 710)]
+        self.models = [
+            TwoNestedTestModel.objects.create(val=700 + index,
+                                              nest1=nests[index],
+                                              nest2=nests[index + 1])
+            for index in range(8)
+        ]
+        ThreadTestSerializer.threads.clear()
+
+    def _get_response(self, view_class, fields_string, **kwargs):
+        request = self.request_factory.get('/two/', {'fields': fields_string})
+        action = 'retrieve' if kwargs else 'list'
+        response = view_class.as_view({'get': action})(request, **kwargs)
+        response.render()
+        return response
+
+    def test_list_same_as_sequential(self):
+        sequential = self._get_response(SequentialTestView, self.fields)
+        self.assertEqual(ThreadTestSerializer.threads, set(['MainThread']))
+        ThreadTestSerializer.threads.clear()
+        threaded = self._get_response(ThreadedTestView, self.fields)
+        self.assertNotIn('MainThread', ThreadTestSerializer.threads)
+        self.assertEqual(threaded.content, sequential.content)
+        self.assertEqual(len(json.loads(threaded.content)), 8)
+
+    def test_retrieve_same_as_sequential(self):
+        pk = self.models[3].pk
+        sequential = self._get_response(SequentialTestView, self.fields, pk=pk)
+        threaded = self._get_response(ThreadedTestView, self.fields, pk=pk)
+        self.assertEqual(threaded.content, sequential.content)
+        self.assertEqual(json.loads(threaded.content)['nest3'],
+                         [{'val': 703}, {'val': 704}])
+
+    def test_exception_propagated(self):
+        self.models[0].val = 799
+        self.models[0].save()
+        response = self._get_response(ThreadedTestView, self.fields)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(json.loads(response.content),
+                         {'detail': 'Bad nest4.'})
+
+    def test_run_concurrently_order(self):
+        thread_pool = get_thread_pool('test', 2)
+        self.assertEqual(
+            run_concurrently(thread_pool, [(abs, (-value,))
+                                           for value in range(20)]),
+            list(range(20))
+        )
+        self.assertRaises(CerealException, run_concurrently, thread_pool,
+                          [(abs, (1,)), (fail, ('a',))])
+
+    def test_connections_kept(self):
+        thread_pool = get_thread_pool('test', 1)
+        first, = run_concurrently(thread_pool, [(get_connection, ())])
+        second, = run_concurrently(thread_pool, [(get_connection, ())])
+        self.assertIs(first, second)
+        close_thread_pools()
+        self.assertIsNot(get_thread_pool('test', 1), thread_pool)
+
+    def test_nested_tasks(self):
+        thread_pool = get_thread_pool('test', 1)
+        # the single thread runs the nested tasks itself
+        self.assertEqual(
+            run_concurrently(thread_pool, [(run_nested, (thread_pool, -1)),
+                                           (run_nested, (thread_pool, 2))]),
+            [[1, 1], [2, 2]]
+        )
+        self.assertIsNot(get_thread_pool('methods', 2),
+                         get_thread_pool('prefetch', 2))
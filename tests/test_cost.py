@@ -0,0 +1,68 @@
+import unittest
+
+from rest_cereal.cost import estimate_cost, measure_cost
+from rest_cereal.mixins import CerealMixin
+
+from test_cerealmixin import BaseTestSerializer, CircularTestManySerializer, \
+    TwoNestTestSerializer
+
+
+class CardinalityTestSerializer(CircularTestManySerializer):
+
+    class Meta(CircularTestManySerializer.Meta):
+        cereal_cardinality = {'nests': 3}
+
+
+def cost(serializer_class, fields_string, rows=1):
+    return estimate_cost(
+        serializer_class,
+        CerealMixin.parse_fields_to_nested_tree(fields_string),
+        rows
+    )
+
+
+class EstimateCostTest(unittest.TestCase):
+    '''Test the static cost estimates of fields trees (with the default
+    weights).
+    '''
+
+    def test_fields(self):
+        self.assertEqual(cost(BaseTestSerializer, 'val'), 1)
+        self.assertEqual(cost(BaseTestSerializer, 'val', rows=20), 20)
+
+    def test_nesting_depth(self):
+        # val + nest (1 + depth 1) + val + nest (1 + depth 2) + val
+        self.assertEqual(cost(BaseTestSerializer, 'val,nest(val,nest(val))'),
+                         8)
+
+    def test_default_fields(self):
+        self.assertEqual(estimate_cost(BaseTestSerializer, None), 8)
+        self.assertEqual(cost(BaseTestSerializer, ':default'), 8)
+
+    def test_to_many_default_cardinality(self):
+        self.assertEqual(cost(CircularTestManySerializer, 'nests(val)'),
+                         2 + 10)
+
+    def test_to_many_declared_cardinality(self):
+        self.assertEqual(cost(CardinalityTestSerializer, 'nests(val)'), 2 + 3)
+
+    def test_method_weight(self):
+        self.assertEqual(cost(TwoNestTestSerializer, 'nest3(val)'),
+                         2 + 10 + 10)
+
+
+class MeasureCostTest(unittest.TestCase):
+    '''Test the cost of serialized data, which matches the estimates.
+    '''
+
+    def test_nested_data(self):
+        data = {'val': 1, 'nest': {'val': 2, 'nest': {'val': 3}}}
+        self.assertEqual(measure_cost(data), 8)
+        self.assertEqual(measure_cost(data), cost(BaseTestSerializer,
+                                                  'val,nest(val,nest(val))'))
+
+    def test_lists(self):
+        self.assertEqual(measure_cost([{'val': 1}, {'val': 2}]), 2)
+        self.assertEqual(measure_cost({'results': [{'val': 1}]}), 1)
+        self.assertEqual(measure_cost({'nests': [{'val': 1}, {'val': 2}]}),
+                         2 + 2 * 2)
@@ -0,0 +1,215 @@
+import json
+import unittest
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.serializers import ListSerializer, ModelSerializer
+from rest_framework.test import APIRequestFactory
+from rest_framework.viewsets import ModelViewSet
+
+from rest_cereal.dbjson import DatabaseJSONUnsupported, get_json_rows, \
+    has_json_functions
+from rest_cereal.mixins import CerealMixin
+from rest_cereal.serializers import LazySerializer
+from rest_cereal.views import CerealViewMixin
+
+from cerealtestingapp.models import ManyNestedTestModel, NestedTestModel, \
+    TwoNestedTestModel
+from test_cerealmixin import BaseTestSerializer, CircularTestManySerializer, \
+    TwoNestTestSerializer
+
+
+class JsonNestTestSerializer(CerealMixin, ModelSerializer):
+    nest = LazySerializer('JsonNestTestSerializer')
+    parent = LazySerializer('JsonNestTestSerializer', many=True)
+    twonestedparent1 = LazySerializer('JsonTwoTestSerializer', many=True)
+
+    class Meta:
+        model = NestedTestModel
+        fields = ('id', 'val')
+
+
+class JsonTwoTestSerializer(CerealMixin, ModelSerializer):
+    nest1 = JsonNestTestSerializer()
+    nest2 = JsonNestTestSerializer()
+
+    class Meta:
+        model = TwoNestedTestModel
+        fields = ('id', 'val')
+
+
+class JsonManyPkTestSerializer(ModelSerializer):
+
+    class Meta:
+        model = ManyNestedTestModel
+        fields = ('val', 'nests')
+
+
+class JsonNestTestView(CerealViewMixin, ModelViewSet):
+    model = NestedTestModel
+    serializer_class = JsonNestTestSerializer
+    queryset = NestedTestModel.objects.filter(val__gte=1000, val__lt=1100) \
+        .order_by('-val')
+
+
+class DatabaseJsonNestTestView(JsonNestTestView):
+    database_json = True
+
+
+class RepresentationJsonNestTestSerializer(JsonNestTestSerializer):
+
+    def to_representation(self, instance):
+        data = super(RepresentationJsonNestTestSerializer, self) \
+            .to_representation(instance)
+        data['extra'] = True
+        return data
+
+
+class RepresentationJsonNestTestView(DatabaseJsonNestTestView):
+    serializer_class = RepresentationJsonNestTestSerializer
+
+
+class PlainListJsonNestTestSerializer(JsonNestTestSerializer):
+
+    class Meta(JsonNestTestSerializer.Meta):
+        list_serializer_class = ListSerializer
+
+
+class PlainListJsonNestTestView(DatabaseJsonNestTestView):
+    serializer_class = PlainListJsonNestTestSerializer
+
+
+class DatabaseJsonTest(unittest.TestCase):
+    '''Test building the JSON of list requests in the database, which must
+    match the Python serialization.
+    '''
+
+    request_factory = APIRequestFactory()
+
+    @classmethod
+    def setUpClass(cls):
+        super(DatabaseJsonTest, cls).setUpClass()
+        # checked on the test database, once it exists
+        if connection.vendor != 'sqlite' or \
+                not has_json_functions(connection):
+            raise unittest.SkipTest('requires SQLite JSON1')
+
+    def setUp(self):
+        TwoNestedTestModel.objects.filter(val__gte=1000).delete()
+        ManyNestedTestModel.objects.filter(val__gte=1000).delete()
+        NestedTestModel.objects.filter(val__gte=1000, val__lt=1100).delete()
+        self.root = NestedTestModel.objects.create(val=1000)
+        child = NestedTestModel.objects.create(val=1001, nest=self.root)
+        NestedTestModel.objects.create(val=1002, nest=child)
+        NestedTestModel.objects.create(val=1003, nest=self.root)
+        TwoNestedTestModel.objects.create(val=1000, nest1=self.root,
+                                          nest2=child)
+        TwoNestedTestModel.objects.create(val=1001, nest1=self.root)
+        many = ManyNestedTestModel.objects.create(val=1000)
+        many.nests.add(self.root, child)
+        ManyNestedTestModel.objects.create(val=1001)
+
+    def _get_data(self, view_class, fields_string):
+        request = self.request_factory.get('/nest/', {'fields': fields_string})
+        with CaptureQueriesContext(connection) as queries:
+            response = view_class.as_view({'get': 'list'})(request)
+            response.render()
+        return json.loads(response.content.decode('utf-8')), len(queries)
+
+    def assert_parity(self, fields_string):
+        python_data, _ = self._get_data(JsonNestTestView, fields_string)
+        database_data, queries = self._get_data(DatabaseJsonNestTestView,
+                                                fields_string)
+        self.assertEqual(database_data, python_data)
+        self.assertEqual(queries, 1)
+        return database_data
+
+    def test_scalar_fields(self):
+        data = self.assert_parity('id,val')
+        self.assertEqual([row['val'] for row in data],
+                         [1003, 1002, 1001, 1000])
+
+    def test_nested_to_one(self):
+        data = self.assert_parity('val,nest(val,nest(id))')
+        self.assertEqual(data[3]['nest'], None)
+        self.assert_parity('val,twonestedparent1(val,nest1(val),'
+                           'nest2(val,nest(val)))')
+
+    def test_nested_to_many(self):
+        data = self.assert_parity('val,parent(val,parent(id,val))')
+        self.assertEqual(data[3]['parent'][0]['parent'][0]['val'], 1002)
+        # the deepest trees built in the database
+        self.assert_parity('parent(parent(nest(nest(parent(val)))))')
+
+    def test_default_fields(self):
+        self.assert_parity('parent(:default)')
+
+    def test_many_to_many(self):
+        for serializer_class, fields_string in (
+                (CircularTestManySerializer, 'val,nests(val,nest(val))'),
+                (JsonManyPkTestSerializer, None)):
+            kwargs = {}
+            if fields_string:
+                kwargs['cereal_fields'] = \
+                    CerealMixin.parse_fields_to_nested_tree(fields_string)
+            queryset = ManyNestedTestModel.objects.filter(val__gte=1000) \
+                .order_by('val')
+            serializer = serializer_class(queryset, many=True, **kwargs)
+            python_data = json.loads(json.dumps(serializer.data))
+            rows = get_json_rows(serializer.child, queryset)
+            self.assertEqual([json.loads(row) for row in rows], python_data)
+
+    def test_unsupported_fields_serialized_in_python(self):
+        cereal_fields = CerealMixin.parse_fields_to_nested_tree(
+            'val,nest3(val)'
+        )
+        serializer = TwoNestTestSerializer(
+            many=True, cereal_fields=cereal_fields
+        )
+        with self.assertRaises(DatabaseJSONUnsupported):
+            get_json_rows(serializer.child, TwoNestedTestModel.objects.all())
+
+        # nor are very deep trees
+        cereal_fields = CerealMixin.parse_fields_to_nested_tree(
+            'nest(' * 6 + 'val' + ')' * 6
+        )
+        serializer = JsonNestTestSerializer(
+            many=True, cereal_fields=cereal_fields
+        )
+        with self.assertRaises(DatabaseJSONUnsupported):
+            get_json_rows(serializer.child, NestedTestModel.objects.all())
+
+        # compact responses aren't built in the database
+        data, queries = self._get_data(DatabaseJsonNestTestView,
+                                       'val,nest(val),:compact')
+        self.assertEqual(data['fields'], ['val', 'nest.val'])
+        self.assertEqual(queries, 1)
+
+    def test_base_serializer(self):
+        cereal_fields = CerealMixin.parse_fields_to_nested_tree(
+            'val,nest(val,nest(val))'
+        )
+        queryset = NestedTestModel.objects.filter(val__gte=1000, val__lt=1100)
+        serializer = BaseTestSerializer(
+            queryset, many=True, cereal_fields=cereal_fields
+        )
+        python_data = json.loads(json.dumps(serializer.data))
+        rows = get_json_rows(serializer.child, queryset)
+        self.assertEqual([json.loads(row) for row in rows], python_data)
+
+    def test_custom_serializers_serialized_in_python(self):
+        data, _ = self._get_data(RepresentationJsonNestTestView, 'val')
+        self.assertEqual(data[0], {'val': 1003, 'extra': True})
+        data, _ = self._get_data(PlainListJsonNestTestView, 'val')
+        self.assertEqual(data[0], {'val': 1003})
+
+    def test_missing_json_functions(self):
+        connection._cereal_json_functions = False
+        try:
+            data, queries = self._get_data(DatabaseJsonNestTestView,
+                                           'val,parent(val)')
+        finally:
+            connection._cereal_json_functions = True
+        self.assertEqual(data[3]['parent'], [{'val': 1001}, {'val': 1003}])
+        # serialized in Python: the objects and the prefetch
+        self.assertEqual(queries, 2)
@@ -0,0 +1,115 @@
+import itertools
+import json
+import unittest
+from functools import partial
+
+from rest_framework.test import APIRequestFactory
+from rest_framework.viewsets import ModelViewSet
+
+from rest_cereal.deadline import Deadline, SerializationTimeout
+from rest_cereal.views import CerealViewMixin
+
+from cerealtestingapp.models import NestedTestModel
+from test_cerealmixin import BaseTestSerializer
+
+
+class DeadlineTestView(CerealViewMixin, ModelViewSet):
+    model = NestedTestModel
+    serializer_class = BaseTestSerializer
+    queryset = NestedTestModel.objects.filter(val__gte=1100, val__lt=1200) \
+        .order_by('val')
+
+
+class StepDeadlineTestView(DeadlineTestView):
+    '''Each deadline check takes a second.
+    '''
+
+    serialization_budget = 2.5
+
+    def get_deadline(self):
+        if not hasattr(self.request, '_cereal_deadline'):
+            self.request._cereal_deadline = Deadline(
+                self.serialization_budget,
+                timer=partial(next, itertools.count())
+            )
+        return self.request._cereal_deadline
+
+
+class DeadlineTest(unittest.TestCase):
+    '''Test the time budget of the serialization, and partial responses.
+    '''
+
+    request_factory = APIRequestFactory()
+
+    def setUp(self):
+        NestedTestModel.objects.filter(val__gte=1100, val__lt=1200).delete()
+        self.nest = NestedTestModel.objects.create(val=1199)
+        self.models = [NestedTestModel.objects.create(val=val, nest=self.nest)
+                       for val in range(1100, 1104)]
+
+    def _get_response(self, view_class, fields_string, **params):
+        params['fields'] = fields_string
+        request = self.request_factory.get('/nest/', params)
+        response = view_class.as_view({'get': 'list'})(request)
+        response.render()
+        return response.status_code, json.loads(response.content)
+
+    def test_deadline(self):
+        deadline = Deadline(10, timer=partial(next, itertools.count()))
+        deadline.check()
+        deadline = Deadline(0.5, timer=partial(next, itertools.count()))
+        self.assertRaises(SerializationTimeout, deadline.check)
+
+    def test_no_budget(self):
+        status_code, data = self._get_response(DeadlineTestView, 'val')
+        self.assertEqual(status_code, 200)
+        self.assertEqual(len(data), 5)
+
+    def test_timeout(self):
+        status_code, data = self._get_response(StepDeadlineTestView, 'val')
+        self.assertEqual(status_code, 503)
+        self.assertEqual(
+            data, {'detail': 'The response took too long to serialize.'}
+        )
+
+    def test_partial_continued(self):
+        status_code, data = self._get_response(StepDeadlineTestView,
+                                               'val,:partial')
+        self.assertEqual(status_code, 200)
+        self.assertEqual(data, {
+            'results': [{'val': 1100}, {'val': 1101}],
+            'partial': True,
+            'continue_from': 2,
+        })
+        _, data = self._get_response(StepDeadlineTestView, 'val,:partial',
+                                     continue_from=4)
+        self.assertEqual(data, {
+            'results': [{'val': 1199}],
+            'partial': False,
+            'continue_from': None,
+        })
+
+    def test_nested_objects_checked(self):
+        _, data = self._get_response(StepDeadlineTestView,
+                                     'val,nest(val),:partial')
+        self.assertEqual(data, {
+            'results': [{'val': 1100, 'nest': {'val': 1199}}],
+            'partial': True,
+            'continue_from': 1,
+        })
+
+    def test_bad_continue_from(self):
+        status_code, data = self._get_response(
+            StepDeadlineTestView, 'val,:partial', continue_from='-1'
+        )
+        self.assertEqual(status_code, 400)
+        self.assertEqual(
+            data, {'detail': 'continue_from must be an integer of 0 or more.'}
+        )
+
+    def test_retrieve_timeout(self):
+        request = self.request_factory.get('/nest/', {'fields': 'val'})
+        view = StepDeadlineTestView.as_view({'get': 'retrieve'},
+                                            serialization_budget=0.5)
+        response = view(request, pk=self.models[0].pk)
+        self.assertEqual(response.status_code, 503)
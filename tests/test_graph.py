@@ -0,0 +1,88 @@
+import json
+import unittest
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.serializers import ModelSerializer
+from rest_framework.test import APIRequestFactory
+
+from rest_cereal.graph import SerializerGraph
+from rest_cereal.mixins import CerealMixin, CerealException
+from rest_cereal.serializers import LazySerializer
+
+from cerealtestingapp.models import NestedTestModel
+from test_cerealmixin import BaseTestSerializer, CircularTestSerializer1, \
+    TwoNestTestSerializer
+from test_views import ColumnarTestView
+
+
+class UnconvertedLazyTestSerializer(CerealMixin, ModelSerializer):
+    nest = LazySerializer('BaseTestSerializer')
+
+    class Meta:
+        model = NestedTestModel
+        fields = ('val',)
+
+
+def validate(serializer_class, fields_string):
+    SerializerGraph().validate(
+        serializer_class,
+        CerealMixin.parse_fields_to_nested_tree(fields_string)
+    )
+
+
+class SerializerGraphTest(unittest.TestCase):
+    '''Test the validation of fields trees against the serializer graph.
+    '''
+
+    def test_build_follows_nested_serializers(self):
+        graph = SerializerGraph()
+        graph.build([TwoNestTestSerializer])
+        self.assertIn(CircularTestSerializer1, graph.nodes)
+        self.assertEqual(
+            set(graph.nodes[TwoNestTestSerializer].nested),
+            set(['nest1', 'nest2', 'nest3', 'nest4'])
+        )
+
+    def test_valid_trees(self):
+        validate(BaseTestSerializer, 'val,id,nest(val,nest(val))')
+        validate(CircularTestSerializer1, 'nest(nest(nest(val)))')
+        validate(TwoNestTestSerializer, 'nest3(val),nest1(nest(val))')
+
+    def test_unknown_normal_field(self):
+        self.assertRaises(CerealException, validate, BaseTestSerializer,
+                          'nest(nest(unknown))')
+
+    def test_unknown_nested_field(self):
+        self.assertRaises(CerealException, validate, BaseTestSerializer,
+                          'nest(val,val(val))')
+
+    def test_circular_without_fields(self):
+        self.assertRaises(CerealException, validate, CircularTestSerializer1,
+                          'nest(:option)')
+
+    def test_default_option_ignores_tree(self):
+        validate(BaseTestSerializer, 'nest(unknown,:default)')
+
+    def test_unconverted_lazy_serializer(self):
+        validate(UnconvertedLazyTestSerializer, 'nest(nest(val))')
+        self.assertRaises(CerealException, validate,
+                          UnconvertedLazyTestSerializer, 'nest(unknown)')
+
+
+class ViewFieldsValidationTest(unittest.TestCase):
+    '''Test that CerealViewMixin views reject bad fields before running
+    queries.
+    '''
+
+    def test_rejected_without_queries(self):
+        request = APIRequestFactory().get('/nest/',
+                                          {'fields': 'val,nest(unknown)'})
+        with CaptureQueriesContext(connection) as queries:
+            response = ColumnarTestView.as_view({'get': 'list'})(request)
+            response.render()
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(json.loads(response.content),
+                         {'detail': "Field unknown isn't defined in "
+                                    "serializer."})
+        self.assertEqual(len(queries), 0)
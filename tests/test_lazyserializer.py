@@ -0,0 +1,113 @@
+import json
+import unittest
+
+from rest_framework.serializers import ModelSerializer
+from rest_framework.test import APIRequestFactory
+from rest_framework.viewsets import ModelViewSet
+
+from rest_cereal.mixins import CerealMixin
+from rest_cereal.serializers import LazySerializer
+
+from cerealtestingapp.models import NestedTestModel
+from test_cerealmixin import BaseTestSerializer
+
+
+@LazySerializer.register
+class RegisteredLazyTestSerializer(CerealMixin, ModelSerializer):
+    nest = LazySerializer('ModuleLazyTestSerializer')
+
+    class Meta:
+        model = NestedTestModel
+        fields = ('val', 'nest')
+        circular = True
+
+
+class ModuleLazyTestSerializer(CerealMixin, ModelSerializer):
+    nest = LazySerializer('RegisteredLazyTestSerializer')
+
+    class Meta:
+        model = NestedTestModel
+        fields = ('val', 'nest')
+        circular = True
+
+
+class DottedLazyTestSerializer(CerealMixin, ModelSerializer):
+    nest = LazySerializer('test_cerealmixin.BaseTestSerializer')
+
+    class Meta:
+        model = NestedTestModel
+        fields = ('val', 'nest')
+
+
+class LazyTestView(ModelViewSet):
+    model = NestedTestModel
+    serializer_class = RegisteredLazyTestSerializer
+    queryset = NestedTestModel.objects.all()
+
+
+class LazyResolutionTest(unittest.TestCase):
+    '''Test the resolution of LazySerializers on first use (without
+    convert_serializers).
+    '''
+
+    request_factory = APIRequestFactory()
+
+    def setUp(self):
+        NestedTestModel.objects.filter(val__gte=600, val__lt=700).delete()
+        self.model1 = NestedTestModel.objects.create(val=600)
+        self.model2 = NestedTestModel.objects.create(nest=self.model1,
+                                                     val=601)
+        self.model1.nest = self.model2
+        self.model1.save()
+
+    def test_not_resolved_before_use(self):
+        class UnusedLazyTestSerializer(CerealMixin, ModelSerializer):
+            nest = LazySerializer('UnknownSerializer')
+
+            class Meta:
+                model = NestedTestModel
+                fields = ('val', 'nest')
+
+        self.assertNotIn('nest', UnusedLazyTestSerializer._declared_fields)
+        self.assertRaises(LazySerializer.DoesNotExistException,
+                          LazySerializer.get_declared_fields,
+                          UnusedLazyTestSerializer)
+
+    def test_circular_request(self):
+        request = self.request_factory.get(
+            '/nest/', {'fields': 'val,nest(val,nest(val))'}
+        )
+        response = LazyTestView.as_view({'get': 'retrieve'})(
+            request, pk=self.model1.id
+        )
+        response.render()
+        self.assertEqual(json.loads(response.content), {
+            'val': 600, 'nest': {'val': 601, 'nest': {'val': 600}}
+        })
+
+    def test_resolved_classes(self):
+        fields = LazySerializer.get_declared_fields(
+            RegisteredLazyTestSerializer
+        )
+        self.assertIsInstance(fields['nest'], ModuleLazyTestSerializer)
+        fields = LazySerializer.get_declared_fields(DottedLazyTestSerializer)
+        self.assertIsInstance(fields['nest'], BaseTestSerializer)
+
+    def test_instantiated_once(self):
+        nest = LazySerializer.get_declared_fields(
+            ModuleLazyTestSerializer
+        )['nest']
+        self.assertIs(
+            LazySerializer.get_declared_fields(
+                ModuleLazyTestSerializer
+            )['nest'],
+            nest
+        )
+
+        class SubLazyTestSerializer(ModuleLazyTestSerializer):
+            pass
+
+        self.assertIs(
+            LazySerializer.get_declared_fields(SubLazyTestSerializer)['nest'],
+            nest
+        )
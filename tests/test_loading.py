@@ -0,0 +1,159 @@
+import json
+import unittest
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.serializers import ModelSerializer
+from rest_framework.test import APIRequestFactory
+from rest_framework.viewsets import ModelViewSet
+
+from rest_cereal.loading import BatchLoader
+from rest_cereal.mixins import CerealMixin
+from rest_cereal.planning import QueryPlan
+from rest_cereal.serializers import MethodSerializerMixin
+from rest_cereal.views import CerealViewMixin
+
+from cerealtestingapp.models import NestedTestModel, TwoNestedTestModel
+
+
+class LoadNestTestSerializer(CerealMixin, ModelSerializer):
+
+    class Meta:
+        model = NestedTestModel
+        fields = ('val',)
+
+
+class LoadMethodTestSerializer(CerealMixin, MethodSerializerMixin,
+                               ModelSerializer):
+
+    class Meta:
+        model = NestedTestModel
+        fields = ('val',)
+
+
+class LoadTwoTestSerializer(CerealMixin, ModelSerializer):
+    nest1 = LoadNestTestSerializer()
+    nest2 = LoadNestTestSerializer()
+    loaded_nest = LoadMethodTestSerializer(method_name='get_loaded_nest')
+
+    class Meta:
+        model = TwoNestedTestModel
+        fields = ('val',)
+
+    def get_loaded_nest(self, obj):
+        return self.context['cereal_loader'].get(NestedTestModel,
+                                                 obj.nest2_id)
+
+
+class LoadRootTestSerializer(CerealMixin, ModelSerializer):
+    twonestedparent1 = LoadTwoTestSerializer(many=True)
+    twonestedparent2 = LoadTwoTestSerializer(many=True)
+
+    class Meta:
+        model = NestedTestModel
+        fields = ('val',)
+
+
+class UnbatchedTestView(CerealViewMixin, ModelViewSet):
+    model = NestedTestModel
+    serializer_class = LoadRootTestSerializer
+    queryset = NestedTestModel.objects.filter(val__gte=900, val__lt=910) \
+        .order_by('val')
+
+
+class BatchedTestView(UnbatchedTestView):
+    batch_loading = True
+
+
+class BatchLoaderTest(unittest.TestCase):
+    '''Test loading the objects of a request through a BatchLoader.
+    '''
+
+    request_factory = APIRequestFactory()
+    fields = 'val,twonestedparent1(val,nest2(val)),' \
+        'twonestedparent2(val,nest1(val))'
+
+    def setUp(self):
+        TwoNestedTestModel.objects.filter(val__gte=900).delete()
+        NestedTestModel.objects.filter(val__gte=900, val__lt=1000).delete()
+        self.roots = [NestedTestModel.objects.create(val=val)
+                      for val in (900, 901)]
+        # not returned by the views
+        self.others = [NestedTestModel.objects.create(val=val)
+                       for val in (950, 951)]
+        TwoNestedTestModel.objects.create(val=900, nest1=self.roots[0],
+                                          nest2=self.others[0])
+        TwoNestedTestModel.objects.create(val=901, nest1=self.roots[1],
+                                          nest2=self.roots[0])
+        TwoNestedTestModel.objects.create(val=902, nest1=self.others[1],
+                                          nest2=self.roots[1])
+
+    def _get_response(self, view_class, fields_string):
+        request = self.request_factory.get('/nest/', {'fields': fields_string})
+        with CaptureQueriesContext(connection) as queries:
+            response = view_class.as_view({'get': 'list'})(request)
+            response.render()
+        return json.loads(response.content.decode('utf-8')), len(queries)
+
+    def test_one_query_per_model_per_level(self):
+        unbatched, unbatched_queries = self._get_response(UnbatchedTestView,
+                                                          self.fields)
+        batched, batched_queries = self._get_response(BatchedTestView,
+                                                      self.fields)
+        self.assertEqual(batched, unbatched)
+        self.assertEqual(batched[1], {
+            'val': 901,
+            'twonestedparent1': [{'val': 901, 'nest2': {'val': 900}}],
+            'twonestedparent2': [{'val': 902, 'nest1': {'val': 951}}],
+        })
+        # root objects, twonestedparent1, twonestedparent2,
+        # twonestedparent1__nest2, twonestedparent2__nest1
+        self.assertEqual(unbatched_queries, 5)
+        # both nests are loaded with one query, which skips the root objects
+        self.assertEqual(batched_queries, 4)
+
+    def test_method_fields_use_loader(self):
+        fields = 'twonestedparent1(nest2(val),loaded_nest(val))'
+        data, queries = self._get_response(BatchedTestView, fields)
+        self.assertEqual(
+            [[(two['nest2']['val'], two['loaded_nest']['val'])
+              for two in root['twonestedparent1']] for root in data],
+            [[(950, 950)], [(900, 900)]]
+        )
+        # root objects, twonestedparent1, nest2 (shared with the method)
+        self.assertEqual(queries, 3)
+
+    def test_shared_identity_map(self):
+        loader = BatchLoader()
+        queryset = QueryPlan(prefetch_related=[
+            'twonestedparent1', 'twonestedparent1__nest1',
+            'twonestedparent1__nest2'
+        ]).apply(
+            NestedTestModel.objects.filter(pk__in=[self.roots[0].pk]),
+            loader=loader
+        )
+        root = list(queryset)[0]
+        two = root.twonestedparent1.all()[0]
+        self.assertIs(two.nest1, root)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertIs(loader.get(NestedTestModel, self.others[0].pk),
+                          two.nest2)
+            loader.want(NestedTestModel, [self.others[1].pk])
+            loader.want(NestedTestModel, [self.roots[1].pk])
+            self.assertEqual(
+                loader.get(NestedTestModel, self.others[1].pk).val, 951
+            )
+            self.assertEqual(
+                loader.get(NestedTestModel, self.roots[1].pk).val, 901
+            )
+        # the wanted objects are loaded together
+        self.assertEqual(len(queries), 1)
+
+    def test_queryset_shapes_kept_apart(self):
+        loader = BatchLoader()
+        filtered = NestedTestModel.objects.filter(val__lt=951)
+        pks = [self.others[0].pk, self.others[1].pk]
+        self.assertEqual(sorted(loader.load(NestedTestModel, pks)), pks)
+        self.assertEqual(list(loader.load(NestedTestModel, pks, filtered)),
+                         [self.others[0].pk])
+        self.assertEqual(loader.queries, 2)
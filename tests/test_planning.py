@@ -0,0 +1,232 @@
+import unittest
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.serializers import ModelSerializer
+
+from rest_cereal.mixins import CerealMixin
+from rest_cereal.planning import QueryPlan, get_model_relation, \
+    group_prefetch_lookups, plan_query
+from rest_cereal import stats as stats_module
+from rest_cereal.stats import RelationStats, clear_relation_stats, \
+    get_relation_stats, set_relation_stats, wait_for_sampling
+
+from cerealtestingapp.models import ManyNestedTestModel, NestedTestModel, \
+    TwoNestedTestModel
+from test_cerealmixin import BaseTestSerializer, CircularTestManySerializer, \
+    TwoNestTestSerializer
+
+
+class ManyPkTestSerializer(CerealMixin, ModelSerializer):
+
+    class Meta:
+        model = ManyNestedTestModel
+        fields = ('val', 'nests')
+
+
+def plan(serializer_class, fields_string, adaptive=False):
+    return plan_query(
+        serializer_class,
+        CerealMixin.parse_fields_to_nested_tree(fields_string),
+        adaptive=adaptive
+    )
+
+
+class PlanQueryTest(unittest.TestCase):
+    '''Test the query plans made from fields trees.
+    '''
+
+    def test_scalar_fields(self):
+        self.assertEqual(plan(BaseTestSerializer, 'val'), QueryPlan())
+
+    def test_nested_to_one_joined(self):
+        self.assertEqual(
+            plan(BaseTestSerializer, 'val,nest(nest(val))'),
+            QueryPlan(select_related=['nest', 'nest__nest'])
+        )
+
+    def test_default_fields(self):
+        self.assertEqual(
+            plan(BaseTestSerializer, ':default'),
+            QueryPlan(select_related=['nest', 'nest__nest'])
+        )
+
+    def test_nested_to_many_prefetched(self):
+        self.assertEqual(
+            plan(CircularTestManySerializer, 'nests(val,nest(val))'),
+            QueryPlan(prefetch_related=['nests', 'nests__nest'])
+        )
+
+    def test_to_many_primary_keys_prefetched(self):
+        self.assertEqual(
+            plan(ManyPkTestSerializer, 'val,nests'),
+            QueryPlan(prefetch_related=['nests'])
+        )
+
+    def test_method_fields_not_planned(self):
+        self.assertEqual(
+            plan(TwoNestTestSerializer, 'nest1(val),nest3(val)'),
+            QueryPlan(select_related=['nest1'])
+        )
+
+
+class AdaptivePlanTest(unittest.TestCase):
+    '''Test choosing between joins and prefetches from relation statistics.
+    '''
+
+    def setUp(self):
+        TwoNestedTestModel.objects.filter(val__gte=850, val__lt=900).delete()
+        NestedTestModel.objects.filter(val__gte=850, val__lt=900).delete()
+        clear_relation_stats()
+
+    def tearDown(self):
+        clear_relation_stats()
+
+    def test_shared_related_objects_prefetched(self):
+        set_relation_stats(NestedTestModel, 'nest',
+                           RelationStats(1000, 1000, 900, 30))
+        adaptive_plan = plan(BaseTestSerializer, 'val,nest(nest(val))',
+                             adaptive=True)
+        self.assertEqual(
+            adaptive_plan,
+            QueryPlan(prefetch_related=['nest', 'nest__nest'])
+        )
+        self.assertEqual(adaptive_plan.explain()['paths'][0], {
+            'path': 'nest',
+            'strategy': 'prefetch',
+            'stats': {'rows': 1000, 'related_rows': 1000, 'fan_out': 0.9,
+                      'fan_in': 30.0},
+        })
+
+    def test_distinct_related_objects_joined(self):
+        set_relation_stats(NestedTestModel, 'nest',
+                           RelationStats(1000, 1000, 900, 900))
+        self.assertEqual(
+            plan(BaseTestSerializer, 'val,nest(nest(val))', adaptive=True),
+            QueryPlan(select_related=['nest', 'nest__nest'])
+        )
+
+    def test_adaptive_setting(self):
+        set_relation_stats(NestedTestModel, 'nest',
+                           RelationStats(1000, 1000, 900, 30))
+        fields = CerealMixin.parse_fields_to_nested_tree('nest(val)')
+        self.assertEqual(plan_query(BaseTestSerializer, fields),
+                         QueryPlan(select_related=['nest']))
+        with override_settings(REST_CEREAL={'ADAPTIVE_JOINS': True,
+                                            'JOIN_MAX_FAN_IN': 50}):
+            self.assertEqual(plan_query(BaseTestSerializer, fields),
+                             QueryPlan(select_related=['nest']))
+        with override_settings(REST_CEREAL={'ADAPTIVE_JOINS': True}):
+            self.assertEqual(plan_query(BaseTestSerializer, fields),
+                             QueryPlan(prefetch_related=['nest']))
+
+    def test_sampled_stats(self):
+        shared = NestedTestModel.objects.create(val=850)
+        for val in range(851, 855):
+            TwoNestedTestModel.objects.create(val=val, nest1=shared)
+        TwoNestedTestModel.objects.create(val=855)
+        relation = get_model_relation(TwoNestedTestModel, 'nest1')
+        # sampled in the background: static plans meanwhile
+        with CaptureQueriesContext(connection) as queries:
+            self.assertIsNone(get_relation_stats(TwoNestedTestModel,
+                                                 relation))
+            self.assertIsNone(get_relation_stats(TwoNestedTestModel,
+                                                 relation))
+            self.assertEqual(
+                plan(TwoNestTestSerializer, 'nest1(val)', adaptive=True),
+                QueryPlan(select_related=['nest1'])
+            )
+        self.assertEqual(len(queries), 0)
+        wait_for_sampling()
+        stats = get_relation_stats(TwoNestedTestModel, relation)
+        two_rows = TwoNestedTestModel.objects.count()
+        linked = TwoNestedTestModel.objects.filter(nest1__isnull=False)
+        self.assertEqual(stats.rows, two_rows)
+        self.assertEqual(stats.related_rows, NestedTestModel.objects.count())
+        self.assertEqual(stats.links, linked.count())
+        self.assertEqual(
+            stats.distinct, len(set(linked.values_list('nest1', flat=True)))
+        )
+        self.assertGreaterEqual(stats.links, 4)
+        # sampled once per STATS_INTERVAL
+        with CaptureQueriesContext(connection) as queries:
+            self.assertIs(get_relation_stats(TwoNestedTestModel, relation),
+                          stats)
+        self.assertEqual(len(queries), 0)
+        self.assertEqual(stats_module._sampling, {})
+
+        with override_settings(REST_CEREAL={'STATS_INTERVAL': 0}):
+            # stale stats are served while a thread samples them
+            key = (TwoNestedTestModel, 'nest1')
+            stats_module._sampling[key] = sampling = object()
+            try:
+                self.assertIs(
+                    get_relation_stats(TwoNestedTestModel, relation), stats
+                )
+                self.assertIs(stats_module._sampling[key], sampling)
+            finally:
+                del stats_module._sampling[key]
+            self.assertIs(get_relation_stats(TwoNestedTestModel, relation),
+                          stats)
+            wait_for_sampling()
+        self.assertIsNot(get_relation_stats(TwoNestedTestModel, relation),
+                         stats)
+
+
+class ConcurrentPrefetchTest(unittest.TestCase):
+    '''Test running the prefetches of independent relations concurrently.
+    '''
+
+    plan = QueryPlan(prefetch_related=['parent', 'parent__parent',
+                                       'twonestedparent1'])
+
+    def setUp(self):
+        TwoNestedTestModel.objects.filter(val__gte=800).delete()
+        NestedTestModel.objects.filter(val__gte=800, val__lt=900).delete()
+        self.nest = NestedTestModel.objects.create(val=800)
+        child = NestedTestModel.objects.create(val=801, nest=self.nest)
+        NestedTestModel.objects.create(val=802, nest=child)
+        TwoNestedTestModel.objects.create(val=800, nest1=self.nest)
+
+    def _get_results(self, prefetch_threads):
+        queryset = self.plan.apply(
+            NestedTestModel.objects.filter(val__gte=800, val__lt=900)
+            .order_by('val'),
+            prefetch_threads=prefetch_threads
+        )
+        with CaptureQueriesContext(connection) as queries:
+            results = [
+                (model.val,
+                 [(child.val, [grandchild.val
+                               for grandchild in child.parent.all()])
+                  for child in model.parent.all()],
+                 [two.val for two in model.twonestedparent1.all()])
+                for model in queryset
+            ]
+        return results, len(queries), queryset
+
+    def test_group_lookups(self):
+        self.assertEqual(
+            group_prefetch_lookups(['a', 'b__c', 'a__d', 'b']),
+            [['a', 'a__d'], ['b__c', 'b']]
+        )
+
+    def test_same_results_as_sequential(self):
+        sequential, sequential_queries, _ = self._get_results(None)
+        concurrent, concurrent_queries, queryset = self._get_results(2)
+        self.assertEqual(concurrent, sequential)
+        self.assertEqual(concurrent[0], (800, [(801, [802])], [800]))
+        self.assertEqual(sequential_queries, 4)
+        # the prefetch queries ran on other threads' connections
+        self.assertEqual(concurrent_queries, 1)
+        self.assertTrue(
+            queryset.__class__.__name__.startswith('ConcurrentPrefetch')
+        )
+
+    def test_single_relation_sequential(self):
+        queryset = QueryPlan(prefetch_related=['parent']).apply(
+            NestedTestModel.objects.all(), prefetch_threads=2
+        )
+        self.assertFalse(
+            queryset.__class__.__name__.startswith('ConcurrentPrefetch')
+        )
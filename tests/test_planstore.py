@@ -0,0 +1,146 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from django.test.utils import override_settings
+
+from rest_framework.serializers import ModelSerializer
+
+from rest_cereal import mixins, planstore
+from rest_cereal.mixins import CerealMixin
+from rest_cereal.planning import QueryPlan
+from rest_cereal.planstore import PlanStore, get_plan_key
+
+from cerealtestingapp.models import NestedTestModel
+from test_cerealmixin import BaseTestSerializer
+
+
+class NestFingerprintTestSerializer(CerealMixin, ModelSerializer):
+
+    class Meta:
+        model = NestedTestModel
+        fields = ('val',)
+
+
+class SubFingerprintTestSerializer(NestFingerprintTestSerializer):
+
+    class Meta(NestFingerprintTestSerializer.Meta):
+        pass
+
+
+class FingerprintTestSerializer(CerealMixin, ModelSerializer):
+    nest = NestFingerprintTestSerializer()
+
+    class Meta:
+        model = NestedTestModel
+        fields = ('val', 'nest')
+
+
+class PlanStoreTest(unittest.TestCase):
+    '''Test sharing compiled fields parameters through a file.
+    '''
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'plans')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_shared_between_stores(self):
+        writer = PlanStore(self.path)
+        reader = PlanStore(self.path)
+        reader.refresh_interval = 0
+        self.assertIsNone(reader.get('a'))
+        writer.add('a', {'fields': 'val'})
+        writer.add('b', {'fields': 'nest(val)'})
+        self.assertEqual(reader.get('b'), {'fields': 'nest(val)'})
+        self.assertEqual(reader.get('a'), {'fields': 'val'})
+        self.assertIsNone(reader.get('c'))
+
+    def test_partial_line_ignored(self):
+        PlanStore(self.path).add('a', {'fields': 'val'})
+        with open(self.path, 'ab') as plan_file:
+            plan_file.write(b'b\t{"fields":')
+        self.assertIsNone(PlanStore(self.path).get('b'))
+
+    def test_compacted(self):
+        old = PlanStore(self.path)
+        for key in ('a', 'b'):
+            old.add(key, {'fields': key}, ('views.S', 'f1'))
+        old.add('c', {'fields': 'c'}, ('views.T', 'f1'))
+        # as after a deploy changing views.S
+        new = PlanStore(self.path)
+        new.refresh_interval = 0
+        new.compact_threshold = 2
+        new.add('d', {'fields': 'd'}, ('views.S', 'f2'))
+        with open(self.path, 'rb') as plan_file:
+            keys = [line.split(b'\t')[0] for line in plan_file][1:]
+        self.assertEqual(keys, [b'c', b'd'])
+        self.assertIsNone(new.get('a'))
+        self.assertEqual(new.get('d'), {'fields': 'd'})
+        # the other processes index the new file
+        old.refreshed = None
+        self.assertEqual(old.get('c'), {'fields': 'c'})
+        self.assertIsNone(old.get('b'))
+
+    def test_refreshed_at_interval(self):
+        writer = PlanStore(self.path)
+        reader = PlanStore(self.path)
+        writer.add('a', {'fields': 'val'})
+        self.assertEqual(reader.get('a'), {'fields': 'val'})
+        writer.add('b', {'fields': 'nest(val)'})
+        self.assertIsNone(reader.get('b'))
+        reader.refreshed -= reader.refresh_interval
+        self.assertEqual(reader.get('b'), {'fields': 'nest(val)'})
+
+    def test_keys(self):
+        self.assertEqual(get_plan_key(BaseTestSerializer, 'val'),
+                         get_plan_key(BaseTestSerializer, 'val'))
+        self.assertNotEqual(get_plan_key(BaseTestSerializer, 'val'),
+                            get_plan_key(BaseTestSerializer, 'val,nest'))
+
+    def test_keys_change_with_inherited_meta(self):
+        key = get_plan_key(SubFingerprintTestSerializer, 'val')
+        NestFingerprintTestSerializer.Meta.fields = ('id', 'val')
+        planstore._fingerprints.clear()
+        try:
+            self.assertNotEqual(
+                get_plan_key(SubFingerprintTestSerializer, 'val'), key
+            )
+        finally:
+            NestFingerprintTestSerializer.Meta.fields = ('val',)
+            planstore._fingerprints.clear()
+
+    def test_keys_change_with_serializers(self):
+        key = get_plan_key(FingerprintTestSerializer, 'val')
+        self.assertEqual(get_plan_key(FingerprintTestSerializer, 'val'), key)
+        # as after a deploy changing the nested serializer
+        NestFingerprintTestSerializer.Meta.fields = ('id', 'val')
+        planstore._fingerprints.clear()
+        try:
+            self.assertNotEqual(
+                get_plan_key(FingerprintTestSerializer, 'val'), key
+            )
+        finally:
+            NestFingerprintTestSerializer.Meta.fields = ('val',)
+            planstore._fingerprints.clear()
+
+    def test_compiled_fields_shared(self):
+        fields_parameter = 'val,nest(nest(val),val)'
+        key = (BaseTestSerializer, fields_parameter)
+        with override_settings(REST_CEREAL={'PLAN_STORE_FILE': self.path}):
+            compiled = BaseTestSerializer.compile_fields_parameter(
+                fields_parameter
+            )
+            # as in another process
+            del mixins._compiled_fields_parameters[key]
+            stored = BaseTestSerializer.get_compiled_fields(fields_parameter)
+        del mixins._compiled_fields_parameters[key]
+
+        self.assertIsNot(stored, compiled)
+        self.assertEqual(stored.plan,
+                         QueryPlan(['nest', 'nest__nest'], []))
+        self.assertEqual(stored.cereal_fields.to_fields_string(False),
+                         compiled.cereal_fields.to_fields_string(False))
@@ -0,0 +1,121 @@
+import json
+import unittest
+
+from rest_framework.serializers import ModelSerializer
+from rest_framework.test import APIRequestFactory
+
+from rest_cereal.mixins import CerealMixin
+from rest_cereal.pool import SerializerPool, get_serializer_pool, \
+    is_poolable
+
+from cerealtestingapp.models import NestedTestModel
+from test_cerealmixin import BaseTestSerializer
+from test_views import ColumnarTestView
+
+
+class PooledTestView(ColumnarTestView):
+    pool_serializers = True
+
+
+class RequestFieldsTestSerializer(CerealMixin, ModelSerializer):
+
+    class Meta:
+        model = NestedTestModel
+        fields = ('id', 'val')
+
+    def get_fields(self, *args, **kwargs):
+        fields = super(RequestFieldsTestSerializer, self).get_fields(
+            *args, **kwargs
+        )
+        if self.context['request'].query_params.get('hide') == 'val':
+            fields.pop('val', None)
+        return fields
+
+
+class NestingRequestFieldsTestSerializer(CerealMixin, ModelSerializer):
+    nest = RequestFieldsTestSerializer()
+
+    class Meta:
+        model = NestedTestModel
+        fields = ('id', 'val', 'nest')
+
+
+class RequestFieldsTestView(PooledTestView):
+    serializer_class = RequestFieldsTestSerializer
+
+
+class SerializerPoolTest(unittest.TestCase):
+    '''Test reusing the serializers built for a fields parameter.
+    '''
+
+    request_factory = APIRequestFactory()
+
+    def setUp(self):
+        NestedTestModel.objects.filter(val__gte=300).delete()
+        self.model = NestedTestModel.objects.create(val=300)
+        NestedTestModel.objects.create(val=301, nest=self.model)
+
+    def _get_response(self, fields_string, **kwargs):
+        request = self.request_factory.get('/nest/', {'fields': fields_string})
+        if kwargs:
+            response = PooledTestView.as_view({'get': 'retrieve'})(
+                request, **kwargs
+            )
+        else:
+            response = PooledTestView.as_view({'get': 'list'})(request)
+        response.render()
+        return response
+
+    def test_serializers_reused(self):
+        first = self._get_response('val,nest(val)')
+        second = self._get_response('val,nest(val)')
+        self.assertIs(second.data.serializer, first.data.serializer)
+        self.assertEqual(json.loads(second.content), [
+            {'val': 300, 'nest': None},
+            {'val': 301, 'nest': {'val': 300}},
+        ])
+
+    def test_reset_between_requests(self):
+        self._get_response('val,nest(val)', pk=self.model.pk)
+        NestedTestModel.objects.filter(pk=self.model.pk).update(val=310)
+        response = self._get_response('val,nest(val)', pk=self.model.pk)
+        self.assertEqual(json.loads(response.content),
+                         {'val': 310, 'nest': None})
+
+    def test_different_fields_not_shared(self):
+        first = self._get_response('val')
+        second = self._get_response('nest(val)')
+        self.assertIsNot(second.data.serializer, first.data.serializer)
+
+    def test_released_after_rendering(self):
+        pool = get_serializer_pool()
+        key = (PooledTestView.serializer_class, True, 'val,nest')
+        pool.idle.pop(key, None)
+        self._get_response('val,nest')
+        self.assertEqual(len(pool.idle[key]), 1)
+
+    def test_pool_bounds(self):
+        pool = SerializerPool(max_keys=2, max_idle=1)
+        pool.release('a', 1)
+        pool.release('a', 2)
+        pool.release('b', 3)
+        pool.release('c', 4)
+        self.assertEqual(list(pool.idle.items()), [('b', [3]), ('c', [4])])
+        self.assertEqual(pool.acquire('c'), 4)
+        self.assertIsNone(pool.acquire('c'))
+
+    def test_request_dependent_fields_not_pooled(self):
+        self.assertTrue(is_poolable(BaseTestSerializer))
+        self.assertFalse(is_poolable(RequestFieldsTestSerializer))
+        self.assertFalse(is_poolable(NestingRequestFieldsTestSerializer))
+        responses = []
+        for hide in ('val', ''):
+            request = self.request_factory.get(
+                '/nest/', {'fields': 'id,val', 'hide': hide}
+            )
+            response = RequestFieldsTestView.as_view({'get': 'list'})(request)
+            response.render()
+            responses.append(json.loads(response.content))
+        self.assertEqual([list(row) for row in responses[0]], [['id']] * 2)
+        self.assertEqual([sorted(row) for row in responses[1]],
+                         [['id', 'val']] * 2)
@@ -0,0 +1,83 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from django.test.utils import override_settings
+from rest_framework.test import APIRequestFactory
+
+from rest_cereal import recorder
+from rest_cereal.mixins import CerealMixin
+from rest_cereal.recorder import CountMinSketch, FieldsRecorder
+from rest_cereal.warmup import read_warmup_file
+
+from cerealtestingapp.models import NestedTestModel
+from test_views import ColumnarTestView
+
+
+def tree(fields_string):
+    return CerealMixin.parse_fields_to_nested_tree(fields_string)
+
+
+class FieldsRecorderTest(unittest.TestCase):
+    '''Test the frequency estimates and the top fields parameters.
+    '''
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'warmup.txt')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_sketch_counts(self):
+        sketch = CountMinSketch(width=64, depth=3)
+        for _ in range(5):
+            count = sketch.add('a')
+        self.assertGreaterEqual(count, 5)
+        self.assertGreaterEqual(sketch.add('b'), 1)
+
+    def test_canonical_trees_counted_together(self):
+        fields_recorder = FieldsRecorder(top=10)
+        fields_recorder.record('views.A', tree('b,a'), 'b,a')
+        fields_recorder.record('views.A', tree('a,b'), 'a,b')
+        fields_recorder.record('views.B', tree('a,b'), 'a,b')
+        self.assertEqual(fields_recorder.get_top_entries(), [
+            ('views.A', 'a,b', 2),
+            ('views.B', 'a,b', 1),
+        ])
+
+    def test_top_entries_bounded(self):
+        fields_recorder = FieldsRecorder(top=2)
+        for fields_string, times in [('a', 3), ('b', 1), ('c', 2)]:
+            for _ in range(times):
+                fields_recorder.record('views.A', tree(fields_string),
+                                       fields_string)
+        self.assertEqual(
+            [entry[1] for entry in fields_recorder.get_top_entries()],
+            ['a', 'c']
+        )
+
+    def test_write_warmup_file(self):
+        fields_recorder = FieldsRecorder(top=10)
+        fields_recorder.record('views.A', tree('a,b(c)'), 'a,b(c)')
+        fields_recorder.write(self.path)
+        self.assertEqual(read_warmup_file(self.path),
+                         [('views.A', 'a,b(c)')])
+
+    def test_view_requests_recorded(self):
+        NestedTestModel.objects.filter(val__gte=300).delete()
+        recorder._recorder = None
+        with override_settings(REST_CEREAL={'RECORDER_FILE': self.path,
+                                            'RECORDER_INTERVAL': 0}):
+            for fields_string in ('val', 'val', 'unknown', 'val,:x\nbar',
+                                  'val,:x bar'):
+                request = APIRequestFactory().get('/nest/',
+                                                  {'fields': fields_string})
+                ColumnarTestView.as_view({'get': 'list'})(request).render()
+                recorder.wait_for_writing()
+        recorder._recorder = None
+        # failed requests, and fields that wouldn't fit on a line, aren't
+        # recorded
+        self.assertEqual(read_warmup_file(self.path),
+                         [('test_views.ColumnarTestView', 'val')])
@@ -0,0 +1,64 @@
+import unittest
+
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory
+from rest_framework.viewsets import ModelViewSet
+
+from rest_cereal.renderers import MessagePackRenderer, msgpack
+
+from cerealtestingapp.models import NestedTestModel
+from test_cerealmixin import BaseTestSerializer
+
+
+class MessagePackTestView(ModelViewSet):
+    model = NestedTestModel
+    serializer_class = BaseTestSerializer
+    queryset = NestedTestModel.objects.filter(val__gte=200).order_by('val')
+    renderer_classes = (JSONRenderer, MessagePackRenderer)
+
+
+@unittest.skipIf(msgpack is None, 'msgpack is not installed')
+class MessagePackRendererTest(unittest.TestCase):
+    '''Test the MessagePackRenderer selected through the Accept header.
+    '''
+
+    request_factory = APIRequestFactory()
+
+    def setUp(self):
+        NestedTestModel.objects.filter(val__gte=200).delete()
+        self.model1 = NestedTestModel.objects.create(val=200)
+        self.model2 = NestedTestModel.objects.create(nest=self.model1, val=201)
+
+    def _get_response(self, fields_string, action='list', **kwargs):
+        request = self.request_factory.get(
+            '/nest/', {'fields': fields_string},
+            HTTP_ACCEPT='application/msgpack'
+        )
+        api_view = MessagePackTestView.as_view({'get': action})
+        response = api_view(request, **kwargs)
+        response.render()
+        return response
+
+    def test_retrieve(self):
+        response = self._get_response(
+            'val,nest(val)', action='retrieve', pk=self.model2.id
+        )
+        self.assertEqual(response['Content-Type'], 'application/msgpack')
+        self.assertEqual(
+            msgpack.unpackb(response.content, raw=False),
+            {'val': 201, 'nest': {'val': 200}}
+        )
+
+    def test_list_compact(self):
+        response = self._get_response('val,nest(val),:compact')
+        self.assertEqual(
+            msgpack.unpackb(response.content, raw=False),
+            {'fields': ['val', 'nest.val'], 'rows': [[200, None], [201, 200]]}
+        )
+
+    def test_fallback_encoding(self):
+        from decimal import Decimal
+        content = MessagePackRenderer().render({'price': Decimal('1.50')})
+        self.assertEqual(
+            msgpack.unpackb(content, raw=False), {'price': 1.5}
+        )
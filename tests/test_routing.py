@@ -0,0 +1,152 @@
+import json
+import unittest
+
+from django.core import signing
+from django.http import HttpResponse
+from django.test import RequestFactory
+from django.test.utils import override_settings
+from rest_framework.serializers import ModelSerializer
+from rest_framework.test import APIRequestFactory
+from rest_framework.viewsets import ModelViewSet
+
+from rest_cereal.mixins import CerealMixin
+from rest_cereal.routing import ReadPrimaryMiddleware, ReplicaBalancer, \
+    get_read_primary_value, reads_from_primary
+from rest_cereal.serializers import LazySerializer
+from rest_cereal.views import CerealViewMixin
+
+from cerealtestingapp.models import NestedTestModel
+
+REPLICA_SETTINGS = {'READ_DATABASES': {'default': 1, 'replica': 3}}
+
+
+class RoutingTestSerializer(CerealMixin, ModelSerializer):
+    parent = LazySerializer('RoutingTestSerializer', many=True)
+
+    class Meta:
+        model = NestedTestModel
+        fields = ('val',)
+
+
+class RoutingTestView(CerealViewMixin, ModelViewSet):
+    model = NestedTestModel
+    serializer_class = RoutingTestSerializer
+    queryset = NestedTestModel.objects.filter(val__gte=1200, val__lt=1300) \
+        .order_by('val')
+
+
+class PrimaryRoutingTestView(RoutingTestView):
+    read_replicas = False
+
+
+class ReplicaRoutingTest(unittest.TestCase):
+    '''Test reading from the READ_DATABASES. The replica test database
+    isn't a copy of default, so the rows tell which database was read.
+    '''
+
+    request_factory = APIRequestFactory()
+
+    def setUp(self):
+        for alias in ('default', 'replica'):
+            NestedTestModel.objects.using(alias).filter(
+                val__gte=1200, val__lt=1300
+            ).delete()
+        NestedTestModel.objects.create(val=1200)
+        replica_root = NestedTestModel.objects.using('replica').create(
+            val=1201
+        )
+        NestedTestModel.objects.using('replica').create(val=1202,
+                                                        nest=replica_root)
+
+    def _get_data(self, view_class=RoutingTestView, **extra):
+        request = self.request_factory.get('/nest/',
+                                           {'fields': 'val,parent(val)'},
+                                           **extra)
+        response = view_class.as_view({'get': 'list'})(request)
+        response.render()
+        return json.loads(response.content.decode('utf-8'))
+
+    def test_without_read_databases(self):
+        self.assertEqual(self._get_data(), [{'val': 1200, 'parent': []}])
+
+    @override_settings(REST_CEREAL=REPLICA_SETTINGS)
+    def test_reads_from_replica(self):
+        # the replica, weighted 3, is the least loaded
+        self.assertEqual(self._get_data(), [
+            {'val': 1201, 'parent': [{'val': 1202}]},
+            {'val': 1202, 'parent': []},
+        ])
+        self.assertEqual(self._get_data(PrimaryRoutingTestView),
+                         [{'val': 1200, 'parent': []}])
+
+    @override_settings(REST_CEREAL=REPLICA_SETTINGS)
+    def test_recent_writers_read_from_primary(self):
+        value = get_read_primary_value()
+        self.request_factory.cookies['cereal_read_primary'] = value
+        try:
+            data = self._get_data()
+        finally:
+            del self.request_factory.cookies['cereal_read_primary']
+        self.assertEqual(data, [{'val': 1200, 'parent': []}])
+        self.assertEqual(
+            self._get_data(HTTP_X_CEREAL_READ_PRIMARY=value),
+            [{'val': 1200, 'parent': []}]
+        )
+        # expired, or not signed
+        expired = signing.TimestampSigner(
+            salt='rest_cereal.routing.read_primary'
+        ).sign('1')
+        with override_settings(REST_CEREAL=dict(REPLICA_SETTINGS,
+                                                READ_PRIMARY_SECONDS=-1)):
+            self.assertEqual(
+                len(self._get_data(HTTP_X_CEREAL_READ_PRIMARY=expired)), 2
+            )
+        self.assertEqual(
+            len(self._get_data(HTTP_X_CEREAL_READ_PRIMARY='9e99')), 2
+        )
+
+
+class ReplicaBalancerTest(unittest.TestCase):
+
+    def test_spread_by_weight(self):
+        balancer = ReplicaBalancer({'default': 1, 'replica': 3})
+        aliases = [balancer.acquire(10) for _ in range(4)]
+        self.assertEqual(sorted(aliases),
+                         ['default', 'replica', 'replica', 'replica'])
+        for alias in aliases:
+            balancer.release(alias, 10)
+        self.assertEqual(balancer.in_flight, {'default': 0, 'replica': 0})
+        # expensive requests in flight push the others away
+        balancer.acquire(100)
+        self.assertEqual(balancer.acquire(1), 'default')
+
+
+class ReadPrimaryMiddlewareTest(unittest.TestCase):
+
+    def _get_response(self, write, method='post'):
+        middleware = ReadPrimaryMiddleware()
+        request = getattr(RequestFactory(), method)('/nest/')
+        middleware.process_request(request)
+        if write:
+            NestedTestModel.objects.filter(val=1299).delete()
+        return middleware.process_response(request, HttpResponse())
+
+    def test_marks_writes(self):
+        response = self._get_response(write=True)
+        request = RequestFactory().get(
+            '/nest/',
+            HTTP_X_CEREAL_READ_PRIMARY=response['X-Cereal-Read-Primary']
+        )
+        self.assertTrue(reads_from_primary(request))
+        self.assertEqual(response.cookies['cereal_read_primary'].value,
+                         response['X-Cereal-Read-Primary'])
+
+    def test_safe_requests_not_marked(self):
+        # ex: a GET saving its session
+        response = self._get_response(write=True, method='get')
+        self.assertFalse(response.has_header('X-Cereal-Read-Primary'))
+
+    def test_reads_not_marked(self):
+        response = self._get_response(write=False)
+        self.assertFalse(response.has_header('X-Cereal-Read-Primary'))
+        self.assertNotIn('cereal_read_primary', response.cookies)
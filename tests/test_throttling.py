@@ -0,0 +1,100 @@
+import json
+import unittest
+
+from django.core.cache import cache
+from rest_framework.test import APIRequestFactory
+
+from rest_cereal.throttling import CerealCostThrottle
+
+from cerealtestingapp.models import NestedTestModel
+from test_views import ColumnarTestView
+
+
+class Clock(object):
+    now = 1000.0
+
+
+class TimeoutsCache(object):
+    '''Cache recording the timeouts it's given.
+    '''
+
+    def __init__(self):
+        self.timeouts = []
+
+    def set(self, key, value, timeout):
+        self.timeouts.append(timeout)
+
+
+class TestCostThrottle(CerealCostThrottle):
+    rate = '25/min'
+    timer = staticmethod(lambda: Clock.now)
+
+
+class TestMeasuredCostThrottle(TestCostThrottle):
+    charge_measured_cost = True
+
+
+class ThrottleTestView(ColumnarTestView):
+    queryset = NestedTestModel.objects.filter(val__gte=500).order_by('val')
+    throttle_classes = (TestCostThrottle,)
+
+
+class MeasuredThrottleTestView(ThrottleTestView):
+    throttle_classes = (TestMeasuredCostThrottle,)
+
+
+class CostThrottleTest(unittest.TestCase):
+    '''Test the token buckets of the CerealCostThrottle.
+    '''
+
+    request_factory = APIRequestFactory()
+
+    def setUp(self):
+        cache.delete('throttle_cereal_cost_127.0.0.1')
+        Clock.now = 1000.0
+        NestedTestModel.objects.filter(val__gte=500).delete()
+        NestedTestModel.objects.create(val=500)
+
+    def _get_response(self, view_class, fields_string):
+        request = self.request_factory.get('/nest/', {'fields': fields_string})
+        response = view_class.as_view({'get': 'list'})(request)
+        response.render()
+        return response
+
+    def test_charged_estimated_cost(self):
+        # 'val' on a list is estimated at 10: 25 tokens cover 2 requests
+        for _ in range(2):
+            response = self._get_response(ThrottleTestView, 'val')
+            self.assertEqual(response.status_code, 200)
+        response = self._get_response(ThrottleTestView, 'val')
+        self.assertEqual(response.status_code, 429)
+        # 5 tokens are missing, refilled at 25 per minute
+        self.assertEqual(response['Retry-After'], '12')
+
+    def test_bucket_refills(self):
+        for _ in range(2):
+            self._get_response(ThrottleTestView, 'val')
+        Clock.now += 12
+        response = self._get_response(ThrottleTestView, 'val')
+        self.assertEqual(response.status_code, 200)
+
+    def test_cost_above_rate(self):
+        response = self._get_response(ThrottleTestView, 'val,nest(val)')
+        self.assertEqual(response.status_code, 429)
+
+    def test_measured_cost(self):
+        response = self._get_response(MeasuredThrottleTestView, 'val')
+        self.assertEqual(json.loads(response.content), [{'val': 500}])
+        # charged 10, measured 1
+        self.assertEqual(cache.get('throttle_cereal_cost_127.0.0.1'),
+                         (24, 1000.0))
+
+    def test_overdraft_kept_until_refilled(self):
+        throttle = TestCostThrottle()
+        throttle.key = 'throttle_cereal_cost_127.0.0.1'
+        throttle.now = Clock.now
+        throttle.cache = TimeoutsCache()
+        # 25 tokens refill in 60 seconds
+        throttle.set_tokens(-25)
+        throttle.set_tokens(20)
+        self.assertEqual(throttle.cache.timeouts, [120, 12])
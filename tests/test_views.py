@@ -0,0 +1,235 @@
+import array
+import ast
+import json
+import struct
+import unittest
+import zipfile
+from io import BytesIO
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test.utils import override_settings
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory, force_authenticate
+from rest_framework.viewsets import ModelViewSet
+
+from rest_cereal.persisted import PersistedFieldsStore
+from rest_cereal.renderers import NpzRenderer
+from rest_cereal.views import CerealViewMixin, PersistedFieldsView
+
+from cerealtestingapp.models import NestedTestModel
+from test_cerealmixin import BaseTestSerializer
+
+
+def read_npz(content):
+    '''Reads the .npz archive of 1-d arrays into {name: (dtype, list)}.
+    '''
+    columns = {}
+    archive = zipfile.ZipFile(BytesIO(content))
+    for name in archive.namelist():
+        npy = archive.read(name)
+        assert npy[:8] == b'\x93NUMPY\x01\x00'
+        header_length = struct.unpack('<H', npy[8:10])[0]
+        header = ast.literal_eval(npy[10:10 + header_length].decode('latin1'))
+        typecode = {'<i8': 'l', '|b1': 'B', '<f8': 'd'}[header['descr']]
+        values = array.array(typecode)
+        values.fromstring(npy[10 + header_length:])
+        assert (len(values),) == header['shape']
+        columns[name[:-len('.npy')]] = (header['descr'], values.tolist())
+    return columns
+
+
+class ColumnarTestView(CerealViewMixin, ModelViewSet):
+    model = NestedTestModel
+    serializer_class = BaseTestSerializer
+    queryset = NestedTestModel.objects.filter(val__gte=300).order_by('val')
+    renderer_classes = (JSONRenderer, NpzRenderer)
+    columnar_chunk_size = 2
+
+
+class ColumnarExportTest(unittest.TestCase):
+    '''Test the columnar (npz) export of CerealViewMixin list views.
+    '''
+
+    request_factory = APIRequestFactory()
+
+    def setUp(self):
+        NestedTestModel.objects.filter(val__gte=300).delete()
+        self.models = [NestedTestModel.objects.create(val=300)]
+        for val in range(301, 305):
+            self.models.append(NestedTestModel.objects.create(
+                nest=self.models[0], val=val
+            ))
+
+    def _get_response(self, fields_string):
+        request = self.request_factory.get(
+            '/nest/', {'fields': fields_string},
+            HTTP_ACCEPT='application/x-npz'
+        )
+        api_view = ColumnarTestView.as_view({'get': 'list'})
+        response = api_view(request)
+        response.render()
+        return response
+
+    def test_scalar_columns(self):
+        response = self._get_response('val,id')
+        self.assertEqual(response['Content-Type'], 'application/x-npz')
+        columns = read_npz(response.content)
+        self.assertEqual(columns['val'], ('<i8', list(range(300, 305))))
+        self.assertEqual(
+            columns['id'][1], [model.id for model in self.models]
+        )
+
+    def test_null_values_rejected(self):
+        response = self._get_response('val,nest')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            json.loads(response.content),
+            {'detail': "Field nest has null values and can't be exported as "
+                       "a column."}
+        )
+
+    def test_nested_fields_rejected(self):
+        response = self._get_response('val,nest(val)')
+        self.assertEqual(response.status_code, 400)
+
+    def test_json_list_unchanged(self):
+        request = self.request_factory.get('/nest/', {'fields': 'val'})
+        response = ColumnarTestView.as_view({'get': 'list'})(request)
+        response.render()
+        self.assertEqual(
+            json.loads(response.content),
+            [{'val': val} for val in range(300, 305)]
+        )
+
+
+class PersistedFieldsTest(unittest.TestCase):
+    '''Test registering fields strings and requesting them by hash.
+    '''
+
+    request_factory = APIRequestFactory()
+
+    def setUp(self):
+        NestedTestModel.objects.filter(val__gte=300).delete()
+        self.model1 = NestedTestModel.objects.create(val=300)
+        self.model2 = NestedTestModel.objects.create(nest=self.model1, val=301)
+
+    def _register(self, fields_string, user=User(pk=1, username='a')):
+        request = self.request_factory.post(
+            '/fields/', {'fields': fields_string}, format='json'
+        )
+        if user is not None:
+            force_authenticate(request, user)
+        response = PersistedFieldsView.as_view()(request)
+        response.render()
+        return response
+
+    def _get_response(self, fields_string):
+        request = self.request_factory.get('/nest/', {'fields': fields_string})
+        response = ColumnarTestView.as_view({'get': 'list'})(request)
+        response.render()
+        return response
+
+    def test_request_by_hash(self):
+        response = self._register('nest(val),val')
+        self.assertEqual(response.status_code, 201)
+        fields_hash = json.loads(response.content)['hash']
+        response = self._get_response('#' + fields_hash)
+        self.assertEqual(
+            json.loads(response.content),
+            [{'val': 300, 'nest': None}, {'val': 301, 'nest': {'val': 300}}]
+        )
+
+    def test_same_fields_same_hash(self):
+        first = json.loads(self._register('val,nest(val)').content)
+        second = json.loads(self._register('nest(val,val),val').content)
+        self.assertEqual(first['hash'], second['hash'])
+
+    def test_bad_fields_not_registered(self):
+        response = self._register('nest(val')
+        self.assertEqual(response.status_code, 400)
+
+    def test_registered_order_kept(self):
+        response = self._register('val,nest(val),:compact')
+        fields_hash = json.loads(response.content)['hash']
+        self.assertEqual(PersistedFieldsStore().get(fields_hash),
+                         'val,nest(val),:compact')
+        response = self._get_response('#' + fields_hash)
+        self.assertEqual(json.loads(response.content)['fields'],
+                         ['val', 'nest.val'])
+
+    def test_anonymous_rejected(self):
+        response = self._register('val', user=None)
+        self.assertEqual(response.status_code, 403)
+
+    def test_registrations_throttled(self):
+        cache.delete('throttle_cereal_persisted_fields_2')
+        with override_settings(REST_CEREAL={'PERSISTED_FIELDS_RATE':
+                                            '1/min'}):
+            user = User(pk=2, username='b')
+            self.assertEqual(self._register('val', user).status_code, 201)
+            self.assertEqual(self._register('val', user).status_code, 429)
+
+    def test_zero_timeout(self):
+        with override_settings(REST_CEREAL={'PERSISTED_FIELDS_TIMEOUT':
+                                            60}):
+            self.assertEqual(PersistedFieldsStore(timeout=0).timeout, 0)
+            self.assertEqual(PersistedFieldsStore().timeout, 60)
+
+    def test_unknown_hash(self):
+        response = self._get_response('#unknown')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            json.loads(response.content),
+            {'detail': 'No fields were persisted with hash unknown.'}
+        )
+
+
+class CostLimitTestView(ColumnarTestView):
+    max_cost = 15
+
+
+class CostAdmissionTest(unittest.TestCase):
+    '''Test the ':cost' option and the rejection of expensive requests.
+    '''
+
+    request_factory = APIRequestFactory()
+
+    def setUp(self):
+        NestedTestModel.objects.filter(val__gte=300).delete()
+        NestedTestModel.objects.create(val=300)
+
+    def _get_response(self, view_class, fields_string):
+        request = self.request_factory.get('/nest/', {'fields': fields_string})
+        response = view_class.as_view({'get': 'list'})(request)
+        response.render()
+        return response
+
+    def test_cost_option(self):
+        response = self._get_response(ColumnarTestView, 'val,:cost')
+        self.assertEqual(json.loads(response.content), {'cost': 10})
+
+    def test_explain_option(self):
+        response = self._get_response(ColumnarTestView,
+                                      'val,nest(nest(val)),:explain')
+        self.assertEqual(json.loads(response.content), {'explain': {
+            'select_related': ['nest', 'nest__nest'],
+            'prefetch_related': [],
+            'paths': [
+                {'path': 'nest', 'strategy': 'join', 'stats': None},
+                {'path': 'nest__nest', 'strategy': 'join', 'stats': None},
+            ],
+        }})
+
+    def test_cheap_request_admitted(self):
+        response = self._get_response(CostLimitTestView, 'val')
+        self.assertEqual(json.loads(response.content), [{'val': 300}])
+
+    def test_expensive_request_rejected(self):
+        response = self._get_response(CostLimitTestView, 'val,nest(val)')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            json.loads(response.content),
+            {'detail': 'Fields parameter is too expensive: its estimated '
+                       'cost 40 is above 15.'}
+        )
@@ -0,0 +1,64 @@
+import json
+import os
+import tempfile
+import unittest
+
+from rest_framework.test import APIRequestFactory
+
+from rest_cereal.mixins import CerealMixin
+from rest_cereal.warmup import read_warmup_file, warm_up
+
+from cerealtestingapp.models import NestedTestModel
+from test_cerealmixin import BaseTestSerializer, NestLevel1TestSerializer
+from test_views import ColumnarTestView
+
+
+class WarmUpTest(unittest.TestCase):
+    '''Test compiling fields parameters ahead of requests.
+    '''
+
+    def test_warm_up(self):
+        self.assertEqual(
+            warm_up([('test_views.ColumnarTestView', 'val,nest(val,nest)')]),
+            1
+        )
+        compiled = BaseTestSerializer.get_compiled_fields('val,nest(val,nest)')
+        self.assertEqual(compiled.plan.select_related, ['nest'])
+        self.assertEqual(compiled.cereal_fields.normal_fields, ['val'])
+
+    def test_failed_entries_skipped(self):
+        self.assertEqual(warm_up([
+            ('test_views.ColumnarTestView', 'val,unknown'),
+            ('test_views.UnknownView', 'val'),
+        ]), 0)
+        self.assertIsNone(BaseTestSerializer.get_compiled_fields('val,unknown'))
+
+    def test_warmed_up_request(self):
+        warm_up([('test_views.ColumnarTestView', 'nest(val),val')])
+        NestedTestModel.objects.filter(val__gte=300).delete()
+        NestedTestModel.objects.create(val=300)
+        request = APIRequestFactory().get('/nest/',
+                                          {'fields': 'nest(val),val'})
+        response = ColumnarTestView.as_view({'get': 'list'})(request)
+        response.render()
+        self.assertEqual(json.loads(response.content),
+                         [{'val': 300, 'nest': None}])
+
+    def test_read_warmup_file(self):
+        file_descriptor, path = tempfile.mkstemp()
+        with os.fdopen(file_descriptor, 'w') as warmup_file:
+            warmup_file.write('# comment\n\n'
+                              'app.views.AView  id,teams(id)\n'
+                              'bar\n'
+                              'app.views.BView\tid\n')
+        try:
+            self.assertEqual(read_warmup_file(path), [
+                ('app.views.AView', 'id,teams(id)'),
+                ('app.views.BView', 'id'),
+            ])
+        finally:
+            os.remove(path)
+
+    def test_temp_classes_reused(self):
+        self.assertIs(CerealMixin.get_temp_class(NestLevel1TestSerializer),
+                      CerealMixin.get_temp_class(NestLevel1TestSerializer))
@@ -0,0 +1,231 @@
+import json
+import unittest
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.serializers import IntegerField, ModelSerializer
+from rest_framework.validators import UniqueValidator
+from rest_framework.test import APIRequestFactory
+from rest_framework.viewsets import ModelViewSet
+
+from rest_cereal.mixins import CerealMixin
+from rest_cereal.serializers import LazySerializer
+from rest_cereal.views import CerealViewMixin
+
+from cerealtestingapp.models import ManyNestedTestModel, NestedTestModel, \
+    TwoNestedTestModel
+
+
+class WriteNestTestSerializer(CerealMixin, ModelSerializer):
+    parent = LazySerializer('WriteNestTestSerializer', many=True)
+
+    class Meta:
+        model = NestedTestModel
+        fields = ('id', 'val', 'parent')
+
+
+class WriteTwoTestSerializer(CerealMixin, ModelSerializer):
+    nest1 = WriteNestTestSerializer()
+    nest2 = WriteNestTestSerializer()
+
+    class Meta:
+        model = TwoNestedTestModel
+        fields = ('id', 'val', 'nest1', 'nest2')
+
+
+class UniqueWriteTwoTestSerializer(WriteTwoTestSerializer):
+    val = IntegerField(validators=[
+        UniqueValidator(queryset=TwoNestedTestModel.objects.all())
+    ])
+
+
+class WriteManyTestSerializer(CerealMixin, ModelSerializer):
+    nests = WriteNestTestSerializer(many=True)
+
+    class Meta:
+        model = ManyNestedTestModel
+        fields = ('id', 'val', 'nests')
+
+
+class WriteTwoTestView(CerealViewMixin, ModelViewSet):
+    model = TwoNestedTestModel
+    serializer_class = WriteTwoTestSerializer
+    queryset = TwoNestedTestModel.objects.filter(val__gte=1300, val__lt=1400)
+
+
+class WriteManyTestView(CerealViewMixin, ModelViewSet):
+    model = ManyNestedTestModel
+    serializer_class = WriteManyTestSerializer
+    queryset = ManyNestedTestModel.objects.filter(val__gte=1300,
+                                                  val__lt=1400)
+
+
+class UniqueWriteTwoTestView(WriteTwoTestView):
+    serializer_class = UniqueWriteTwoTestSerializer
+
+
+class PlainWriteTestView(ModelViewSet):
+    model = TwoNestedTestModel
+    serializer_class = WriteTwoTestSerializer
+    queryset = TwoNestedTestModel.objects.filter(val__gte=1300, val__lt=1400)
+
+
+class WriteTest(unittest.TestCase):
+    '''Test creating and updating objects through CerealViewMixin views,
+    whose responses are shaped by the fields parameter.
+    '''
+
+    request_factory = APIRequestFactory()
+
+    def setUp(self):
+        TwoNestedTestModel.objects.filter(val__gte=1300).delete()
+        ManyNestedTestModel.objects.filter(val__gte=1300).delete()
+        NestedTestModel.objects.filter(val__gte=1300, val__lt=1400).delete()
+        self.nests = [NestedTestModel.objects.create(val=val)
+                      for val in (1300, 1301, 1302)]
+        NestedTestModel.objects.create(val=1303, nest=self.nests[0])
+        self.twos = [TwoNestedTestModel.objects.create(val=val)
+                     for val in (1300, 1301, 1302)]
+
+    def _write(self, method, data, fields_string, view_class=WriteTwoTestView,
+               pk=None):
+        path = '/two/?fields=' + fields_string
+        request = getattr(self.request_factory, method)(path, data,
+                                                        format='json')
+        actions = {method: 'partial_update' if method == 'patch' else
+                   {'post': 'create', 'put': 'update'}[method]}
+        kwargs = {} if pk is None else {'pk': pk}
+        with CaptureQueriesContext(connection) as queries:
+            response = view_class.as_view(actions)(request, **kwargs)
+            response.render()
+        return response, json.loads(response.content.decode('utf-8')), \
+            len(queries)
+
+    def test_create(self):
+        response, data, _ = self._write(
+            'post', {'val': 1310, 'nest1': self.nests[0].pk},
+            'id,val,nest1(val,parent(val))'
+        )
+        self.assertEqual(response.status_code, 201)
+        two = TwoNestedTestModel.objects.get(pk=data['id'])
+        self.assertEqual((two.val, two.nest1_id, two.nest2_id),
+                         (1310, self.nests[0].pk, None))
+        self.assertEqual(data, {'id': two.pk, 'val': 1310,
+                                'nest1': {'val': 1300,
+                                          'parent': [{'val': 1303}]}})
+
+    def test_bulk_create(self):
+        items = [{'val': 1310 + index, 'nest1': self.nests[index % 2].pk,
+                  'nest2': self.nests[2].pk} for index in range(4)]
+        response, data, queries = self._write('post', items,
+                                              'val,nest1(val),nest2(val)')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(data[3], {'val': 1313, 'nest1': {'val': 1301},
+                                   'nest2': {'val': 1302}})
+        self.assertEqual(
+            TwoNestedTestModel.objects.filter(val__gte=1310).count(), 4
+        )
+        # the nests (one query), then BEGIN and the rows: SQLite doesn't
+        # return the primary keys of a bulk insert
+        self.assertEqual(queries, 1 + 1 + 4)
+
+    def test_bulk_update(self):
+        for count in (2, 3):
+            items = [{'id': two.pk, 'val': 1320 + index,
+                      'nest2': self.nests[index].pk}
+                     for index, two in enumerate(self.twos[:count])]
+            response, data, queries = self._write(
+                'patch', items, 'id,val,nest2(val,parent(val))'
+            )
+            self.assertEqual(response.status_code, 200)
+            # the objects, the nests, BEGIN and the update, and
+            # nest2__parent
+            self.assertEqual(queries, 5)
+        self.assertEqual(data[0], {
+            'id': self.twos[0].pk, 'val': 1320,
+            'nest2': {'val': 1300, 'parent': [{'val': 1303}]}
+        })
+        self.assertEqual(
+            list(TwoNestedTestModel.objects.filter(val__gte=1300)
+                 .order_by('pk').values_list('val', 'nest2__val')),
+            [(1320, 1300), (1321, 1301), (1322, 1302)]
+        )
+        # not in the data: unchanged
+        self.assertEqual(
+            TwoNestedTestModel.objects.filter(nest1__isnull=False).filter(
+                val__gte=1300).count(), 0
+        )
+
+    def test_update(self):
+        response, data, _ = self._write(
+            'patch', {'nest1': self.nests[1].pk}, 'val,nest1(id)',
+            pk=self.twos[0].pk
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data, {'val': 1300,
+                                'nest1': {'id': self.nests[1].pk}})
+        self.assertEqual(
+            TwoNestedTestModel.objects.get(pk=self.twos[0].pk).nest1_id,
+            self.nests[1].pk
+        )
+
+    def test_bulk_update_errors(self):
+        for items in ({'id': self.twos[0].pk},
+                      [{'val': 1}],
+                      [{'id': 'a'}],
+                      [{'id': self.twos[0].pk}, {'id': self.twos[0].pk}],
+                      [{'id': -1}]):
+            response, _, _ = self._write('patch', items, 'val')
+            self.assertEqual(response.status_code, 400)
+        response, data, _ = self._write(
+            'patch', [{'id': self.twos[0].pk, 'nest1': -1},
+                      {'id': self.twos[1].pk, 'nest1': 'a'}], 'val'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([list(errors) for errors in data],
+                         [['nest1'], ['nest1']])
+
+    def test_many_to_many(self):
+        items = [{'val': 1310, 'nests': [self.nests[0].pk, self.nests[1].pk]},
+                 {'val': 1311, 'nests': [self.nests[2].pk]}]
+        response, data, _ = self._write('post', items, 'val,nests(val)',
+                                        WriteManyTestView)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(data, [
+            {'val': 1310, 'nests': [{'val': 1300}, {'val': 1301}]},
+            {'val': 1311, 'nests': [{'val': 1302}]},
+        ])
+        many = ManyNestedTestModel.objects.get(val=1310)
+        response, data, _ = self._write(
+            'put', [{'id': many.pk, 'val': 1312, 'nests': [self.nests[2].pk]}],
+            'val,nests(val)', WriteManyTestView
+        )
+        self.assertEqual(data, [{'val': 1312, 'nests': [{'val': 1302}]}])
+
+    def test_shaped_serializers_dont_save(self):
+        # without CerealViewMixin, the fields parameter would select the
+        # fields written
+        response, _, _ = self._write('post', {'val': 1310}, 'val',
+                                     PlainWriteTestView)
+        self.assertEqual(response.status_code, 400)
+        response, _, _ = self._write('patch', {'val': 1310}, 'val',
+                                     PlainWriteTestView, pk=self.twos[0].pk)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            TwoNestedTestModel.objects.filter(val=1310).count(), 0
+        )
+
+    def test_bulk_update_validated_per_instance(self):
+        # the unchanged values don't conflict with their own objects
+        items = [{'id': two.pk, 'val': two.val, 'nest1': self.nests[0].pk}
+                 for two in self.twos[:2]]
+        response, data, _ = self._write('patch', items, 'val,nest1(val)',
+                                        UniqueWriteTwoTestView)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data[1], {'val': 1301, 'nest1': {'val': 1300}})
+        response, data, _ = self._write(
+            'patch', [{'id': self.twos[0].pk, 'val': 1301}], 'val',
+            UniqueWriteTwoTestView
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(list(data[0]), ['val'])